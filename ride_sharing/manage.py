@@ -6,6 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
+    if sys.argv[1:2] == ['test']:
+        # Keeps test runs off the Redis instance of the dev settings
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ride_sharing.settings_test')
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ride_sharing.settings')
     try:
         from django.core.management import execute_from_command_line
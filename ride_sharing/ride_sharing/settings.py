@@ -13,7 +13,6 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from datetime import timedelta
 from pathlib import Path
 
-from django.conf import settings
 import os
 from dotenv import load_dotenv
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -53,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'rides.metrics.MetricsMiddleware',
+    'rides.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -110,6 +111,32 @@ CHANNEL_LAYERS = {
     },
 }
 
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/1")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+}
+
+# One index in Redis shared by all web, ASGI and worker processes. The
+# in-process rides.driver_index.GridDriverIndex is faster, but needs
+# "channel_url" to see changes made by other processes and "max_age" to pick
+# up bulk imports. "WARMUP": False leaves a cold index cold until it is
+# warmed explicitly, e.g. with rebuild_driver_index.
+DRIVER_INDEX = {
+    "BACKEND": "rides.driver_index.RedisGeoDriverIndex",
+    "OPTIONS": {"url": REDIS_URL, "ttl": 600},
+}
+
+# Write-behind buffer for driver and ride positions, shared through Redis so
+# positions written by Celery workers are visible to the web processes.
+LOCATION_BUFFER = {
+    "BACKEND": "rides.location_buffer.RedisLocationBuffer",
+    "OPTIONS": {"ttl": 3600},
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=90),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -117,7 +144,7 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": False,
     "UPDATE_LAST_LOGIN": False,
     "ALGORITHM": "HS256",
-    "SIGNING_KEY": settings.SECRET_KEY,
+    "SIGNING_KEY": SECRET_KEY,
     "VERIFYING_KEY": "",
     "AUDIENCE": None,
     "ISSUER": None,
@@ -131,7 +158,7 @@ SIMPLE_JWT = {
     "USER_AUTHENTICATION_RULE": "rest_framework_simplejwt.authentication.default_user_authentication_rule",
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
-    "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
+    "TOKEN_USER_CLASS": "rides.authentication.RidePrincipal",
     "JTI_CLAIM": "jti",
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
@@ -146,9 +173,53 @@ SIMPLE_JWT = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rides.authentication.StatelessJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'rides.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rides.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+}
+
+# How long a user's is_active state is trusted by StatelessJWTAuthentication
+AUTH_REVOCATION_TTL = 30  # seconds
+# Users whose state is cached per process; the least recently seen are evicted
+AUTH_REVOCATION_CACHE_SIZE = 10000
+
+# Database budget per URL name, checked by rides.query_budget.QueryBudgetMiddleware.
+# Counts assume a cold revocation cache (one is_active lookup per request).
+QUERY_BUDGETS = {
+    "api-root": {"queries": 0, "db_ms": 50},
+    "user-register": {"queries": 4, "db_ms": 200},
+    "user-signin": {"queries": 1, "db_ms": 50},
+    "rides-list": {"queries": 2, "db_ms": 100},
+    "rides-detail": {"queries": 2, "db_ms": 50},
+    "ride-location": {"queries": 2, "db_ms": 50},
+    "ride-trajectory": {"queries": 4, "db_ms": 200},
+    # ride insert, then up to three search rings and the index warm-up on a cold index
+    "ride-request": {"queries": 6, "db_ms": 200},
+    "ride-status-update": {"queries": 4, "db_ms": 100},
+    "async-ride-request": {"queries": 6, "db_ms": 200},
+    "async-ride-location": {"queries": 2, "db_ms": 50},
+    "async-ride-status": {"queries": 5, "db_ms": 100},
 }
+# Over-budget requests raise instead of being logged (the tests turn this on)
+QUERY_BUDGET_STRICT = False
+# X-DB-Queries and Server-Timing response headers
+# (DEBUG is the raw environment string, so "False" would be truthy)
+QUERY_BUDGET_HEADERS = str(DEBUG).strip().lower() in ("1", "true", "yes", "on")
+
+# /metrics (rides.metrics). With a token, scrapers must send "Authorization: Bearer <token>".
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# Celery workers push their metrics here for /metrics to add up; None keeps them local
+METRICS_REDIS_URL = REDIS_URL
+METRICS_PUSH_INTERVAL = 5  # seconds between pushes of a worker
+METRICS_PUSH_TTL = 300  # seconds a stopped worker's metrics are still served
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -194,3 +265,50 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
+CELERY_BEAT_SCHEDULE = {
+    "assign-pending-rides": {
+        "task": "rides.tasks.assign_pending_rides",
+        "schedule": 2.0,  # matching window in seconds
+    },
+    "track-rides-tick": {
+        "task": "rides.tasks.track_rides_tick",
+        "schedule": 30.0,
+    },
+    "flush-locations": {
+        "task": "rides.tasks.flush_locations",
+        "schedule": 5.0,
+    },
+    "rebuild-driver-index": {
+        "task": "rides.tasks.rebuild_driver_index",
+        "schedule": 300.0,  # well inside the index ttl, so lookups find it warm
+    },
+    "maintain-trajectory-partitions": {
+        "task": "rides.tasks.maintain_trajectory_partitions",
+        "schedule": 3600.0,
+    },
+}
+
+# In-progress rides are advanced by one batched tick (track-rides-tick above);
+# set to False to run one simulate_ride_tracking chain per ride instead, kept
+# to one chain per ride by rides.tracking.TrackerRegistry.
+RIDE_TRACKING_BATCHED = True
+
+# Batched ride-to-driver matching
+MATCHING_BATCH_SIZE = 5000
+MATCHING_MAX_DISTANCE = 20000  # meters
+MATCHING_OFFER_TIMEOUT_SECONDS = 30
+# Larger rider x driver matrices use the greedy solver instead of Hungarian.
+MATCHING_EXACT_MAX_CELLS = 10_000_000
+
+# Dispatch dashboards (ws/dispatch/) receive one batched frame per interval
+DISPATCH_FLUSH_INTERVAL = 0.25  # seconds
+
+# Driver GPS ingest (ws/driver/location/)
+DRIVER_PING_MIN_INTERVAL = 0.2  # seconds between accepted pings per driver
+DRIVER_PING_FLUSH_INTERVAL = 1.0  # seconds
+
+# Ride trajectories (rides.trajectory)
+TRAJECTORY_MAX_DEVIATION_M = 10  # store a point once dead reckoning is off by more
+TRAJECTORY_MAX_GAP_SECONDS = 60  # ...or this long after the last stored point
+TRAJECTORY_SIMPLIFY_TOLERANCE_M = 5  # Douglas-Peucker tolerance when compacting
+TRAJECTORY_RETENTION_DAYS = 30  # daily partitions older than this are dropped
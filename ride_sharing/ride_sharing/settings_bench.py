@@ -0,0 +1,41 @@
+"""
+Settings for ``manage.py benchmark`` on a developer machine.
+
+Only a PostGIS database is needed; point BENCH_DB_* at any local server
+(Postgres.app, a Homebrew or apt install; no Docker required). Redis is
+replaced by the in-memory channel layer, a local-memory cache and the
+in-memory location buffer, so results measure this process only.
+
+    DJANGO_SETTINGS_MODULE=ride_sharing.settings_bench python manage.py migrate
+    DJANGO_SETTINGS_MODULE=ride_sharing.settings_bench python manage.py benchmark all --output bench.json
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.contrib.gis.db.backends.postgis",
+        "NAME": os.getenv("BENCH_DB_NAME", "ride_sharing_bench"),
+        "USER": os.getenv("BENCH_DB_USER", os.getenv("DB_USER")),
+        "PASSWORD": os.getenv("BENCH_DB_PASSWORD", os.getenv("DB_PASSWORD")),
+        "HOST": os.getenv("BENCH_DB_HOST", os.getenv("DB_HOST", "localhost")),
+        "PORT": os.getenv("BENCH_DB_PORT", os.getenv("DB_PORT")),
+    }
+}
+
+CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+LOCATION_BUFFER = {"BACKEND": "rides.location_buffer.InMemoryLocationBuffer"}
+
+DRIVER_INDEX = {"BACKEND": "rides.driver_index.GridDriverIndex", "OPTIONS": {"cell_size": 0.01}}
+
+# Batched tracking needs no Redis tracker registry or Celery worker
+RIDE_TRACKING_BATCHED = True
+
+# Worker metrics are not pushed anywhere
+METRICS_REDIS_URL = None
@@ -0,0 +1,33 @@
+"""
+Settings for ``manage.py test``, which uses them unless DJANGO_SETTINGS_MODULE
+is set. Only the PostGIS database is needed; Redis is replaced by the
+in-memory channel layer, a local-memory cache, the in-memory location buffer
+and a process-local driver index, so a test run never touches the keys of a
+Redis shared with a dev or staging deployment.
+
+The tests of the Redis backends themselves run against TEST_REDIS_URL, and
+only when it is set. Their keys all start with TEST_REDIS_PREFIX.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+
+CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+LOCATION_BUFFER = {"BACKEND": "rides.location_buffer.InMemoryLocationBuffer"}
+
+# Tests warm the index themselves; a background warmup could not see their
+# uncommitted rows and would outlive the test that started it.
+DRIVER_INDEX = {
+    "BACKEND": "rides.driver_index.GridDriverIndex",
+    "OPTIONS": {"cell_size": 0.01},
+    "WARMUP": False,
+}
+
+# Worker metrics are not pushed anywhere
+METRICS_REDIS_URL = None
+
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+TEST_REDIS_PREFIX = "test"
@@ -0,0 +1,59 @@
+"""
+Helpers for async code paths that should not queue behind the single
+thread-sensitive executor, where sync_to_async and the async ORM run by default.
+"""
+import asyncio
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import connections
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def _closing(func):
+    def wrapped(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Pool threads never see the request signals that close connections
+            connections.close_all()
+
+    return wrapped
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    Run a read-only sync call in a pool thread, concurrently with other calls.
+    It gets its own database connection, so it does not see the caller's
+    uncommitted writes; anything transactional belongs on the default executor.
+    """
+    return await sync_to_async(_closing(func), thread_sensitive=False)(*args, **kwargs)
+
+
+def async_redis(url):
+    """redis.asyncio client for ``url``, one per event loop."""
+    import redis.asyncio
+
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(url)
+    if client is None:
+        client = clients[url] = redis.asyncio.Redis.from_url(url)
+    return client
+
+
+async def cache_get_many(keys, alias="default"):
+    """
+    ``cache.aget_many`` that stays on the event loop for Django's RedisCache,
+    whose async methods are sync_to_async wrappers. Other backends are
+    delegated to as they are.
+    """
+    backend = caches[alias]
+    if not isinstance(backend, RedisCache):
+        return await backend.aget_many(keys)
+    client = async_redis(backend._servers[0])
+    values = await client.mget([backend.make_and_validate_key(key) for key in keys])
+    loads = backend._cache._serializer.loads
+    return {key: loads(value) for key, value in zip(keys, values) if value is not None}
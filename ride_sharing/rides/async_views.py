@@ -0,0 +1,134 @@
+"""
+Async-native versions of the ride request, location and status endpoints,
+served under ``api/async/``.
+
+DRF views are synchronous, so under ASGI every request to them is handed to
+the single thread-sensitive executor. These are plain Django async views.
+On the event loop: JSON handling, token checks answered by the revocation
+cache, and warm position reads (one redis.asyncio MGET). The nearest-driver
+lookup is read-only and runs in a pool thread, concurrently with the ride
+insert. What still goes through the thread-sensitive executor: the ride
+insert and revocation/snapshot cache misses (async ORM), and the status
+transitions, which need a transaction.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.gis.geos import Point
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import status
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from . import position_cache
+from .aio import run_in_thread
+from .authentication import aauthenticate
+from .fastjson import JsonResponse, loads
+from .models import Ride, User
+from .transitions import TransitionError
+from .utils import get_nearby_drivers
+from .views import apply_status_change, format_nearby_drivers
+
+
+def _error(message, status_code, key="error"):
+    return JsonResponse({key: message}, status=status_code)
+
+
+async def _authenticated_user(request):
+    """The request's principal, or an error response to return instead."""
+    try:
+        user = await aauthenticate(request)
+    except (InvalidToken, AuthenticationFailed) as e:
+        return None, _error(str(e.detail), status.HTTP_401_UNAUTHORIZED, key="detail")
+    if user is None:
+        return None, _error(
+            "Authentication credentials were not provided.",
+            status.HTTP_401_UNAUTHORIZED,
+            key="detail",
+        )
+    return user, None
+
+
+@require_http_methods(["GET"])
+async def ride_location(request, ride_id):
+    """Async RideLocationView: served from the position cache, with ETag/304."""
+    user, error = await _authenticated_user(request)
+    if error:
+        return error
+    snapshot = await position_cache.aget_snapshot(ride_id)
+    if snapshot is None:
+        return _error("Ride not found.", status.HTTP_404_NOT_FOUND, key="detail")
+    if not snapshot.can_view(user.id):
+        return _error("Not authorized to view this ride.", status.HTTP_403_FORBIDDEN, key="detail")
+
+    etag = snapshot.etag
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = JsonResponse({"current_location": str(snapshot.location)})
+    response["ETag"] = etag
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def ride_request(request):
+    """Async RideRequestView: create a ride and return the nearest drivers."""
+    user, error = await _authenticated_user(request)
+    if error:
+        return error
+    try:
+        data = loads(request.body or b"{}")
+        pickup_data = data.get("pickup_location")
+        dropoff_data = data.get("dropoff_location")
+    except (ValueError, AttributeError):
+        return _error("Invalid JSON body.", status.HTTP_400_BAD_REQUEST)
+    if not pickup_data or not dropoff_data:
+        return _error("Pickup and dropoff locations are required.", status.HTTP_400_BAD_REQUEST)
+
+    pickup_location = Point(pickup_data["longitude"], pickup_data["latitude"], srid=4326)
+    dropoff_location = Point(dropoff_data["longitude"], dropoff_data["latitude"], srid=4326)
+    ride, nearest_drivers = await asyncio.gather(
+        Ride.objects.acreate(
+            rider_id=user.id,
+            pickup_location=pickup_location,
+            dropoff_location=dropoff_location,
+            status="requested",
+        ),
+        run_in_thread(get_nearby_drivers, pickup_location),
+    )
+    return JsonResponse(
+        {
+            "ride_id": str(ride.id),
+            "nearest_drivers": format_nearby_drivers(pickup_location, nearest_drivers),
+        },
+        status=status.HTTP_201_CREATED,
+    )
+
+
+@csrf_exempt
+@require_http_methods(["PATCH"])
+async def ride_status(request, ride_id):
+    """Async RideStatusUpdateView. Transitions change the user, so the row is loaded."""
+    principal, error = await _authenticated_user(request)
+    if error:
+        return error
+    try:
+        new_status = loads(request.body or b"{}").get("status")
+    except (ValueError, AttributeError):
+        return _error("Invalid JSON body.", status.HTTP_400_BAD_REQUEST)
+
+    if isinstance(principal, User):
+        user = principal
+    else:
+        try:
+            user = await User.objects.aget(id=principal.id)
+        except User.DoesNotExist:
+            return _error("User not found", status.HTTP_401_UNAUTHORIZED, key="detail")
+    try:
+        message = await sync_to_async(apply_status_change)(ride_id, new_status, user)
+    except TransitionError as e:
+        return _error(str(e), e.status_code)
+    return JsonResponse({"message": message})
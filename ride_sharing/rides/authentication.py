@@ -0,0 +1,139 @@
+"""
+Stateless JWT authentication for the high-frequency read endpoints.
+
+Instead of loading the ``User`` row on every request, the principal is built
+from the signed role claims in the access token (see rides.tokens). The only
+database access is a revocation check, whether the user still exists and is
+active, cached per process for AUTH_REVOCATION_TTL seconds in an LRU of at
+most AUTH_REVOCATION_CACHE_SIZE users. Endpoints that
+change the user, such as the availability flip in RideStatusUpdateView, keep
+the DB-backed ``JWTAuthentication``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication,
+    JWTStatelessUserAuthentication,
+)
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import ROLE_CLAIMS
+
+
+class RidePrincipal(TokenUser):
+    """TokenUser that also exposes the ride role claims."""
+
+    @cached_property
+    def is_driver(self):
+        return bool(self.token.get("is_driver", False))
+
+    @cached_property
+    def is_rider(self):
+        return bool(self.token.get("is_rider", False))
+
+
+_active = OrderedDict()
+_active_lock = threading.Lock()
+
+
+def _cached_active(user_id):
+    key = str(user_id)
+    with _active_lock:
+        cached = _active.get(key)
+        if cached is None:
+            return None
+        if cached[0] <= time.monotonic():
+            del _active[key]
+            return None
+        _active.move_to_end(key)
+    return cached[1]
+
+
+def _remember_active(user_id, active):
+    key = str(user_id)
+    with _active_lock:
+        _active[key] = (time.monotonic() + settings.AUTH_REVOCATION_TTL, active)
+        _active.move_to_end(key)
+        while len(_active) > settings.AUTH_REVOCATION_CACHE_SIZE:
+            _active.popitem(last=False)
+    return active
+
+
+def is_user_active(user_id):
+    """``is_active`` of a user, from the local cache while it is fresh."""
+    from .models import User
+
+    active = _cached_active(user_id)
+    if active is None:
+        active = User.objects.filter(id=user_id).values_list("is_active", flat=True).first()
+        active = _remember_active(user_id, bool(active))
+    return active
+
+
+async def ais_user_active(user_id):
+    """Async ``is_user_active``; a cache hit does not leave the event loop."""
+    from .models import User
+
+    active = _cached_active(user_id)
+    if active is None:
+        active = await User.objects.filter(id=user_id).values_list("is_active", flat=True).afirst()
+        active = _remember_active(user_id, bool(active))
+    return active
+
+
+def forget_user(user_id=None):
+    """Drop cached revocation state for one user, or for everyone."""
+    with _active_lock:
+        if user_id is None:
+            _active.clear()
+        else:
+            _active.pop(str(user_id), None)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticate as a RidePrincipal built from the token's claims.
+    Tokens issued without the role claims fall back to loading the user.
+    """
+
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in ROLE_CLAIMS):
+            return JWTAuthentication.get_user(self, validated_token)
+        principal = super().get_user(validated_token)
+        if not is_user_active(principal.id):
+            raise AuthenticationFailed("User is inactive or no longer exists.", code="user_inactive")
+        return principal
+
+
+async def aauthenticate(request):
+    """
+    Async counterpart of StatelessJWTAuthentication for plain Django views.
+    :return: the principal, or None when the request carries no token.
+    :raises: InvalidToken or AuthenticationFailed.
+    """
+    auth = StatelessJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    validated_token = auth.get_validated_token(raw_token)
+    if not all(claim in validated_token for claim in ROLE_CLAIMS):
+        from .models import User
+
+        try:
+            user = await User.objects.aget(
+                id=validated_token[api_settings.USER_ID_CLAIM], is_active=True
+            )
+        except User.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        return user
+    principal = RidePrincipal(validated_token)
+    if not await ais_user_active(principal.id):
+        raise AuthenticationFailed("User is inactive or no longer exists.", code="user_inactive")
+    return principal
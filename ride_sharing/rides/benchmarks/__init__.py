@@ -0,0 +1,71 @@
+"""
+Micro-benchmarks runnable with ``manage.py benchmark <suite>``.
+
+Each suite module exposes ``run(**params)`` returning a flat dict of results.
+Suites that need a database and channel layer are meant to run with
+``ride_sharing.settings_bench`` (local PostGIS, no Redis).
+"""
+import statistics
+from importlib import import_module
+
+SUITES = {
+    "accept": "rides.benchmarks.accept",
+    "async_views": "rides.benchmarks.async_views",
+    "fanout": "rides.benchmarks.fanout",
+    "geo": "rides.benchmarks.geo",
+    "ingest": "rides.benchmarks.ingest",
+    "matching": "rides.benchmarks.matching",
+    "metrics": "rides.benchmarks.metrics",
+    "nearby": "rides.benchmarks.nearby",
+    "rendering": "rides.benchmarks.rendering",
+    "ride_request": "rides.benchmarks.ride_request",
+    "tracking": "rides.benchmarks.tracking",
+}
+
+# Result keys compared across runs, by suffix: True when higher is better
+DIRECTIONS = {"_ms": False, "_us": False, "_per_second": True, "_speedup": True}
+
+
+def run_suite(name, **params):
+    return import_module(SUITES[name]).run(**params)
+
+
+def latency_stats(latencies_ms, prefix=""):
+    """p50/p99/max of a list of latencies in milliseconds."""
+    ordered = sorted(latencies_ms)
+    if not ordered:
+        return {}
+    return {
+        f"{prefix}p50_ms": round(statistics.median(ordered), 3),
+        f"{prefix}p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+        f"{prefix}max_ms": round(ordered[-1], 3),
+    }
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Compare two ``{suite: {key: value}}`` result sets.
+    :return: ``(suite, key, old, new, change)`` for every timing or rate that
+        got worse by more than ``threshold`` (a fraction); ``change`` is the
+        relative change, positive meaning worse.
+    """
+    regressions = []
+    for suite, results in current.items():
+        old_results = baseline.get(suite, {})
+        for key, new in results.items():
+            old = old_results.get(key)
+            higher_is_better = next(
+                (better for suffix, better in DIRECTIONS.items() if key.endswith(suffix)), None
+            )
+            if higher_is_better is None or not _is_number(old) or not _is_number(new) or not old:
+                continue
+            change = (new - old) / old
+            if higher_is_better:
+                change = -change
+            if change > threshold:
+                regressions.append((suite, key, old, new, change))
+    return regressions
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
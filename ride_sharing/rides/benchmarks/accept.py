@@ -0,0 +1,85 @@
+"""
+RideStatusUpdateView accept contention: ``drivers`` threads race to accept
+the same requested ride, ``rides`` times over.
+
+Each driver uses its own database connection, so the race is real and the
+rows are committed; every user and ride the run creates is deleted
+afterwards. Exactly one accept per ride should succeed (``accepted`` equals
+``rides``) and the rest should get 409.
+"""
+import threading
+import time
+import uuid
+
+from django.contrib.gis.geos import Point
+from django.db import connection
+from rest_framework.test import APIClient
+
+from rides.benchmarks import latency_stats
+from rides.models import Ride, User
+from rides.tokens import RideRefreshToken
+
+CENTER = (77.5946, 12.9716)
+
+
+def _accept(token, ride_id, barrier, out):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    try:
+        barrier.wait()
+        started = time.perf_counter()
+        response = client.patch(
+            f"/api/rides/{ride_id}/status/", {"status": "in_progress"}, format="json"
+        )
+        out.append(((time.perf_counter() - started) * 1000, response.status_code))
+    finally:
+        connection.close()
+
+
+def run(rides=20, drivers=16):
+    rides, drivers = int(rides), int(drivers)
+    point = Point(*CENTER, srid=4326)
+    tag = uuid.uuid4().hex[:8]
+    users = User.objects.bulk_create(
+        [
+            User(email=f"bench-{tag}-driver-{i}@example.com", is_driver=True, current_location=point)
+            for i in range(drivers)
+        ]
+        + [User(email=f"bench-{tag}-rider@example.com", is_rider=True)]
+    )
+    driver_ids, rider = [u.id for u in users[:-1]], users[-1]
+    tokens = [str(RideRefreshToken.for_user(u).access_token) for u in users[:-1]]
+
+    latencies, statuses, winners = [], {}, 0
+    started = time.perf_counter()
+    try:
+        for _ in range(rides):
+            User.objects.filter(id__in=driver_ids).update(is_available=True)
+            ride = Ride.objects.create(
+                rider=rider, pickup_location=point, dropoff_location=point, status="requested"
+            )
+            barrier, out = threading.Barrier(drivers), []
+            threads = [
+                threading.Thread(target=_accept, args=(token, ride.id, barrier, out))
+                for token in tokens
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for latency, code in out:
+                latencies.append(latency)
+                statuses[code] = statuses.get(code, 0) + 1
+            winners += sum(1 for _, code in out if code == 200)
+        elapsed = time.perf_counter() - started
+    finally:
+        User.objects.filter(id__in=[*driver_ids, rider.id]).delete()
+
+    return {
+        "rides": rides,
+        "drivers": drivers,
+        "accepted": winners,
+        **latency_stats(latencies),
+        "accepts_per_second": round(rides / elapsed, 1),
+        **{f"status_{code}": count for code, count in sorted(statuses.items())},
+    }
@@ -0,0 +1,116 @@
+"""
+Latency and throughput of the sync (DRF) and async (``api/async/``) ride
+endpoints under ASGI, with many concurrent clients on one event loop.
+
+Requests are fed straight into Django's ASGI handler, so the numbers include
+the whole request path (middleware, authentication, view, cache and ORM) but
+no network. Needs the configured database and cache; the rider, ride and
+any rides created by the run are deleted afterwards.
+"""
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from django.contrib.gis.geos import Point
+from django.core.asgi import get_asgi_application
+
+from rides.models import Ride, User
+from rides.tokens import RideRefreshToken
+
+CENTER = (77.5946, 12.9716)
+
+
+async def _call(app, method, path, headers, body):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": headers,
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 50000),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status_code = None
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()  # never disconnects
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+async def _load(app, method, path, headers, body, clients, requests):
+    latencies, statuses = [], {}
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            started = time.perf_counter()
+            code = await _call(app, method, path, headers, body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(clients)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        **{f"status_{code}": count for code, count in sorted(statuses.items())},
+    }
+
+
+def run(endpoint="location", clients=500, requests=5000):
+    """``endpoint`` is ``location`` (GET, cache-backed) or ``request`` (POST, creates rides)."""
+    clients, requests = int(clients), int(requests)
+    if endpoint not in ("location", "request"):
+        raise ValueError("endpoint must be 'location' or 'request'")
+
+    point = Point(*CENTER, srid=4326)
+    rider = User.objects.create_user(email=f"bench-{uuid.uuid4().hex}@example.com", is_rider=True)
+    try:
+        ride = Ride.objects.create(
+            rider=rider, pickup_location=point, dropoff_location=point, current_location=point
+        )
+        token = RideRefreshToken.for_user(rider).access_token
+        headers = [
+            (b"host", b"localhost"),
+            (b"authorization", f"Bearer {token}".encode()),
+            (b"content-type", b"application/json"),
+        ]
+        if endpoint == "location":
+            method, body = "GET", b""
+            paths = {
+                "sync": f"/api/rides/{ride.id}/location/",
+                "async": f"/api/async/rides/{ride.id}/location/",
+            }
+        else:
+            method = "POST"
+            location = {"latitude": CENTER[1], "longitude": CENTER[0]}
+            body = json.dumps({"pickup_location": location, "dropoff_location": location}).encode()
+            paths = {"sync": "/api/rides/request/", "async": "/api/async/rides/request/"}
+
+        app = get_asgi_application()
+        results = {"endpoint": endpoint, "clients": clients, "requests": requests}
+        for variant, path in paths.items():
+            stats = asyncio.run(_load(app, method, path, headers, body, clients, requests))
+            results.update({f"{variant}_{key}": value for key, value in stats.items()})
+        return results
+    finally:
+        rider.delete()
@@ -0,0 +1,90 @@
+"""
+WebSocket fan-out of ride location updates to ``subscribers`` sockets on one
+ride, through apublish_ride_locations, the in-memory channel layer and
+RideTrackingConsumer.
+
+Each update is timed from publish until every subscriber has its frame.
+The consumers' ride snapshot lookup is answered in-process, so no database
+or cache is needed.
+"""
+import asyncio
+import time
+import uuid
+from unittest import mock
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.gis.geos import Point
+from django.test import override_settings
+
+from rides.benchmarks import latency_stats
+from rides.broadcast import apublish_ride_locations
+from rides.frames import SUBPROTOCOL
+from rides.position_cache import RideSnapshot
+from rides.routing import websocket_urlpatterns
+
+CENTER = (77.5946, 12.9716)
+
+
+class _Snapshot(RideSnapshot):
+    # Every benchmark socket may follow the ride
+    def can_view(self, user_id):
+        return True
+
+
+def _as_user(app, user):
+    async def wrapped(scope, receive, send):
+        return await app(dict(scope, user=user), receive, send)
+
+    return wrapped
+
+
+async def _fan_out(subscribers, updates, binary):
+    ride_id = str(uuid.uuid4())
+    rider = mock.Mock(id=str(uuid.uuid4()), is_authenticated=True)
+    app = _as_user(URLRouter(websocket_urlpatterns), rider)
+    sockets = [
+        WebsocketCommunicator(
+            app, f"/ws/ride-tracking/{ride_id}/", subprotocols=[SUBPROTOCOL] if binary else None
+        )
+        for _ in range(subscribers)
+    ]
+    for socket in sockets:
+        connected, _ = await socket.connect()
+        assert connected
+
+    latencies = []
+    started = time.perf_counter()
+    for step in range(updates):
+        location = Point(CENTER[0] + step * 1e-4, CENTER[1], srid=4326)
+        update_started = time.perf_counter()
+        await apublish_ride_locations({ride_id: location})
+        await asyncio.gather(*[socket.receive_output(timeout=10) for socket in sockets])
+        latencies.append((time.perf_counter() - update_started) * 1000)
+    elapsed = time.perf_counter() - started
+
+    for socket in sockets:
+        await socket.disconnect()
+    return latencies, elapsed
+
+
+def run(subscribers=1000, updates=50, binary=0):
+    subscribers, updates, binary = int(subscribers), int(updates), bool(int(binary))
+    layers = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+    async def snapshot(ride_id):
+        members = {"rider_id": None, "driver_id": None, "status": "in_progress"}
+        return _Snapshot(ride_id, members, {"location": None, "ts": 0})
+
+    with override_settings(CHANNEL_LAYERS=layers), mock.patch(
+        "rides.consumer.position_cache.aget_snapshot", snapshot
+    ):
+        latencies, elapsed = asyncio.run(_fan_out(subscribers, updates, binary))
+
+    return {
+        "subscribers": subscribers,
+        "updates": updates,
+        "binary": binary,
+        **latency_stats(latencies),
+        "messages_per_second": round(subscribers * updates / elapsed),
+    }
@@ -0,0 +1,52 @@
+"""Throughput of the rides.geo kernels against a per-point Python loop."""
+import math
+import statistics
+import time
+
+import numpy as np
+
+from rides.geo import EARTH_RADIUS_M, bearing, eta_seconds, haversine, haversine_matrix
+
+CENTER = (77.5946, 12.9716)
+
+
+def _python_haversine(origin, coords):
+    lng1, lat1 = map(math.radians, origin)
+    out = []
+    for lng, lat in coords:
+        lng2, lat2 = math.radians(lng), math.radians(lat)
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        out.append(2 * EARTH_RADIUS_M * math.asin(math.sqrt(a)))
+    return out
+
+
+def _median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run(candidates=10000, riders=1000, drivers=5000, repeat=5, seed=0):
+    candidates, riders, drivers, repeat = int(candidates), int(riders), int(drivers), int(repeat)
+    rng = np.random.default_rng(int(seed))
+    coords = np.asarray(CENTER) + rng.normal(0, 0.2, (candidates, 2))
+    coord_list = coords.tolist()
+    origins = np.asarray(CENTER) + rng.normal(0, 0.2, (riders, 2))
+    destinations = np.asarray(CENTER) + rng.normal(0, 0.2, (drivers, 2))
+
+    haversine_ms = _median_ms(lambda: haversine(CENTER, coords), repeat)
+    python_ms = _median_ms(lambda: _python_haversine(CENTER, coord_list), repeat)
+    return {
+        "candidates": candidates,
+        "haversine_ms": round(haversine_ms, 3),
+        "haversine_ns_per_point": round(haversine_ms * 1e6 / candidates, 1),
+        "python_loop_ms": round(python_ms, 3),
+        "speedup": round(python_ms / haversine_ms, 1),
+        "bearing_ms": round(_median_ms(lambda: bearing(CENTER, coords), repeat), 3),
+        "eta_ms": round(_median_ms(lambda: eta_seconds(haversine(CENTER, coords)), repeat), 3),
+        "matrix_shape": f"{riders}x{drivers}",
+        "matrix_ms": round(_median_ms(lambda: haversine_matrix(origins, destinations), repeat), 3),
+    }
@@ -0,0 +1,92 @@
+"""
+Driver GPS ingest throughput through the ASGI stack.
+
+Opens one WebSocket per simulated driver against DriverLocationConsumer on
+the in-memory channel layer and measures how many pings per second one event
+loop validates and batches. Flushes are counted but not persisted.
+"""
+import asyncio
+import json
+import random
+import time
+from unittest import mock
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import override_settings
+
+from rides.ingest import PingBatcher
+from rides.routing import websocket_urlpatterns
+
+CENTER = (77.5946, 12.9716)
+
+
+def _as_driver(app, driver_id):
+    user = mock.Mock(id=driver_id, is_authenticated=True, is_driver=True)
+
+    async def wrapped(scope, receive, send):
+        return await app(dict(scope, user=user), receive, send)
+
+    return wrapped
+
+
+async def _drive(drivers, pings, batcher):
+    app = URLRouter(websocket_urlpatterns)
+    sockets = [
+        WebsocketCommunicator(_as_driver(app, f"driver-{i}"), "/ws/driver/location/")
+        for i in range(drivers)
+    ]
+    for socket in sockets:
+        connected, _ = await socket.connect()
+        assert connected
+    messages = [
+        [
+            json.dumps(
+                {
+                    "lat": CENTER[1] + random.uniform(-0.1, 0.1),
+                    "lng": CENTER[0] + random.uniform(-0.1, 0.1),
+                }
+            )
+            for _ in range(pings)
+        ]
+        for _ in range(drivers)
+    ]
+
+    total = drivers * pings
+    started = time.perf_counter()
+    for round_ in range(pings):
+        for socket, driver_messages in zip(sockets, messages):
+            await socket.send_to(text_data=driver_messages[round_])
+        await asyncio.sleep(0)
+    while batcher.accepted + batcher.dropped < total:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+
+    for socket in sockets:
+        await socket.disconnect()
+    return elapsed
+
+
+def run(drivers=1000, pings=20, flush_interval=0.25):
+    drivers, pings, flush_interval = int(drivers), int(pings), float(flush_interval)
+    flushed = []
+
+    async def count_flush(positions):
+        flushed.append(len(positions))
+
+    # No rate limit, so every ping counts toward throughput
+    batcher = PingBatcher(min_interval=0, flush_interval=flush_interval, flush=count_flush)
+    layers = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    with override_settings(CHANNEL_LAYERS=layers), mock.patch("rides.ingest._batcher", batcher):
+        elapsed = asyncio.run(_drive(drivers, pings, batcher))
+
+    total = drivers * pings
+    return {
+        "drivers": drivers,
+        "pings": total,
+        "accepted": batcher.accepted,
+        "duration_ms": round(elapsed * 1000, 3),
+        "pings_per_second": round(total / elapsed),
+        "flushes": len(flushed),
+        "positions_flushed": sum(flushed),
+    }
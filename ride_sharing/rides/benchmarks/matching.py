@@ -0,0 +1,46 @@
+"""Assignment time for a rider x driver batch, exact solver against greedy."""
+import statistics
+import time
+
+import numpy as np
+
+from rides.geo import haversine_matrix
+from rides.matching import greedy_assignment, solve_assignment
+
+CENTER = (77.5946, 12.9716)
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def run(riders=1000, drivers=5000, repeat=3, spread=0.2, max_distance=20000, seed=0):
+    rng = np.random.default_rng(int(seed))
+    riders, drivers, repeat = int(riders), int(drivers), int(repeat)
+    max_distance = float(max_distance)
+    ride_coords = np.asarray(CENTER) + rng.normal(0, float(spread), (riders, 2))
+    driver_coords = np.asarray(CENTER) + rng.normal(0, float(spread), (drivers, 2))
+
+    matrix_ms, cost = _timed(lambda: haversine_matrix(ride_coords, driver_coords), repeat)
+    exact_ms, (rows, cols) = _timed(
+        lambda: solve_assignment(cost, max_cost=max_distance, exact_limit=cost.size), repeat
+    )
+    greedy_ms, (g_rows, g_cols) = _timed(lambda: greedy_assignment(cost), repeat)
+    g_keep = cost[g_rows, g_cols] <= max_distance
+
+    return {
+        "riders": riders,
+        "drivers": drivers,
+        "cost_matrix_ms": round(matrix_ms, 3),
+        "hungarian_ms": round(exact_ms, 3),
+        "hungarian_matched": int(len(rows)),
+        "hungarian_mean_pickup_m": round(float(cost[rows, cols].mean()), 1) if len(rows) else None,
+        "greedy_ms": round(greedy_ms, 3),
+        "greedy_matched": int(g_keep.sum()),
+        "greedy_mean_pickup_m": round(float(cost[g_rows, g_cols][g_keep].mean()), 1) if g_keep.any() else None,
+    }
@@ -0,0 +1,82 @@
+"""
+Overhead of rides.metrics on the request path.
+
+``middleware_overhead_us`` is MetricsMiddleware around a view that returns a
+ready response, minus the bare view, per request; ``within_budget`` checks it
+against ``budget_us``. The full stack is timed too, with GET /api/ through the
+test client with and without the middleware. ``render_ms`` is a /metrics
+scrape after every URL name has been observed. No database is needed.
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.urls import resolve
+
+from rides.benchmarks import latency_stats
+from rides.metrics import HTTP_REQUEST_DURATION, MetricsMiddleware, metrics_view
+
+
+def _per_call_us(func, arg, calls, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func(arg)
+        timings.append((time.perf_counter() - started) * 1e6 / calls)
+    return statistics.median(timings)
+
+
+def _client_latencies(middleware, requests):
+    with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=["testserver"]):
+        client = Client()
+        client.get("/api/")
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get("/api/")
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run(calls=100000, requests=2000, repeat=5, budget_us=50):
+    calls, requests, repeat, budget_us = int(calls), int(requests), int(repeat), float(budget_us)
+
+    request = RequestFactory().get("/api/")
+    request.resolver_match = resolve("/api/")
+    response = HttpResponse()
+
+    def view(request):
+        return response
+
+    bare_us = _per_call_us(view, request, calls, repeat)
+    wrapped_us = _per_call_us(MetricsMiddleware(view), request, calls, repeat)
+    overhead_us = wrapped_us - bare_us
+
+    child = HTTP_REQUEST_DURATION.labels("api-root", "GET", "2xx")
+    observe_us = _per_call_us(child.observe, 0.004, calls, repeat)
+
+    without = [m for m in settings.MIDDLEWARE if m != "rides.metrics.MetricsMiddleware"]
+    with_ = ["rides.metrics.MetricsMiddleware", *without]
+    bare_ms = latency_stats(_client_latencies(without, requests), "bare_")
+    instrumented_ms = latency_stats(_client_latencies(with_, requests))
+
+    with override_settings(METRICS_REDIS_URL=None, METRICS_TOKEN=None):
+        scrape = RequestFactory().get("/metrics")
+        started = time.perf_counter()
+        for _ in range(repeat):
+            metrics_view(scrape)
+        render_ms = (time.perf_counter() - started) * 1000 / repeat
+
+    return {
+        "calls": calls,
+        "middleware_overhead_us": round(overhead_us, 3),
+        "observe_us": round(observe_us, 3),
+        "budget_us": budget_us,
+        "within_budget": overhead_us < budget_us,
+        **instrumented_ms,
+        **bare_ms,
+        "render_ms": round(render_ms, 3),
+    }
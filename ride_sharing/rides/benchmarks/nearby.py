@@ -0,0 +1,54 @@
+"""
+get_nearby_drivers latency at several fleet sizes.
+
+For each size a synthetic fleet (rides.synthetic) is seeded inside a
+transaction that is rolled back afterwards. Riders query from the same hot
+spots, once through the warm driver index and once straight against PostGIS
+(``nearby_drivers_queryset`` over the largest search radius).
+"""
+import time
+
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.db import transaction
+
+from rides.benchmarks import latency_stats
+from rides.driver_index import warm_driver_index
+from rides.synthetic import SyntheticLoader, hotspot_points
+from rides.utils import DRIVER_SEARCH_RADII, get_nearby_drivers, nearby_drivers_queryset
+
+
+def _timed_queries(func, points):
+    latencies = []
+    for lng, lat in points:
+        location = Point(lng, lat, srid=4326)
+        started = time.perf_counter()
+        func(location)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run(fleets="1000,10000,100000", queries=200, seed=0):
+    sizes = [int(size) for size in str(fleets).split(",")]
+    queries, seed = int(queries), int(seed)
+    riders = hotspot_points(np.random.default_rng(seed + 1), queries).tolist()
+    results = {"queries": queries}
+
+    for size in sizes:
+        with transaction.atomic():
+            SyntheticLoader(seed=seed).users(size, is_driver=True)
+            started = time.perf_counter()
+            warm_driver_index()
+            results[f"drivers_{size}_warm_index_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+            indexed = _timed_queries(get_nearby_drivers, riders)
+            postgis = _timed_queries(
+                lambda p: list(nearby_drivers_queryset(p, DRIVER_SEARCH_RADII[-1])), riders
+            )
+            results.update(latency_stats(indexed, prefix=f"drivers_{size}_index_"))
+            results.update(latency_stats(postgis, prefix=f"drivers_{size}_postgis_"))
+            transaction.set_rollback(True)
+
+    # Drop the rolled-back drivers from the in-process index
+    warm_driver_index()
+    return results
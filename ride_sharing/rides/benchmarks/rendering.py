@@ -0,0 +1,92 @@
+"""
+Cost of rendering a 1,000-ride list with DRF's JSONRenderer against
+rides.renderers.FastJSONRenderer, plus parsing it back.
+
+Rides are unsaved model instances, so no database is needed. ``serialize_ms``
+is the serializer's own cost (the same for both renderers); ``native`` renders
+plain dicts of UUIDs, datetimes and Points, which only the fast encoder takes
+without a serializer in front of it.
+"""
+import io
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.gis.geos import Point
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from rides import fastjson
+from rides.models import Ride
+from rides.renderers import FastJSONParser, FastJSONRenderer
+from rides.serializers import RideSerializer
+
+CENTER = (77.5946, 12.9716)
+
+
+def _median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _point():
+    return Point(CENTER[0] + random.uniform(-0.1, 0.1), CENTER[1] + random.uniform(-0.1, 0.1), srid=4326)
+
+
+def run(rides=1000, repeat=20):
+    rides, repeat = int(rides), int(repeat)
+    now = timezone.now()
+    instances = [
+        Ride(
+            id=uuid.uuid4(),
+            rider_id=uuid.uuid4(),
+            driver_id=uuid.uuid4(),
+            status="in_progress",
+            pickup_location=_point(),
+            dropoff_location=_point(),
+            current_location=_point(),
+            created_at=now,
+            updated_at=now,
+        )
+        for _ in range(rides)
+    ]
+
+    started = time.perf_counter()
+    data = RideSerializer(instances, many=True).data
+    serialize_ms = (time.perf_counter() - started) * 1000
+
+    drf, fast = JSONRenderer(), FastJSONRenderer()
+    body = drf.render(data)
+    native = [
+        {
+            "id": ride.id,
+            "status": ride.status,
+            "rider": ride.rider_id,
+            "current_location": ride.current_location,
+            "created_at": ride.created_at,
+        }
+        for ride in instances
+    ]
+
+    drf_render_ms = _median_ms(lambda: drf.render(data), repeat)
+    fast_render_ms = _median_ms(lambda: fast.render(data), repeat)
+    drf_parse_ms = _median_ms(lambda: JSONParser().parse(io.BytesIO(body)), repeat)
+    fast_parse_ms = _median_ms(lambda: FastJSONParser().parse(io.BytesIO(body)), repeat)
+    return {
+        "rides": rides,
+        "bytes": len(body),
+        "serialize_ms": round(serialize_ms, 3),
+        "drf_render_ms": round(drf_render_ms, 3),
+        "fast_render_ms": round(fast_render_ms, 3),
+        "render_speedup": round(drf_render_ms / fast_render_ms, 1),
+        "drf_parse_ms": round(drf_parse_ms, 3),
+        "fast_parse_ms": round(fast_parse_ms, 3),
+        "parse_speedup": round(drf_parse_ms / fast_parse_ms, 1),
+        "native_render_ms": round(_median_ms(lambda: fastjson.dumps(native), repeat), 3),
+    }
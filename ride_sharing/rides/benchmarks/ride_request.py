@@ -0,0 +1,54 @@
+"""
+RideRequestView end to end: JWT authentication, ride insert and the nearest
+driver lookup, through DRF's test client (no network).
+
+A synthetic fleet and one rider are seeded inside a transaction that is
+rolled back afterwards, together with the rides the run creates.
+"""
+import time
+
+import numpy as np
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from rides.benchmarks import latency_stats
+from rides.driver_index import warm_driver_index
+from rides.models import User
+from rides.synthetic import SyntheticLoader, hotspot_points
+from rides.tokens import RideRefreshToken
+
+
+def run(requests=500, drivers=10000, seed=0):
+    requests, drivers, seed = int(requests), int(drivers), int(seed)
+    pickups = hotspot_points(np.random.default_rng(seed + 1), requests).tolist()
+    latencies, statuses = [], {}
+
+    with transaction.atomic():
+        SyntheticLoader(seed=seed).users(drivers, is_driver=True)
+        warm_driver_index()
+        rider = User.objects.create_user(email="bench-rider@example.com", is_rider=True)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RideRefreshToken.for_user(rider).access_token}")
+
+        started = time.perf_counter()
+        for lng, lat in pickups:
+            location = {"latitude": lat, "longitude": lng}
+            request_started = time.perf_counter()
+            response = client.post(
+                "/api/rides/request/",
+                {"pickup_location": location, "dropoff_location": location},
+                format="json",
+            )
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        elapsed = time.perf_counter() - started
+        transaction.set_rollback(True)
+
+    warm_driver_index()
+    return {
+        "requests": requests,
+        "drivers": drivers,
+        **latency_stats(latencies),
+        "requests_per_second": round(requests / elapsed, 1),
+        **{f"status_{code}": count for code, count in sorted(statuses.items())},
+    }
@@ -0,0 +1,78 @@
+"""
+Ride tracking throughput: ``simulate_ride_tracking`` wake-ups (one ride per
+task run) against the batched ``advance_in_progress_rides`` tick.
+
+In-progress rides are seeded inside a transaction that is rolled back
+afterwards. Chains run in-process: the tracker registry always reports the
+chain as current and the re-scheduling ``apply_async`` is not sent.
+"""
+import statistics
+import time
+from unittest import mock
+
+from django.contrib.gis.geos import Point
+from django.db import transaction
+
+from rides.models import Ride, User
+from rides.tasks import simulate_ride_tracking
+from rides.tracking import advance_in_progress_rides
+
+CENTER = (77.5946, 12.9716)
+
+
+class _CurrentChains:
+    def heartbeat(self, ride_id, generation):
+        return True
+
+    def release(self, ride_id, generation):
+        pass
+
+
+def run(rides=1000, chains=200, ticks=5):
+    rides, ticks = int(rides), int(ticks)
+    chains = min(int(chains), rides)
+    point = Point(*CENTER, srid=4326)
+
+    with transaction.atomic():
+        rider = User.objects.create_user(email="bench-tracking-rider@example.com", is_rider=True)
+        driver = User.objects.create_user(email="bench-tracking-driver@example.com", is_driver=True)
+        ride_ids = [
+            ride.id
+            for ride in Ride.objects.bulk_create(
+                [
+                    Ride(
+                        rider=rider,
+                        driver=driver,
+                        status="in_progress",
+                        pickup_location=point,
+                        dropoff_location=point,
+                        current_location=point,
+                    )
+                    for _ in range(rides)
+                ],
+                batch_size=5000,
+            )
+        ]
+
+        tick_ms = []
+        for _ in range(ticks):
+            started = time.perf_counter()
+            advance_in_progress_rides()
+            tick_ms.append((time.perf_counter() - started) * 1000)
+
+        with mock.patch("rides.tasks.get_tracker_registry", return_value=_CurrentChains()), \
+                mock.patch.object(simulate_ride_tracking, "apply_async"):
+            started = time.perf_counter()
+            for ride_id in ride_ids[:chains]:
+                simulate_ride_tracking(ride_id, 1)
+            chain_s = time.perf_counter() - started
+        transaction.set_rollback(True)
+
+    tick = statistics.median(tick_ms)
+    return {
+        "rides": rides,
+        "tick_ms": round(tick, 3),
+        "tick_rides_per_second": round(rides / tick * 1000),
+        "chain_wakeup_ms": round(chain_s * 1000 / chains, 3),
+        "chain_rides_per_second": round(chains / chain_s),
+    }
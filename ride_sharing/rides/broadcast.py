@@ -0,0 +1,94 @@
+"""
+Fan-out of ride location updates to the tracking WebSocket groups.
+
+Every update is serialized here once per group, both as JSON text and as
+binary frames (see rides.frames), so consumers only pick which bytes to send.
+"""
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .fastjson import dumps_text
+from .frames import FrameEncoder, encode_keyframe, quantize
+from .metrics import GROUP_SEND_DURATION
+
+_encoder = FrameEncoder()
+
+# Every publish also sends one event with all its rides to this group, which
+# the multiplexed dispatch consumers subscribe to.
+DISPATCH_GROUP = "dispatch"
+
+
+def ride_group_name(ride_id):
+    return f"ride_{ride_id}"
+
+
+def location_event(location, ride_id=None):
+    """
+    Build the group event for a new position.
+    With ``ride_id`` the event also carries the pre-encoded binary frames.
+    """
+    payload = {"lat": location.y, "lng": location.x}
+    event = {
+        "type": "send_location_update",
+        "location": payload,
+        "text": dumps_text(payload),
+    }
+    if ride_id is not None:
+        event.update(_encoder.encode(ride_id, location.y, location.x))
+    return event
+
+
+def snapshot_event(location):
+    """
+    Event for the position pushed to a single socket right after it connects.
+    It is a standalone keyframe, so the next published update reaches the
+    socket as a keyframe as well.
+    """
+    event = location_event(location)
+    event.update(
+        {
+            "seq": 0,
+            "prev_seq": None,
+            "keyframe": encode_keyframe(0, *quantize(location.y, location.x)),
+            "delta": None,
+        }
+    )
+    return event
+
+
+def dispatch_event(locations):
+    return {
+        "type": "dispatch_update",
+        "rides": {str(ride_id): [p.y, p.x] for ride_id, p in locations.items()},
+    }
+
+
+async def _timed_group_send(channel_layer, kind, group, event):
+    started = time.perf_counter()
+    await channel_layer.group_send(group, event)
+    GROUP_SEND_DURATION.labels(kind).observe(time.perf_counter() - started)
+
+
+async def apublish_ride_locations(locations, channel_layer=None):
+    """
+    Send one location update per ride group, plus a single batched event to
+    the dispatch group; ``locations`` maps ride id to Point.
+    """
+    channel_layer = channel_layer or get_channel_layer()
+    await asyncio.gather(
+        *[
+            _timed_group_send(
+                channel_layer, "ride", ride_group_name(ride_id), location_event(location, ride_id)
+            )
+            for ride_id, location in locations.items()
+        ],
+        _timed_group_send(channel_layer, "dispatch", DISPATCH_GROUP, dispatch_event(locations)),
+    )
+
+
+def publish_ride_locations(locations, channel_layer=None):
+    if locations:
+        async_to_sync(apublish_ride_locations)(locations, channel_layer)
@@ -1,21 +1,230 @@
-from channels.generic.websocket import AsyncWebsocketConsumer
-import json
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
+from django.conf import settings
+from rest_framework_simplejwt.models import TokenUser
+import asyncio
+
+from . import fastjson, position_cache
+from .broadcast import DISPATCH_GROUP, snapshot_event
+from .frames import SUBPROTOCOL
+from .ingest import InvalidPing, get_ping_batcher, parse_ping
+from .metrics import WEBSOCKET_CONNECTIONS
+from .models import User
 
 
 class RideTrackingConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.ride_id = self.scope["url_route"]["kwargs"]["ride_id"]
         self.ride_group_name = f"ride_{self.ride_id}"
+        self.sender = None
+        self.joined = False
+
+        # Only the ride's rider and driver may subscribe
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        snapshot = await position_cache.aget_snapshot(self.ride_id)
+        if snapshot is None or not snapshot.can_view(user.id):
+            await self.close(code=4403)
+            return
+
+        # Clients that negotiate the binary subprotocol get compact frames
+        self.binary = SUBPROTOCOL in self.scope.get("subprotocols", [])
+        self.last_seq = None
+        self.pending = None
 
         # Join ride group
         await self.channel_layer.group_add(self.ride_group_name, self.channel_name)
-        await self.accept()
+        self.joined = True
+        WEBSOCKET_CONNECTIONS.labels("ride_tracking").inc()
+        await self.accept(subprotocol=SUBPROTOCOL if self.binary else None)
+
+        # Push the latest known position right away instead of waiting for the next tick
+        if snapshot.location is not None:
+            await self.send_event(snapshot_event(snapshot.location))
 
     async def disconnect(self, close_code):
+        if self.sender is not None:
+            self.sender.cancel()
         # Leave ride group
-        await self.channel_layer.group_discard(self.ride_group_name, self.channel_name)
+        if self.joined:
+            WEBSOCKET_CONNECTIONS.labels("ride_tracking").dec()
+            await self.channel_layer.group_discard(self.ride_group_name, self.channel_name)
 
     async def send_location_update(self, event):
+        # Only the newest position is kept while a send is in flight, so a
+        # slow client skips stale intermediate positions instead of queueing them.
+        self.pending = event
+        if self.sender is None or self.sender.done():
+            self.sender = asyncio.ensure_future(self.drain_pending())
+
+    async def drain_pending(self):
+        while self.pending is not None:
+            event, self.pending = self.pending, None
+            await self.send_event(event)
+
+    async def send_event(self, event):
         # Send location update to WebSocket
-        location = event["location"]
-        await self.send(text_data=json.dumps(location))
+        if self.binary and "keyframe" in event:
+            # A delta is only valid on top of the frame it was computed against
+            if event["delta"] is not None and event["prev_seq"] == self.last_seq:
+                frame = event["delta"]
+            else:
+                frame = event["keyframe"]
+            self.last_seq = event["seq"]
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=event.get("text") or fastjson.dumps_text(event["location"]))
+
+
+class DispatchConsumer(AsyncJsonWebsocketConsumer):
+    """
+    One socket following many rides, for staff dashboards.
+
+    Clients send ``{"action": "subscribe" | "unsubscribe", "rides": [ids]}``
+    and ``{"action": "bbox", "bbox": [min_lng, min_lat, max_lng, max_lat]}``
+    (``null`` clears it). Every DISPATCH_FLUSH_INTERVAL the socket receives
+    ``{"type": "positions", "rides": {id: [lat, lng]}}`` holding the latest
+    position of every ride in view that moved since the previous frame.
+    """
+
+    @classmethod
+    async def decode_json(cls, text_data):
+        return fastjson.loads(text_data)
+
+    @classmethod
+    async def encode_json(cls, content):
+        return fastjson.dumps_text(content)
+
+    async def connect(self):
+        self.rides = set()
+        self.bbox = None
+        self.changed = {}
+        self.flusher = None
+
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        if not await user_flag(user, "is_staff"):
+            await self.close(code=4403)
+            return
+
+        await self.channel_layer.group_add(DISPATCH_GROUP, self.channel_name)
+        await self.accept()
+        WEBSOCKET_CONNECTIONS.labels("dispatch").inc()
+        self.flusher = asyncio.ensure_future(self.flush_periodically())
+
+    async def disconnect(self, close_code):
+        if self.flusher is not None:
+            WEBSOCKET_CONNECTIONS.labels("dispatch").dec()
+            self.flusher.cancel()
+            await self.channel_layer.group_discard(DISPATCH_GROUP, self.channel_name)
+
+    async def receive_json(self, content):
+        action = content.get("action")
+        if action in ("subscribe", "unsubscribe"):
+            ride_ids = content.get("rides")
+            if not isinstance(ride_ids, list):
+                await self.send_json({"type": "error", "error": "'rides' must be a list."})
+                return
+            ride_ids = {str(ride_id) for ride_id in ride_ids}
+            if action == "subscribe":
+                self.rides |= ride_ids
+            else:
+                self.rides -= ride_ids
+        elif action == "bbox":
+            bbox = content.get("bbox")
+            if bbox is not None:
+                try:
+                    min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox)
+                except (TypeError, ValueError):
+                    error = "'bbox' must be [min_lng, min_lat, max_lng, max_lat]."
+                    await self.send_json({"type": "error", "error": error})
+                    return
+                bbox = (min_lng, min_lat, max_lng, max_lat)
+            self.bbox = bbox
+        else:
+            await self.send_json({"type": "error", "error": f"Unknown action {action!r}."})
+            return
+        await self.send_json(
+            {"type": "subscribed", "rides": len(self.rides), "bbox": self.bbox}
+        )
+
+    def in_view(self, ride_id, lat, lng):
+        if ride_id in self.rides:
+            return True
+        if self.bbox is None:
+            return False
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        return min_lng <= lng <= max_lng and min_lat <= lat <= max_lat
+
+    async def dispatch_update(self, event):
+        # Only remember the latest position; frames are sent by flush_periodically
+        for ride_id, (lat, lng) in event["rides"].items():
+            if self.in_view(ride_id, lat, lng):
+                self.changed[ride_id] = [lat, lng]
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(settings.DISPATCH_FLUSH_INTERVAL)
+            if self.changed:
+                changed, self.changed = self.changed, {}
+                await self.send_json({"type": "positions", "rides": changed})
+
+
+class DriverLocationConsumer(AsyncWebsocketConsumer):
+    """
+    GPS pings from a driver's device: ``{"lat": .., "lng": ..}`` text frames.
+    Pings over the per-driver rate limit are dropped silently; invalid ones
+    get an error reply. Accepted pings are flushed in batches by PingBatcher.
+    """
+
+    async def connect(self):
+        self.connected = False
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        if not await user_flag(user, "is_driver"):
+            await self.close(code=4403)
+            return
+        self.driver_id = str(user.id)
+        self.batcher = get_ping_batcher()
+        self.batcher.ensure_running()
+        await self.accept()
+        self.connected = True
+        WEBSOCKET_CONNECTIONS.labels("driver_location").inc()
+
+    async def disconnect(self, close_code):
+        if self.connected:
+            WEBSOCKET_CONNECTIONS.labels("driver_location").dec()
+
+    async def dispatch(self, message):
+        # Pings never touch the database, so skip the per-message
+        # close_old_connections() thread hop Channels does before each handler.
+        if message["type"] == "websocket.receive":
+            await self.receive(message.get("text"), message.get("bytes"))
+        else:
+            await super().dispatch(message)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        payload = text_data if text_data is not None else bytes_data
+        try:
+            if payload is None:
+                raise InvalidPing("Ping frame carries no data.")
+            lng, lat = parse_ping(fastjson.loads(payload))
+        except (InvalidPing, ValueError) as e:
+            await self.send(text_data=fastjson.dumps_text({"error": str(e)}))
+            return
+        self.batcher.offer(self.driver_id, lng, lat)
+
+
+async def user_flag(user, name):
+    """Read ``is_staff``/``is_driver`` for the scope user."""
+    if isinstance(user, TokenUser):
+        if name in user.token:
+            return bool(user.token[name])
+        # Tokens issued before the role claims existed: ask the database once
+        return await User.objects.filter(id=user.id, **{name: True}).aexists()
+    return getattr(user, name, False)
@@ -0,0 +1,414 @@
+import math
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.utils.module_loading import import_string
+
+from . import fastjson
+from .geo import EARTH_RADIUS_M, METERS_PER_DEGREE
+
+DEFAULT_BACKEND = "rides.driver_index.RedisGeoDriverIndex"
+
+
+def haversine_m(lng1, lat1, lng2, lat2):
+    """Great-circle distance in meters between two lng/lat pairs."""
+    lat1, lat2 = math.radians(lat1), math.radians(lat2)
+    dlat = lat2 - lat1
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class NearbyDriver:
+    """
+    Lightweight stand-in for a driver row returned by an index lookup.
+    Exposes the same attributes the views read from the annotated queryset.
+    """
+
+    __slots__ = ("id", "current_location", "distance")
+
+    def __init__(self, driver_id, lng, lat, distance_m):
+        self.id = driver_id
+        self.current_location = Point(lng, lat, srid=4326)
+        self.distance = D(m=distance_m)
+
+    def __repr__(self):
+        return f"NearbyDriver({self.id}, {self.distance.m:.0f}m)"
+
+
+class GridDriverIndex:
+    """
+    In-memory grid of available driver positions.
+
+    Drivers are bucketed into square lng/lat cells of ``cell_size`` degrees and
+    a k-nearest query scans rings of cells outward from the query cell, stopping
+    as soon as no unseen cell can hold anything closer than the k-th hit.
+    Longitude wrap-around at the antimeridian is not handled.
+
+    The grid belongs to one process. With ``max_age`` (seconds) it goes cold,
+    and is re-warmed, that long after its last rebuild. With ``channel_url``
+    every change is also published on a Redis channel and applied by the
+    grids of the other processes; the grid is cold while it is not subscribed,
+    since changes may have been missed.
+    """
+
+    shared = False
+
+    def __init__(self, cell_size=0.01, max_age=None, channel_url=None, channel="drivers:index"):
+        self.cell_size = cell_size
+        self.max_age = max_age
+        self._cells = defaultdict(set)
+        self._positions = {}
+        self._lock = threading.RLock()
+        self._warm = False
+        self._warmed_at = 0.0
+        self._publisher = None
+        self._origin = uuid.uuid4().hex
+        if channel_url:
+            import redis
+
+            self.channel = channel
+            self._publisher = redis.Redis.from_url(channel_url)
+            self._subscribed = threading.Event()
+            threading.Thread(target=self._listen, daemon=True).start()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def is_warm(self):
+        if not self._warm:
+            return False
+        if self._publisher is not None and not self._subscribed.is_set():
+            return False
+        return self.max_age is None or time.monotonic() - self._warmed_at < self.max_age
+
+    def _cell(self, lng, lat):
+        return (math.floor(lng / self.cell_size), math.floor(lat / self.cell_size))
+
+    def update(self, driver_id, location):
+        """Insert or move a driver. ``location`` is a Point or None."""
+        if location is None:
+            self.remove(driver_id)
+            return
+        self._update(driver_id, location.x, location.y)
+        self._publish("update", driver_id, location)
+
+    def move(self, driver_id, location):
+        """Update the position of a driver already in the index; others are ignored."""
+        self._move(driver_id, location.x, location.y)
+        self._publish("move", driver_id, location)
+
+    def remove(self, driver_id):
+        self._remove(driver_id)
+        self._publish("remove", driver_id)
+
+    def invalidate(self):
+        """Mark this grid, and the subscribed grids of other processes, cold."""
+        self._warm = False
+        self._publish("invalidate")
+
+    def _update(self, driver_id, lng, lat):
+        cell = self._cell(lng, lat)
+        with self._lock:
+            previous = self._positions.get(driver_id)
+            if previous is not None and previous[2] != cell:
+                self._discard_from_cell(driver_id, previous[2])
+            self._positions[driver_id] = (lng, lat, cell)
+            self._cells[cell].add(driver_id)
+
+    def _move(self, driver_id, lng, lat):
+        with self._lock:
+            if driver_id in self._positions:
+                self._update(driver_id, lng, lat)
+
+    def _remove(self, driver_id):
+        with self._lock:
+            previous = self._positions.pop(driver_id, None)
+            if previous is not None:
+                self._discard_from_cell(driver_id, previous[2])
+
+    def _publish(self, op, driver_id=None, location=None):
+        if self._publisher is None:
+            return
+        message = {"origin": self._origin, "op": op}
+        if driver_id is not None:
+            message["id"] = str(driver_id)
+        if location is not None:
+            message["lng"], message["lat"] = location.x, location.y
+        try:
+            self._publisher.publish(self.channel, fastjson.dumps(message))
+        except Exception as e:
+            print(f"Could not publish driver index change: {str(e)}")
+
+    def _apply(self, message):
+        if message["origin"] == self._origin:
+            return
+        op = message["op"]
+        if op == "invalidate":
+            self._warm = False
+            return
+        driver_id = uuid.UUID(message["id"])
+        if op == "update":
+            self._update(driver_id, message["lng"], message["lat"])
+        elif op == "move":
+            self._move(driver_id, message["lng"], message["lat"])
+        elif op == "remove":
+            self._remove(driver_id)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._publisher.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self._subscribed.set()
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._apply(fastjson.loads(message["data"]))
+            except Exception as e:
+                print(f"Driver index subscription lost: {str(e)}")
+            # Changes published meanwhile are lost; rebuild once resubscribed
+            self._subscribed.clear()
+            self._warm = False
+            time.sleep(1)
+
+    def _discard_from_cell(self, driver_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(driver_id)
+            if not members:
+                del self._cells[cell]
+
+    def rebuild(self, drivers):
+        """Replace the index contents with ``(driver_id, location)`` pairs and mark it warm."""
+        with self._lock:
+            self._cells = defaultdict(set)
+            self._positions = {}
+            for driver_id, location in drivers:
+                if location is not None:
+                    self._update(driver_id, location.x, location.y)
+            self._warm = True
+            self._warmed_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._cells = defaultdict(set)
+            self._positions = {}
+            self._warm = False
+
+    def nearest(self, location, k=5, max_distance=None):
+        """
+        Return up to ``k`` NearbyDriver objects ordered by distance from ``location``.
+        :param max_distance: Optional cut-off in meters.
+        """
+        lng, lat = location.x, location.y
+        with self._lock:
+            if not self._positions:
+                return []
+            cx, cy = self._cell(lng, lat)
+            hits = []
+            seen = 0
+            ring = 0
+            while True:
+                # Once a ring holds more cells than are occupied, a flat scan is cheaper.
+                if (2 * ring + 1) ** 2 > len(self._cells):
+                    hits = [
+                        (haversine_m(lng, lat, p[0], p[1]), driver_id, p)
+                        for driver_id, p in self._positions.items()
+                    ]
+                    break
+                for cell in self._ring_cells(cx, cy, ring):
+                    for driver_id in self._cells.get(cell, ()):
+                        p = self._positions[driver_id]
+                        hits.append((haversine_m(lng, lat, p[0], p[1]), driver_id, p))
+                        seen += 1
+                if seen == len(self._positions):
+                    break
+                # Anything outside the scanned rings is at least this far away.
+                edge_lat = min(89.9, abs(lat) + (ring + 1) * self.cell_size)
+                bound = ring * self.cell_size * METERS_PER_DEGREE * math.cos(math.radians(edge_lat))
+                if max_distance is not None and bound > max_distance:
+                    break
+                if len(hits) >= k and sorted(h[0] for h in hits)[k - 1] <= bound:
+                    break
+                ring += 1
+
+        if max_distance is not None:
+            hits = [h for h in hits if h[0] <= max_distance]
+        hits.sort(key=lambda h: h[0])
+        return [NearbyDriver(driver_id, p[0], p[1], dist) for dist, driver_id, p in hits[:k]]
+
+    @staticmethod
+    def _ring_cells(cx, cy, ring):
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-ring, ring + 1):
+            yield (cx + dx, cy - ring)
+            yield (cx + dx, cy + ring)
+        for dy in range(-ring + 1, ring):
+            yield (cx - ring, cy + dy)
+            yield (cx + ring, cy + dy)
+
+
+class RedisGeoDriverIndex:
+    """
+    Driver index kept in a Redis geo set so every web and Celery process shares it.
+    It goes cold ``ttl`` seconds after its last rebuild, which picks up rows
+    written without signals (bulk imports) at the latest then.
+    """
+
+    shared = True
+
+    def __init__(self, url=None, key="drivers:available", ttl=600):
+        import redis
+
+        self.key = key
+        self.warm_key = f"{key}:warm"
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    def __len__(self):
+        return self.client.zcard(self.key)
+
+    def is_warm(self):
+        return bool(self.client.exists(self.warm_key))
+
+    def update(self, driver_id, location):
+        if location is None:
+            self.remove(driver_id)
+            return
+        self.client.geoadd(self.key, (location.x, location.y, str(driver_id)))
+
+    def move(self, driver_id, location):
+        self.client.geoadd(self.key, (location.x, location.y, str(driver_id)), xx=True)
+
+    def remove(self, driver_id):
+        self.client.zrem(self.key, str(driver_id))
+
+    def rebuild(self, drivers):
+        staging = f"{self.key}:rebuild"
+        pipe = self.client.pipeline()
+        pipe.delete(staging)
+        for driver_id, location in drivers:
+            if location is not None:
+                pipe.geoadd(staging, (location.x, location.y, str(driver_id)))
+        pipe.execute()
+        pipe = self.client.pipeline()
+        if self.client.exists(staging):
+            pipe.rename(staging, self.key)
+        else:
+            pipe.delete(self.key)
+        pipe.set(self.warm_key, 1, ex=self.ttl)
+        pipe.execute()
+
+    def invalidate(self):
+        self.client.delete(self.warm_key)
+
+    def clear(self):
+        self.client.delete(self.key, self.warm_key)
+
+    def nearest(self, location, k=5, max_distance=None):
+        # Redis needs a finite radius; half the equator covers the whole globe.
+        radius = max_distance if max_distance is not None else 20_037_509
+        results = self.client.geosearch(
+            self.key,
+            longitude=location.x,
+            latitude=location.y,
+            radius=radius,
+            unit="m",
+            sort="ASC",
+            count=k,
+            withdist=True,
+            withcoord=True,
+        )
+        return [
+            NearbyDriver(uuid.UUID(member.decode()), lng, lat, dist)
+            for member, dist, (lng, lat) in results
+        ]
+
+
+_index = None
+_index_lock = threading.Lock()
+_warming = threading.Lock()
+
+# Cache key held while a rebuild of the shared index is queued or running
+WARMUP_LOCK_KEY = "driver-index:warming"
+
+
+def get_driver_index():
+    """Return the process-wide driver index configured by ``DRIVER_INDEX``."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                config = getattr(settings, "DRIVER_INDEX", {})
+                backend = import_string(config.get("BACKEND", DEFAULT_BACKEND))
+                _index = backend(**config.get("OPTIONS", {}))
+    return _index
+
+
+def sync_driver(user):
+    """Reflect a user's driver/availability/location state in the index."""
+    from .location_buffer import get_driver_locations
+
+    index = get_driver_index()
+    if not (user.is_driver and user.is_available):
+        index.remove(user.id)
+        return
+    location = get_driver_locations([user.id]).get(user.id, user.current_location)
+    if location is None:
+        index.remove(user.id)
+    else:
+        index.update(user.id, location)
+
+
+def warm_driver_index():
+    """Load every available driver with a known location into the index."""
+    from .location_buffer import get_driver_locations
+    from .models import User
+
+    drivers = dict(
+        User.objects.filter(is_driver=True, is_available=True, current_location__isnull=False)
+        .values_list("id", "current_location")
+        .iterator(chunk_size=5000)
+    )
+    # Buffered positions are newer than the ones persisted so far.
+    drivers.update(get_driver_locations(drivers))
+    get_driver_index().rebuild(drivers.items())
+
+
+def _warm_in_background():
+    from django.db import connections
+
+    try:
+        warm_driver_index()
+    except Exception as e:
+        print(f"Could not warm the driver index: {str(e)}")
+    finally:
+        connections.close_all()
+        _warming.release()
+
+
+def request_warmup():
+    """
+    Have the driver index rebuilt without holding up the caller: by the
+    rebuild_driver_index task for the shared index (at most one queued at a
+    time), in a background thread for a process-local one. Does nothing when
+    DRIVER_INDEX["WARMUP"] is False.
+    """
+    if not getattr(settings, "DRIVER_INDEX", {}).get("WARMUP", True):
+        return
+    if getattr(get_driver_index(), "shared", False):
+        from django.core.cache import cache
+
+        from .tasks import rebuild_driver_index
+
+        if cache.add(WARMUP_LOCK_KEY, 1, timeout=60):
+            rebuild_driver_index.delay()
+    elif _warming.acquire(blocking=False):
+        threading.Thread(target=_warm_in_background, daemon=True).start()
@@ -0,0 +1,69 @@
+"""
+Project-wide JSON encoding on top of orjson.
+
+UUIDs, datetimes, dataclasses and numpy arrays are serialized natively by
+orjson; ``default`` adds GEOS geometries (a Point becomes ``{"lat", "lng"}``,
+anything else its EWKT string, as DRF renders it) and the types DRF's own
+encoder knows about (Decimal, lazy strings, timedelta, querysets, ...).
+
+Used by the DRF renderer and parser in rides.renderers, the async views and
+the WebSocket consumers.
+"""
+import datetime
+import decimal
+
+import orjson
+from django.contrib.gis.geos import GEOSGeometry, Point
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.utils.functional import Promise
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+JSONDecodeError = orjson.JSONDecodeError
+
+
+def default(obj):
+    if isinstance(obj, Point):
+        return {"lat": obj.y, "lng": obj.x}
+    if isinstance(obj, GEOSGeometry):
+        return obj.ewkt
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, QuerySet):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "__iter__"):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj, indent=False):
+    """Serialize ``obj`` to UTF-8 encoded JSON bytes."""
+    option = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+    return orjson.dumps(obj, default=default, option=option)
+
+
+def dumps_text(obj):
+    """``dumps`` as a str, for WebSocket text frames."""
+    return orjson.dumps(obj, default=default, option=OPTIONS).decode()
+
+
+def loads(data):
+    """Parse JSON from bytes or str; raises JSONDecodeError (a ValueError)."""
+    return orjson.loads(data)
+
+
+class JsonResponse(HttpResponse):
+    """django.http.JsonResponse, encoded with ``dumps``."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
@@ -0,0 +1,245 @@
+"""
+Bulk driver onboarding for ``manage.py import_fleet``.
+
+Rows are streamed from a CSV or NDJSON file and handled in chunks. Each row
+is checked with the same rules as UserRegistrationSerializer. Emails and
+phone numbers are then de-duplicated within the file and against the
+database, using one query per chunk. Passwords are hashed in a process pool
+and the surviving rows are written with ``bulk_create``. That skips the
+post_save signals, so the driver index is marked cold afterwards.
+"""
+import csv
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.gis.geos import Point
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from . import fastjson
+from .driver_index import get_driver_index
+from .models import User
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+FALSE_VALUES = {"0", "false", "f", "no", "n", ""}
+
+
+class RejectedRow(ValueError):
+    pass
+
+
+def read_rows(path, fmt=None):
+    """
+    Yield ``(line_number, row)`` from a CSV (with a header) or NDJSON file.
+    Lines that are not valid JSON objects are yielded as RejectedRow instances.
+    """
+    fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = fastjson.loads(line)
+            except fastjson.JSONDecodeError as e:
+                yield line_number, RejectedRow(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(row, dict):
+                row = RejectedRow("Each line must be a JSON object")
+            yield line_number, row
+
+
+def _flag(value, default):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RejectedRow(f"Invalid boolean {value!r}")
+
+
+def _text(row, name):
+    value = row.get(name)
+    return "" if value is None else str(value).strip()
+
+
+def clean_row(row):
+    """
+    Validate one input row and return the User fields to create, with the
+    raw password under ``password`` (None for an unusable one).
+    Raises RejectedRow with the reason otherwise.
+    """
+    email = User.objects.normalize_email(_text(row, "email"))
+    if not email:
+        raise RejectedRow("Email is required")
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise RejectedRow(f"Invalid email {email!r}")
+
+    phone_number = _text(row, "phone_number") or None
+    if phone_number and not phone_number.isdigit():
+        raise RejectedRow("Phone number must be numeric")
+    if phone_number and len(phone_number) != 10:
+        raise RejectedRow("Phone number must be 10 digits long")
+
+    is_driver = _flag(row.get("is_driver"), True)
+    is_rider = _flag(row.get("is_rider"), False)
+    if is_driver and is_rider:
+        raise RejectedRow("User cannot be both driver and rider")
+    if not is_driver and not is_rider:
+        raise RejectedRow("User must be either a driver or a rider")
+
+    current_location = None
+    latitude, longitude = _text(row, "latitude"), _text(row, "longitude")
+    if latitude or longitude:
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except ValueError:
+            raise RejectedRow("Latitude and longitude must be numbers")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise RejectedRow("Coordinates out of range")
+        current_location = Point(longitude, latitude, srid=4326)
+
+    return {
+        "email": email,
+        "password": _text(row, "password") or None,
+        "phone_number": phone_number,
+        "first_name": _text(row, "first_name"),
+        "last_name": _text(row, "last_name"),
+        "is_driver": is_driver,
+        "is_rider": is_rider,
+        "current_location": current_location,
+    }
+
+
+def _init_worker():
+    # Spawned workers (macOS, Windows) start without a configured Django
+    django.setup()
+
+
+class FleetImporter:
+    """
+    Import rows chunk by chunk. ``workers=0`` hashes in this process.
+    ``rejects`` collects ``(line_number, email, reason)`` tuples.
+    """
+
+    def __init__(self, chunk_size=1000, workers=None, dry_run=False):
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.dry_run = dry_run
+        self.imported = 0
+        self.rejects = []
+        self._seen_emails = set()
+        self._seen_phones = set()
+
+    def run(self, rows, on_chunk=None):
+        """Import ``(line_number, row)`` pairs; ``on_chunk(importer)`` is called after each chunk."""
+        executor = None
+        if self.workers != 0 and not self.dry_run:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        try:
+            rows = iter(rows)
+            while chunk := list(itertools.islice(rows, self.chunk_size)):
+                self.import_chunk(chunk, executor)
+                if on_chunk is not None:
+                    on_chunk(self)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if self.imported and not self.dry_run:
+                get_driver_index().invalidate()
+        return self
+
+    def reject(self, line_number, email, reason):
+        self.rejects.append((line_number, email, str(reason)))
+
+    def import_chunk(self, chunk, executor=None):
+        valid = []
+        for line_number, row in chunk:
+            if isinstance(row, RejectedRow):
+                self.reject(line_number, "", row)
+                continue
+            try:
+                fields = clean_row(row)
+            except RejectedRow as e:
+                self.reject(line_number, _text(row, "email"), e)
+                continue
+            valid.append((line_number, fields))
+        if not valid:
+            return
+
+        # One query for every email and phone number already taken
+        emails = [fields["email"] for _, fields in valid]
+        phones = [fields["phone_number"] for _, fields in valid if fields["phone_number"]]
+        taken = User.objects.filter(Q(email__in=emails) | Q(phone_number__in=phones)).values_list(
+            "email", "phone_number"
+        )
+        taken_emails, taken_phones = set(), set()
+        for email, phone_number in taken:
+            taken_emails.add(email)
+            taken_phones.add(phone_number)
+
+        fresh = []
+        for line_number, fields in valid:
+            email, phone_number = fields["email"], fields["phone_number"]
+            if email in taken_emails:
+                self.reject(line_number, email, "Email already exists")
+            elif email in self._seen_emails:
+                self.reject(line_number, email, "Duplicate email in file")
+            elif phone_number and phone_number in taken_phones:
+                self.reject(line_number, email, "Phone number already exists")
+            elif phone_number and phone_number in self._seen_phones:
+                self.reject(line_number, email, "Duplicate phone number in file")
+            else:
+                self._seen_emails.add(email)
+                if phone_number:
+                    self._seen_phones.add(phone_number)
+                fresh.append((line_number, fields))
+        if self.dry_run:
+            self.imported += len(fresh)
+            return
+        if not fresh:
+            return
+
+        passwords = [fields.pop("password") for _, fields in fresh]
+        if executor is None:
+            hashes = [make_password(password) for password in passwords]
+        else:
+            hashes = list(executor.map(make_password, passwords, chunksize=4))
+        users = [
+            User(password=password_hash, **fields)
+            for (_, fields), password_hash in zip(fresh, hashes)
+        ]
+        self.insert(fresh, users)
+
+    def insert(self, fresh, users):
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=self.chunk_size)
+            self.imported += len(users)
+            return
+        except IntegrityError:
+            pass
+        # Someone registered one of these users since the duplicate check:
+        # fall back to one savepoint per row to find out which.
+        for (line_number, _), user in zip(fresh, users):
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+            except IntegrityError:
+                self.reject(line_number, user.email, "Email already exists")
+            else:
+                self.imported += 1
@@ -0,0 +1,99 @@
+"""
+Compact binary frames for the ride tracking WebSocket.
+
+Clients that negotiate the ``SUBPROTOCOL`` subprotocol receive fixed-layout
+little-endian frames instead of JSON text:
+
+* keyframe (13 bytes): ``B`` type=1, ``I`` seq, ``i`` lat, ``i`` lng
+* delta (9 bytes):     ``B`` type=2, ``I`` seq, ``h`` dlat, ``h`` dlng
+
+Coordinates are quantized to ``1 / SCALE`` degrees (about 11 cm). A delta is
+relative to the previous frame of the same ride and is only sent to a socket
+whose last frame was exactly that one; everyone else gets the keyframe.
+"""
+import random
+import struct
+from collections import OrderedDict
+
+SUBPROTOCOL = "rides.location.v1"
+SCALE = 1_000_000
+
+KEYFRAME = 1
+DELTA = 2
+
+_KEYFRAME = struct.Struct("<BIii")
+_DELTA = struct.Struct("<BIhh")
+_DELTA_LIMIT = 32767
+
+
+def quantize(lat, lng):
+    return round(lat * SCALE), round(lng * SCALE)
+
+
+def encode_keyframe(seq, lat_q, lng_q):
+    return _KEYFRAME.pack(KEYFRAME, seq, lat_q, lng_q)
+
+
+def encode_delta(seq, dlat_q, dlng_q):
+    return _DELTA.pack(DELTA, seq, dlat_q, dlng_q)
+
+
+def decode_frame(data, previous=None):
+    """
+    Decode a frame into ``(seq, lat, lng)``.
+    ``previous`` is the decoded result of the frame before it and is required
+    for delta frames.
+    """
+    if data[0] == KEYFRAME:
+        _, seq, lat_q, lng_q = _KEYFRAME.unpack(data)
+    elif data[0] == DELTA:
+        if previous is None:
+            raise ValueError("Delta frame without a preceding frame.")
+        _, seq, dlat_q, dlng_q = _DELTA.unpack(data)
+        lat_q = round(previous[1] * SCALE) + dlat_q
+        lng_q = round(previous[2] * SCALE) + dlng_q
+    else:
+        raise ValueError(f"Unknown frame type {data[0]}.")
+    return seq, lat_q / SCALE, lng_q / SCALE
+
+
+class FrameEncoder:
+    """
+    Encodes each ride update once, for every subscriber of its group.
+    Remembers the last quantized position per ride (bounded, least recently
+    updated rides are forgotten first) so it can emit deltas against it.
+    """
+
+    def __init__(self, max_rides=100_000):
+        self.max_rides = max_rides
+        self._last = OrderedDict()
+        # A random start keeps sequence numbers from different publisher
+        # processes from lining up by accident.
+        self._seq = random.getrandbits(31)
+
+    def encode(self, ride_id, lat, lng):
+        """
+        :return: dict with ``seq``, ``prev_seq`` (None when there is no usable
+                 base), the ``keyframe`` bytes and the ``delta`` bytes or None.
+        """
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        seq = self._seq
+        lat_q, lng_q = quantize(lat, lng)
+        key = str(ride_id)
+
+        prev_seq, delta = None, None
+        last = self._last.pop(key, None)
+        if last is not None:
+            dlat, dlng = lat_q - last[1], lng_q - last[2]
+            if abs(dlat) <= _DELTA_LIMIT and abs(dlng) <= _DELTA_LIMIT:
+                prev_seq, delta = last[0], encode_delta(seq, dlat, dlng)
+        self._last[key] = (seq, lat_q, lng_q)
+        if len(self._last) > self.max_rides:
+            self._last.popitem(last=False)
+
+        return {
+            "seq": seq,
+            "prev_seq": prev_seq,
+            "keyframe": encode_keyframe(seq, lat_q, lng_q),
+            "delta": delta,
+        }
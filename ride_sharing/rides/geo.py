@@ -0,0 +1,83 @@
+"""
+Vectorized great-circle kernels for scoring many candidates in one call.
+
+Coordinates are packed float64 arrays of shape (n, 2) holding (lng, lat) rows,
+the same x/y order as GEOS points. Distances use a spherical earth and agree
+with PostGIS ``Distance`` on SRID 4326 points to within 0.5% (the spheroid
+flattening error); against ST_DistanceSphere they agree to a few centimetres.
+"""
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = np.pi * EARTH_RADIUS_M / 180
+
+# Straight-line ETA assumes an average urban driving speed.
+DEFAULT_SPEED_KMH = 30.0
+
+
+def pack_points(points):
+    """Pack an iterable of GEOS Points (or (lng, lat) pairs) into an (n, 2) array."""
+    return np.array(
+        [(p.x, p.y) if hasattr(p, "x") else tuple(p) for p in points],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+
+
+def haversine(origins, destinations):
+    """
+    Element-wise great-circle distance in meters.
+    Either argument may be a single (lng, lat) pair, which is broadcast.
+    """
+    origins = np.radians(np.asarray(origins, dtype=np.float64))
+    destinations = np.radians(np.asarray(destinations, dtype=np.float64))
+    lng1, lat1 = origins[..., 0], origins[..., 1]
+    lng2, lat2 = destinations[..., 0], destinations[..., 1]
+    a = (
+        np.sin((lat2 - lat1) * 0.5) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) * 0.5) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(origins, destinations):
+    """
+    Pairwise great-circle distances in meters, shape (n, m).
+    The half-angle sines are expanded with the difference identities so that
+    trigonometry runs on the n + m inputs and only outer products touch n * m.
+    """
+    half_o = np.radians(np.asarray(origins, dtype=np.float64)) * 0.5
+    half_d = np.radians(np.asarray(destinations, dtype=np.float64)) * 0.5
+    sin_o, cos_o = np.sin(half_o), np.cos(half_o)
+    sin_d, cos_d = np.sin(half_d), np.cos(half_d)
+
+    # sin((b - a) / 2) = sin(b/2) cos(a/2) - cos(b/2) sin(a/2)
+    dlat = np.outer(cos_o[:, 1], sin_d[:, 1])
+    dlat -= np.outer(sin_o[:, 1], cos_d[:, 1])
+    dlng = np.outer(cos_o[:, 0], sin_d[:, 0])
+    dlng -= np.outer(sin_o[:, 0], cos_d[:, 0])
+
+    a = np.square(dlat, out=dlat)
+    np.square(dlng, out=dlng)
+    dlng *= np.outer(np.cos(2 * half_o[:, 1]), np.cos(2 * half_d[:, 1]))
+    a += dlng
+    np.clip(a, 0.0, 1.0, out=a)
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    a *= 2 * EARTH_RADIUS_M
+    return a
+
+
+def bearing(origins, destinations):
+    """Initial great-circle bearing in degrees clockwise from north, in [0, 360)."""
+    origins = np.radians(np.asarray(origins, dtype=np.float64))
+    destinations = np.radians(np.asarray(destinations, dtype=np.float64))
+    lat1, lat2 = origins[..., 1], destinations[..., 1]
+    dlng = destinations[..., 0] - origins[..., 0]
+    y = np.sin(dlng) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlng)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def eta_seconds(distance_m, speed_kmh=DEFAULT_SPEED_KMH):
+    """Straight-line travel time in seconds for distances in meters."""
+    return np.asarray(distance_m, dtype=np.float64) / (speed_kmh / 3.6)
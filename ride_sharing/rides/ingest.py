@@ -0,0 +1,124 @@
+"""
+Driver GPS ingest.
+
+Pings arriving on the driver WebSocket are validated and rate-limited per
+driver, then coalesced in memory so that only the newest position of each
+driver is flushed. A flush writes all of them to the location buffer and
+driver index in one go and forwards the positions of drivers on an
+in-progress ride to the ride tracking groups.
+"""
+import asyncio
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.gis.geos import Point
+
+from .broadcast import apublish_ride_locations
+from .location_buffer import put_driver_locations, put_ride_locations
+from .models import Ride
+from .trajectory import append_points
+
+# Rate-limit state of drivers silent for this long is forgotten on flush
+IDLE_SECONDS = 60
+
+
+class InvalidPing(ValueError):
+    pass
+
+
+def parse_ping(data):
+    """Validate a ``{"lat": .., "lng": ..}`` ping and return ``(lng, lat)``."""
+    if not isinstance(data, dict):
+        raise InvalidPing("Ping must be an object with 'lat' and 'lng'.")
+    lat, lng = data.get("lat"), data.get("lng")
+    for value in (lat, lng):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise InvalidPing("'lat' and 'lng' must be finite numbers.")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise InvalidPing("Coordinates out of range.")
+    return float(lng), float(lat)
+
+
+def _store_ride_locations(locations):
+    put_ride_locations(locations)
+    append_points(locations)
+
+
+async def flush_driver_pings(positions):
+    """Persist ``{driver_id: (lng, lat)}`` and fan ride positions out."""
+    points = {driver_id: Point(lng, lat, srid=4326) for driver_id, (lng, lat) in positions.items()}
+    await sync_to_async(put_driver_locations)(points)
+
+    ride_locations = {
+        ride_id: points[str(driver_id)]
+        async for ride_id, driver_id in Ride.objects.filter(
+            status="in_progress", driver_id__in=list(points)
+        ).values_list("id", "driver_id")
+    }
+    if ride_locations:
+        await sync_to_async(_store_ride_locations)(ride_locations)
+        await apublish_ride_locations(ride_locations)
+
+
+class PingBatcher:
+    """Process-wide ping buffer flushed every ``flush_interval`` seconds."""
+
+    def __init__(self, min_interval=None, flush_interval=None, flush=flush_driver_pings):
+        self.min_interval = (
+            settings.DRIVER_PING_MIN_INTERVAL if min_interval is None else min_interval
+        )
+        self.flush_interval = (
+            settings.DRIVER_PING_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        )
+        self.flush_func = flush
+        self.accepted = 0
+        self.dropped = 0
+        self._last_accept = {}
+        self._pending = {}
+        self._task = None
+
+    def offer(self, driver_id, lng, lat, now=None):
+        """Queue a position; False when the driver is over its rate limit."""
+        now = time.monotonic() if now is None else now
+        last = self._last_accept.get(driver_id)
+        if last is not None and now - last < self.min_interval:
+            self.dropped += 1
+            return False
+        self._last_accept[driver_id] = now
+        self._pending[driver_id] = (lng, lat)
+        self.accepted += 1
+        return True
+
+    def ensure_running(self):
+        """Start the flush loop on the running event loop if it is not already there."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"An error occurred while flushing driver pings: {str(e)}")
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        cutoff = time.monotonic() - IDLE_SECONDS
+        self._last_accept = {k: v for k, v in self._last_accept.items() if v >= cutoff}
+        if pending:
+            await self.flush_func(pending)
+        return len(pending)
+
+
+_batcher = None
+
+
+def get_ping_batcher():
+    global _batcher
+    if _batcher is None:
+        _batcher = PingBatcher()
+    return _batcher
@@ -0,0 +1,191 @@
+"""
+Write-behind buffer for driver and ride positions.
+
+Position updates land here instead of issuing a full-row ``save()``. A
+periodic flush coalesces everything written since the previous flush into one
+``bulk_update(fields=["current_location"])`` per model, while readers get the
+freshest buffered position straight from the buffer.
+"""
+import threading
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.utils.module_loading import import_string
+
+from . import position_cache
+
+DEFAULT_BACKEND = "rides.location_buffer.RedisLocationBuffer"
+KINDS = ("driver", "ride")
+
+
+def _point(lng, lat):
+    return Point(float(lng), float(lat), srid=4326)
+
+
+class InMemoryLocationBuffer:
+    """Process-local buffer; suitable for tests and single-process deployments."""
+
+    def __init__(self):
+        self._positions = {kind: {} for kind in KINDS}
+        self._dirty = {kind: set() for kind in KINDS}
+        self._lock = threading.Lock()
+
+    def put_many(self, kind, positions, mark_dirty=True):
+        """
+        Record ``{id: (lng, lat)}`` positions for ``kind``.
+        ``mark_dirty=False`` is for positions that are already persisted.
+        """
+        with self._lock:
+            for obj_id, (lng, lat) in positions.items():
+                key = str(obj_id)
+                self._positions[kind][key] = (float(lng), float(lat))
+                if mark_dirty:
+                    self._dirty[kind].add(key)
+
+    def get_many(self, kind, ids):
+        with self._lock:
+            found = {}
+            for obj_id in ids:
+                position = self._positions[kind].get(str(obj_id))
+                if position is not None:
+                    found[obj_id] = _point(*position)
+            return found
+
+    def drain(self, kind):
+        """Return and forget the ``{id: (lng, lat)}`` positions written since the last drain."""
+        with self._lock:
+            dirty, self._dirty[kind] = self._dirty[kind], set()
+            return {key: self._positions[kind][key] for key in dirty}
+
+    def clear(self):
+        with self._lock:
+            for kind in KINDS:
+                self._positions[kind].clear()
+                self._dirty[kind].clear()
+
+
+class RedisLocationBuffer:
+    """
+    Buffer shared by web and worker processes.
+    Each position is its own key with a TTL; ids awaiting a flush sit in a set.
+    """
+
+    def __init__(self, url=None, prefix="loc", ttl=3600):
+        import redis
+
+        self.prefix = prefix
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    def _key(self, kind, obj_id):
+        return f"{self.prefix}:{kind}:{obj_id}"
+
+    def _dirty_key(self, kind):
+        return f"{self.prefix}:{kind}:dirty"
+
+    def put_many(self, kind, positions, mark_dirty=True):
+        if not positions:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for obj_id, (lng, lat) in positions.items():
+            pipe.set(self._key(kind, obj_id), f"{float(lng)!r},{float(lat)!r}", ex=self.ttl)
+        if mark_dirty:
+            pipe.sadd(self._dirty_key(kind), *[str(obj_id) for obj_id in positions])
+        pipe.execute()
+
+    def get_many(self, kind, ids):
+        ids = list(ids)
+        if not ids:
+            return {}
+        values = self.client.mget([self._key(kind, obj_id) for obj_id in ids])
+        return {
+            obj_id: _point(*value.decode().split(","))
+            for obj_id, value in zip(ids, values)
+            if value is not None
+        }
+
+    def drain(self, kind):
+        # SMEMBERS + DEL run in one MULTI/EXEC, so ids written during the
+        # flush land in a fresh set and are picked up next time.
+        pipe = self.client.pipeline()
+        pipe.smembers(self._dirty_key(kind))
+        pipe.delete(self._dirty_key(kind))
+        members, _ = pipe.execute()
+        ids = [member.decode() for member in members]
+        values = self.client.mget([self._key(kind, obj_id) for obj_id in ids]) if ids else []
+        return {
+            obj_id: tuple(float(part) for part in value.decode().split(","))
+            for obj_id, value in zip(ids, values)
+            if value is not None
+        }
+
+    def clear(self):
+        keys = list(self.client.scan_iter(f"{self.prefix}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_location_buffer():
+    """Return the process-wide buffer configured by ``LOCATION_BUFFER``."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = getattr(settings, "LOCATION_BUFFER", {})
+                backend = import_string(config.get("BACKEND", DEFAULT_BACKEND))
+                _buffer = backend(**config.get("OPTIONS", {}))
+    return _buffer
+
+
+def put_ride_location(ride_id, location):
+    put_ride_locations({ride_id: location})
+
+
+def put_ride_locations(locations):
+    """Buffer ``{ride_id: Point}`` positions and refresh the position cache."""
+    get_location_buffer().put_many("ride", {ride_id: (p.x, p.y) for ride_id, p in locations.items()})
+    position_cache.set_positions(locations)
+
+
+def put_driver_locations(positions):
+    """
+    Buffer ``{driver_id: Point}`` positions and move the drivers that are
+    currently in the driver index, so matching sees them immediately.
+    """
+    from .driver_index import get_driver_index
+
+    get_location_buffer().put_many(
+        "driver", {driver_id: (p.x, p.y) for driver_id, p in positions.items()}
+    )
+    index = get_driver_index()
+    for driver_id, location in positions.items():
+        index.move(driver_id, location)
+
+
+def get_ride_location(ride_id, default=None):
+    return get_location_buffer().get_many("ride", [ride_id]).get(ride_id, default)
+
+
+def get_driver_locations(driver_ids):
+    return get_location_buffer().get_many("driver", driver_ids)
+
+
+def flush_location_buffer():
+    """
+    Persist buffered positions with one ``bulk_update`` per model.
+    :return: dict with the number of rides and drivers written.
+    """
+    from .models import Ride, User
+
+    buffer = get_location_buffer()
+    written = {}
+    for kind, model in (("ride", Ride), ("driver", User)):
+        positions = buffer.drain(kind)
+        objs = [model(id=obj_id, current_location=_point(*p)) for obj_id, p in positions.items()]
+        model.objects.bulk_update(objs, ["current_location"], batch_size=1000)
+        written[kind] = len(objs)
+    return written
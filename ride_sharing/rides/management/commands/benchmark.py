@@ -0,0 +1,93 @@
+import json
+import os
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from rides.benchmarks import SUITES, compare_results, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Run benchmark suites from rides.benchmarks and print their results as JSON. "
+        "With --compare, timings and rates that regressed against a saved run are "
+        "reported and the command exits with an error. It also fails when a suite "
+        "reports within_budget=false."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("suites", nargs="+", choices=sorted(SUITES) + ["all"])
+        parser.add_argument(
+            "--set",
+            action="append",
+            default=[],
+            metavar="KEY=VALUE",
+            help="Override a suite parameter, e.g. --set riders=1000. "
+            "Prefix it with the suite name (--set nearby.queries=50) when running several.",
+        )
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+        parser.add_argument("--compare", metavar="BASELINE", help="JSON file written by --output.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.1,
+            help="Relative slowdown that counts as a regression (default 0.1).",
+        )
+
+    def handle(self, *args, **options):
+        names = sorted(SUITES) if "all" in options["suites"] else options["suites"]
+        params = {name: {} for name in names}
+        for item in options["set"]:
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Expected KEY=VALUE, got {item!r}")
+            suite, dot, key = key.rpartition(".")
+            if dot and suite not in params:
+                raise CommandError(f"{suite!r} is not one of the suites being run")
+            if not dot and len(names) > 1:
+                raise CommandError(f"Prefix {key!r} with a suite name when running several suites")
+            params[suite or names[0]][key] = value
+
+        results = {}
+        for name in names:
+            self.stderr.write(f"Running {name}...")
+            results[name] = run_suite(name, **params[name])
+
+        if len(names) == 1:
+            self.stdout.write(json.dumps(results[names[0]], indent=2))
+        else:
+            self.stdout.write(json.dumps(results, indent=2))
+
+        if options["output"]:
+            report = {
+                "created_at": timezone.now().isoformat(),
+                "settings": os.environ.get("DJANGO_SETTINGS_MODULE"),
+                "python": platform.python_version(),
+                "machine": platform.node(),
+                "params": params,
+                "results": results,
+            }
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)["results"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Could not read baseline {options['compare']}: {e}")
+            regressions = compare_results(baseline, results, options["threshold"])
+            for suite, key, old, new, change in regressions:
+                self.stderr.write(
+                    self.style.WARNING(f"{suite}.{key}: {old} -> {new} ({change:+.0%} worse)")
+                )
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions against {options['compare']}")
+            self.stderr.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+
+        over_budget = [name for name in names if results[name].get("within_budget") is False]
+        for name in over_budget:
+            self.stderr.write(self.style.WARNING(f"{name}: over budget ({results[name]})"))
+        if over_budget:
+            raise CommandError(f"Over budget: {', '.join(over_budget)}")
@@ -0,0 +1,134 @@
+import random
+import re
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from rides.models import Ride, User
+from rides.utils import nearby_drivers_queryset
+
+EXECUTION_TIME = re.compile(r"Execution Time: ([\d.]+) ms")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN ANALYZE on the matching and ride-listing hot queries and "
+        "report whether the tuned indexes are used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed-drivers",
+            type=int,
+            default=0,
+            help="Insert this many drivers (and as many riders) before explaining. "
+            "Seeded rows are rolled back afterwards.",
+        )
+        parser.add_argument(
+            "--seed-rides", type=int, default=0, help="Insert this many rides."
+        )
+        parser.add_argument("--latitude", type=float, default=12.9716)
+        parser.add_argument("--longitude", type=float, default=77.5946)
+        parser.add_argument("--radius", type=float, default=5000)
+
+    def handle(self, *args, **options):
+        center = Point(options["longitude"], options["latitude"], srid=4326)
+        with transaction.atomic():
+            if options["seed_drivers"] or options["seed_rides"]:
+                self.seed(center, options["seed_drivers"], options["seed_rides"])
+            failures = self.explain_all(center, options["radius"])
+            transaction.set_rollback(True)
+        if failures:
+            self.stderr.write(self.style.WARNING(f"{failures} queries did not use their index."))
+
+    def seed(self, center, drivers, rides):
+        password = make_password(None)
+
+        def near(spread=0.2):
+            return Point(
+                center.x + random.uniform(-spread, spread),
+                center.y + random.uniform(-spread, spread),
+                srid=4326,
+            )
+
+        def users(count, is_driver):
+            return [
+                User(
+                    email=f"{uuid.uuid4().hex}@seed.local",
+                    password=password,
+                    current_location=near(),
+                    is_driver=is_driver,
+                    is_rider=not is_driver,
+                    is_available=is_driver and random.random() < 0.7,
+                )
+                for _ in range(count)
+            ]
+
+        driver_rows = User.objects.bulk_create(users(drivers, True), batch_size=5000)
+        rider_rows = User.objects.bulk_create(users(max(drivers, 1), False), batch_size=5000)
+        statuses = [choice[0] for choice in Ride.STATUS_CHOICES]
+        Ride.objects.bulk_create(
+            [
+                Ride(
+                    rider=random.choice(rider_rows),
+                    driver=random.choice(driver_rows) if driver_rows else None,
+                    pickup_location=near(),
+                    dropoff_location=near(),
+                    status=random.choice(statuses),
+                )
+                for _ in range(rides)
+            ],
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {User._meta.db_table}")
+            cursor.execute(f"ANALYZE {Ride._meta.db_table}")
+        self.stdout.write(f"Seeded {drivers} drivers, {len(rider_rows)} riders, {rides} rides.")
+
+    def explain_all(self, center, radius):
+        rider_id = Ride.objects.values_list("rider_id", flat=True).first()
+        driver_id = Ride.objects.exclude(driver=None).values_list("driver_id", flat=True).first()
+        queries = [
+            (
+                "available drivers near a point",
+                "user_available_driver_gist",
+                nearby_drivers_queryset(center, radius),
+            ),
+            (
+                "rides for a rider ordered by time",
+                "ride_rider_created_idx",
+                Ride.objects.filter(rider_id=rider_id).order_by("-created_at", "-id")[:20],
+            ),
+            (
+                "rides for a driver ordered by time",
+                "ride_driver_created_idx",
+                Ride.objects.filter(driver_id=driver_id).order_by("-created_at", "-id")[:20],
+            ),
+            (
+                "rides for a driver in a status",
+                "ride_driver_status_idx",
+                Ride.objects.filter(driver_id=driver_id, status="in_progress"),
+            ),
+            (
+                "rides in progress",
+                "ride_status_idx",
+                Ride.objects.filter(status="in_progress"),
+            ),
+        ]
+        failures = 0
+        for label, index_name, queryset in queries:
+            plan = queryset.explain(analyze=True)
+            used = index_name in plan
+            match = EXECUTION_TIME.search(plan)
+            timing = f"{match.group(1)} ms" if match else "n/a"
+            style = self.style.SUCCESS if used else self.style.WARNING
+            self.stdout.write(
+                style(f"{label}: {index_name} {'used' if used else 'NOT used'} ({timing})")
+            )
+            if self.verbosity > 1:
+                self.stdout.write(plan)
+            failures += not used
+        return failures
@@ -0,0 +1,69 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rides.fleet import FleetImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Onboard users (drivers by default) in bulk from a CSV or NDJSON file with "
+        "email, password, phone_number, first_name, last_name, is_driver, is_rider, "
+        "latitude and longitude columns. Rows without a password get an unusable one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format", choices=["csv", "ndjson"], help="Defaults to the file extension."
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Password hashing processes (default: CPU count, 0: hash in this process).",
+        )
+        parser.add_argument("--rejects", help="Write rejected rows to this CSV file.")
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Validate and de-duplicate without inserting."
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive")
+        importer = FleetImporter(
+            chunk_size=options["chunk_size"], workers=options["workers"], dry_run=options["dry_run"]
+        )
+        started = time.perf_counter()
+
+        def progress(importer):
+            done = importer.imported + len(importer.rejects)
+            self.stdout.write(f"{done} rows, {done / (time.perf_counter() - started):.0f} rows/s")
+
+        try:
+            importer.run(read_rows(options["path"], options["format"]), on_chunk=progress)
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+        elapsed = time.perf_counter() - started
+
+        rows = importer.imported + len(importer.rejects)
+        verb = "Would import" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {importer.imported} users, rejected {len(importer.rejects)} "
+                f"in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
+        if importer.rejects and options["rejects"]:
+            with open(options["rejects"], "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["line", "email", "reason"])
+                writer.writerows(importer.rejects)
+            self.stdout.write(f"Rejected rows written to {options['rejects']}")
+        else:
+            for line_number, email, reason in importer.rejects[:20]:
+                self.stderr.write(f"line {line_number} ({email or '-'}): {reason}")
+            if len(importer.rejects) > 20:
+                self.stderr.write(f"... and {len(importer.rejects) - 20} more (use --rejects)")
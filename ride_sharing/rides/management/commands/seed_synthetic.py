@@ -0,0 +1,119 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from rides.driver_index import get_driver_index, warm_driver_index
+from rides.models import Ride, User
+from rides.synthetic import (
+    DEFAULT_CENTERS,
+    DEFAULT_STATUS_MIX,
+    SyntheticLoader,
+    flush_synthetic,
+    parse_center,
+    parse_status_mix,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed drivers, riders and historical rides clustered around city centres, "
+        "for reproducible load tests, e.g. --drivers 100000 --riders 200000 --rides 1000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drivers", type=int, default=10000)
+        parser.add_argument("--riders", type=int, default=10000)
+        parser.add_argument("--rides", type=int, default=0)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--center",
+            action="append",
+            default=[],
+            metavar="LNG,LAT[,SIGMA_KM[,WEIGHT]]",
+            help="Hot spot to cluster users and rides around; repeatable. "
+            "Defaults to five Indian cities.",
+        )
+        parser.add_argument(
+            "--status-mix",
+            default=",".join(f"{k}={v}" for k, v in DEFAULT_STATUS_MIX.items()),
+            help="Ride status shares, e.g. completed=0.8,cancelled=0.2.",
+        )
+        parser.add_argument("--days", type=int, default=30, help="History spread of finished rides.")
+        parser.add_argument("--available-share", type=float, default=0.7)
+        parser.add_argument("--batch-size", type=int, default=50000)
+        parser.add_argument(
+            "--loader",
+            choices=["copy", "bulk"],
+            default="copy" if connection.vendor == "postgresql" else "bulk",
+        )
+        parser.add_argument(
+            "--flush", action="store_true", help="Delete earlier synthetic users and rides first."
+        )
+        parser.add_argument(
+            "--warm-index",
+            action="store_true",
+            help="Rebuild the shared driver index afterwards. Not available with a "
+            "process-local index, which the servers rebuild themselves.",
+        )
+
+    def handle(self, *args, **options):
+        if options["warm_index"] and not getattr(get_driver_index(), "shared", False):
+            raise CommandError(
+                "--warm-index needs a shared DRIVER_INDEX backend such as RedisGeoDriverIndex; "
+                "a process-local index would only be warmed inside this command."
+            )
+        try:
+            centers = [parse_center(c) for c in options["center"]] or DEFAULT_CENTERS
+            status_mix = parse_status_mix(options["status_mix"])
+            loader = SyntheticLoader(
+                seed=options["seed"],
+                centers=centers,
+                batch_size=options["batch_size"],
+                loader=options["loader"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options["flush"]:
+                self.stdout.write(f"Deleted {flush_synthetic()} synthetic users")
+            drivers = self.timed(
+                "drivers",
+                lambda: loader.users(options["drivers"], True, options["available_share"]),
+            )
+            riders = self.timed("riders", lambda: loader.users(options["riders"], False))
+            try:
+                self.timed(
+                    "rides",
+                    lambda: loader.rides(
+                        options["rides"], riders, drivers, status_mix, options["days"]
+                    ),
+                    count=options["rides"],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        if connection.vendor == "postgresql":
+            # Fresh statistics, so the planner sees the new row counts right away
+            with connection.cursor() as cursor:
+                for model in (User, Ride):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        if options["warm_index"]:
+            warm_driver_index()
+        else:
+            # Bulk inserts skip the signals that keep the index current
+            get_driver_index().invalidate()
+        self.stdout.write(
+            self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f}s (seed {options['seed']})")
+        )
+
+    def timed(self, label, func, count=None):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        count = len(result) if count is None else count
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f"{count} {label} in {elapsed:.1f}s ({rate:.0f} rows/s)")
+        return result
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from rides.tracking import get_tracker_registry
+
+
+class Command(BaseCommand):
+    help = "Print the number of rides with a live simulate_ride_tracking chain."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Active trackers: {get_tracker_registry().active_count()}")
@@ -0,0 +1,154 @@
+"""
+Batched ride-to-driver assignment.
+
+Pending rides are collected over a short window and matched against the
+available drivers in one go, so that riders requesting at the same moment do
+not all get offered the same few drivers.
+"""
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.db import transaction
+from django.utils import timezone
+from scipy.optimize import linear_sum_assignment
+
+from .geo import METERS_PER_DEGREE, haversine_matrix, pack_points
+from .models import Ride, User
+
+
+def greedy_assignment(cost, candidates=8):
+    """
+    Approximate assignment for batches too large for the exact solver.
+    Each row keeps its ``candidates`` cheapest columns; the pooled pairs are
+    then taken cheapest-first while both sides are still free.
+    """
+    n, m = cost.shape
+    k = min(candidates, m)
+    if k < m:
+        cols = np.argpartition(cost, k - 1, axis=1)[:, :k]
+    else:
+        cols = np.broadcast_to(np.arange(m), (n, m))
+    rows = np.repeat(np.arange(n), k)
+    cols = cols.reshape(-1)
+    order = np.argsort(cost[rows, cols], kind="stable")
+
+    row_free = np.ones(n, dtype=bool)
+    col_free = np.ones(m, dtype=bool)
+    matched_rows, matched_cols = [], []
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row_free[row] and col_free[col]:
+            row_free[row] = col_free[col] = False
+            matched_rows.append(row)
+            matched_cols.append(col)
+    return np.array(matched_rows, dtype=int), np.array(matched_cols, dtype=int)
+
+
+def solve_assignment(cost, max_cost=None, exact_limit=None):
+    """
+    Globally assign rows (rides) to columns (drivers) minimising total cost.
+    Uses the Hungarian method (scipy's linear_sum_assignment) while the matrix
+    has at most ``exact_limit`` cells and falls back to ``greedy_assignment``.
+    Pairs costing more than ``max_cost`` are dropped from the result.
+    """
+    if cost.size == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    if exact_limit is None:
+        exact_limit = settings.MATCHING_EXACT_MAX_CELLS
+    if max_cost is not None:
+        # Infeasible pairs get a flat penalty so the solver still returns a
+        # full assignment; they are filtered out below.
+        cost = np.where(cost > max_cost, max_cost * 10 + 1, cost)
+    if cost.size <= exact_limit:
+        rows, cols = linear_sum_assignment(cost)
+    else:
+        rows, cols = greedy_assignment(cost)
+    if max_cost is not None:
+        keep = cost[rows, cols] <= max_cost
+        rows, cols = rows[keep], cols[keep]
+    return rows, cols
+
+
+def expire_stale_offers(now=None):
+    """Release drivers that were offered a ride but never accepted it."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.MATCHING_OFFER_TIMEOUT_SECONDS)
+    return Ride.objects.filter(
+        status="requested", offered_driver__isnull=False, offered_at__lt=cutoff
+    ).update(offered_driver=None, offered_at=None)
+
+
+def match_pending_rides(batch_size=None, max_distance=None):
+    """
+    Offer every unassigned ``requested`` ride to at most one driver and every
+    available driver to at most one ride, minimising total pickup distance.
+    :return: dict with the batch sizes, number of offers made and timings.
+    """
+    batch_size = batch_size or settings.MATCHING_BATCH_SIZE
+    max_distance = max_distance or settings.MATCHING_MAX_DISTANCE
+    started = time.perf_counter()
+    expire_stale_offers()
+
+    with transaction.atomic():
+        rides = list(
+            Ride.objects.select_for_update(skip_locked=True)
+            .filter(status="requested", driver__isnull=True, offered_driver__isnull=True)
+            .only("id", "pickup_location")
+            .order_by("created_at")[:batch_size]
+        )
+        if not rides:
+            return {"rides": 0, "drivers": 0, "offers": 0, "duration_ms": 0.0}
+        ride_coords = pack_points(ride.pickup_location for ride in rides)
+
+        # Only drivers inside the riders' bounding box (padded by max_distance)
+        # and not already holding an offer are candidates.
+        pad_lat = max_distance / METERS_PER_DEGREE
+        pad_lng = pad_lat / max(np.cos(np.radians(np.abs(ride_coords[:, 1]).max())), 0.01)
+        bbox = Polygon.from_bbox(
+            (
+                ride_coords[:, 0].min() - pad_lng,
+                ride_coords[:, 1].min() - pad_lat,
+                ride_coords[:, 0].max() + pad_lng,
+                ride_coords[:, 1].max() + pad_lat,
+            )
+        )
+        bbox.srid = 4326
+        offered = Ride.objects.filter(
+            status="requested", offered_driver__isnull=False
+        ).values("offered_driver_id")
+        drivers = list(
+            User.objects.filter(
+                is_driver=True,
+                is_available=True,
+                current_location__contained=bbox,
+            )
+            .exclude(id__in=offered)
+            .values_list("id", "current_location")
+        )
+        if not drivers:
+            return {"rides": len(rides), "drivers": 0, "offers": 0, "duration_ms": 0.0}
+        driver_coords = pack_points(location for _, location in drivers)
+
+        solve_started = time.perf_counter()
+        cost = haversine_matrix(ride_coords, driver_coords)
+        rows, cols = solve_assignment(cost, max_cost=max_distance)
+        solve_ms = (time.perf_counter() - solve_started) * 1000
+
+        now = timezone.now()
+        offers = []
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            ride = rides[row]
+            ride.offered_driver_id = drivers[col][0]
+            ride.offered_at = now
+            offers.append(ride)
+        Ride.objects.bulk_update(offers, ["offered_driver", "offered_at"])
+
+    return {
+        "rides": len(rides),
+        "drivers": len(drivers),
+        "offers": len(offers),
+        "solve_ms": round(solve_ms, 3),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
@@ -0,0 +1,409 @@
+"""
+In-process metrics exposed at ``/metrics`` in the Prometheus text format.
+
+Counters, gauges and histograms live in REGISTRY and cost a dict lookup, a
+lock and a few additions per observation. Web and ASGI processes serve their
+own metrics. Celery workers push a snapshot of theirs to Redis (key per
+process, at most every METRICS_PUSH_INTERVAL seconds, expiring after
+METRICS_PUSH_TTL), and ``/metrics`` adds up every live snapshot with the
+local values. A restarted worker therefore shows up as a counter reset,
+which ``rate()`` handles. Set METRICS_REDIS_URL to None to serve local
+metrics only.
+"""
+import bisect
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timezone as dt_timezone
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from . import fastjson
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; from sub-millisecond cache hits to slow matching windows
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class _Child:
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("lock", "buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        # Per-bucket (not cumulative) counts; the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _new_child(self):
+        return _Child()
+
+    def labels(self, *values):
+        """The child for these label values, in ``labelnames`` order."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+                self._children.setdefault(values, child)
+        return child
+
+    def snapshot(self):
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": {
+                fastjson.dumps_text(list(key)): self._sample(child)
+                for key, child in list(self._children.items())
+                if all(isinstance(v, str) for v in key)
+            },
+        }
+
+    def _sample(self, child):
+        return child.value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(float(b) for b in buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def snapshot(self):
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        return data
+
+    def _sample(self, child):
+        return [*child.counts, child.sum]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+
+REGISTRY = Registry()
+
+
+def merge_snapshots(snapshots):
+    """Add up metric snapshots from several processes."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, data in snapshot.items():
+            target = merged.setdefault(name, {**data, "samples": {}})
+            for key, sample in data["samples"].items():
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = list(sample) if isinstance(sample, list) else sample
+                elif isinstance(sample, list):
+                    target["samples"][key] = [a + b for a, b in zip(current, sample)]
+                else:
+                    target["samples"][key] = current + sample
+    return merged
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(snapshot):
+    """Prometheus text exposition format (0.0.4) of a snapshot."""
+    lines = []
+    for name, data in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        names = data["labelnames"]
+        for key, sample in sorted(data["samples"].items()):
+            values = fastjson.loads(key)
+            if data["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, values)} {_number(sample)}")
+                continue
+            *counts, total = sample
+            cumulative = 0
+            for bound, count in zip([*data["buckets"], float("inf")], counts):
+                cumulative += count
+                le = (("le", _number(bound)),)
+                lines.append(f"{name}_bucket{_labels(names, values, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# Shared snapshots of worker processes
+
+_redis = None
+_last_push = 0.0
+
+
+def _redis_client():
+    global _redis
+    url = getattr(settings, "METRICS_REDIS_URL", None)
+    if url is None:
+        return None
+    if _redis is None:
+        import redis
+
+        _redis = redis.Redis.from_url(url, socket_timeout=1)
+    return _redis
+
+
+def _process_key():
+    return f"metrics:process:{socket.gethostname()}:{os.getpid()}"
+
+
+def push_snapshot(force=False):
+    """Publish this process's metrics for ``/metrics`` to pick up."""
+    global _last_push
+    now = time.monotonic()
+    if not force and now - _last_push < settings.METRICS_PUSH_INTERVAL:
+        return False
+    client = _redis_client()
+    if client is None:
+        return False
+    _last_push = now
+    try:
+        client.set(_process_key(), fastjson.dumps(REGISTRY.snapshot()), ex=settings.METRICS_PUSH_TTL)
+    except Exception as e:
+        logger.warning("Could not push metrics: %s", e)
+        return False
+    return True
+
+
+def remote_snapshots():
+    client = _redis_client()
+    if client is None:
+        return []
+    try:
+        keys = [key for key in client.scan_iter("metrics:process:*", count=500)]
+        own = _process_key().encode()
+        values = client.mget([key for key in keys if key != own]) if keys else []
+    except Exception as e:
+        logger.warning("Could not read worker metrics: %s", e)
+        return []
+    return [fastjson.loads(value) for value in values if value]
+
+
+def metrics_view(request):
+    """``/metrics``: this process's metrics plus the ones workers pushed."""
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+    snapshot = merge_snapshots([REGISTRY.snapshot(), *remote_snapshots()])
+    return HttpResponse(render(snapshot), content_type=CONTENT_TYPE)
+
+
+# Metrics of the hot paths
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, by URL name.",
+    ["url_name", "method", "status"],
+)
+NEARBY_DRIVERS_FOUND = Histogram(
+    "nearby_drivers_found",
+    "Drivers returned by get_nearby_drivers.",
+    ["source"],
+    buckets=(0, 1, 2, 3, 4, 5, 10),
+)
+MATCHING_BATCH_RIDES = Histogram(
+    "matching_batch_rides",
+    "Pending rides considered per matching window.",
+    buckets=(0, 1, 10, 50, 100, 500, 1000, 5000),
+)
+MATCHING_OFFERS = Histogram(
+    "matching_offers",
+    "Offers made per matching window.",
+    buckets=(0, 1, 10, 50, 100, 500, 1000, 5000),
+)
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds", "Celery task runtime.", ["task", "state"]
+)
+CELERY_TASK_LAG = Histogram(
+    "celery_task_lag_seconds",
+    "Delay between a task's publish time, or its eta/countdown, and its start.",
+    ["task"],
+    buckets=LAG_BUCKETS,
+)
+GROUP_SEND_DURATION = Histogram(
+    "channels_group_send_duration_seconds",
+    "Channel layer group_send latency, by group kind.",
+    ["group"],
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections", "Open WebSocket connections, by consumer.", ["consumer"]
+)
+
+
+class MetricsMiddleware:
+    """Records HTTP_REQUEST_DURATION for every request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def observe(request, response, elapsed):
+        match = getattr(request, "resolver_match", None)
+        url_name = (match.url_name if match is not None else None) or "unmatched"
+        status_class = f"{response.status_code // 100}xx"
+        HTTP_REQUEST_DURATION.labels(url_name, request.method, status_class).observe(elapsed)
+
+
+# Celery task instrumentation. Publishing happens in web processes and beat,
+# the other signals fire in worker processes only.
+
+SENT_AT_HEADER = "sent_at"
+
+_task_started = {}
+
+
+@before_task_publish.connect
+def _before_task_publish(headers=None, **kwargs):
+    # Beat-scheduled tasks have no eta, so lag is measured from this instead
+    if headers is not None:
+        headers.setdefault(SENT_AT_HEADER, time.time())
+
+
+def task_lag(request, now=None):
+    """Seconds between when ``request`` was due (eta, else publish) and ``now``."""
+    now = time.time() if now is None else now
+    eta = getattr(request, "eta", None)
+    if eta:
+        eta = parse_datetime(eta) if isinstance(eta, str) else eta
+        if eta is not None:
+            if timezone.is_naive(eta):
+                eta = timezone.make_aware(eta, dt_timezone.utc)
+            return max(now - eta.timestamp(), 0.0)
+    sent_at = getattr(request, SENT_AT_HEADER, None)
+    if sent_at is None:
+        sent_at = (getattr(request, "headers", None) or {}).get(SENT_AT_HEADER)
+    if sent_at is None:
+        return None
+    return max(now - float(sent_at), 0.0)
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    lag = task_lag(task.request)
+    if lag is not None:
+        CELERY_TASK_LAG.labels(task.name).observe(lag)
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+    push_snapshot()
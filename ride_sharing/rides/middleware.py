@@ -0,0 +1,32 @@
+"""
+WebSocket authentication for browser clients, which cannot set an
+Authorization header on the handshake and pass the JWT as ``?token=``.
+"""
+from urllib.parse import parse_qs
+
+from channels.middleware import BaseMiddleware
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import RidePrincipal, ais_user_active
+
+
+class JWTQueryStringAuthMiddleware(BaseMiddleware):
+    """
+    Put a RidePrincipal built from a valid ``token`` query parameter into
+    ``scope["user"]``. The user row is not loaded; only the cached
+    revocation check runs, on the event loop when the cache is fresh.
+    Without a valid token the scope is left as it is.
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        token = query.get("token", [None])[0]
+        if token:
+            try:
+                principal = RidePrincipal(AccessToken(token))
+            except TokenError:
+                principal = None
+            if principal is not None and await ais_user_active(principal.id):
+                scope = dict(scope, user=principal)
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 18:10
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('rides', '0004_user_current_location'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='is_available',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['rider', 'created_at'], name='ride_rider_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['driver', 'status'], name='ride_driver_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['status'], name='ride_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('is_available', True), ('is_driver', True)), fields=['current_location'], name='user_available_driver_gist'),
+        ),
+    ]
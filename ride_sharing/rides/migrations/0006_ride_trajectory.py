@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-18 18:24
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0005_spatial_and_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='route',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, null=True, spatial_index=False, srid=4326),
+        ),
+        # The table is range-partitioned by day on recorded_at, which Django
+        # cannot express, so the database side is raw SQL. Partitions for
+        # each day are created ahead of time by rides.trajectory.ensure_partitions;
+        # the default partition catches anything outside them.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RideLocationPoint',
+                    fields=[
+                        ('pk', models.CompositePrimaryKey('ride_id', 'recorded_at', blank=True, editable=False, primary_key=True, serialize=False)),
+                        ('recorded_at', models.DateTimeField()),
+                        ('location', django.contrib.gis.db.models.fields.PointField(spatial_index=False, srid=4326)),
+                        ('ride', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='location_points', to='rides.ride')),
+                    ],
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql=[
+                        """
+                        CREATE TABLE "rides_ridelocationpoint" (
+                            "ride_id" uuid NOT NULL
+                                REFERENCES "rides_ride" ("id") ON DELETE CASCADE
+                                DEFERRABLE INITIALLY DEFERRED,
+                            "recorded_at" timestamp with time zone NOT NULL,
+                            "location" geometry(POINT, 4326) NOT NULL,
+                            PRIMARY KEY ("ride_id", "recorded_at")
+                        ) PARTITION BY RANGE ("recorded_at")
+                        """,
+                        """
+                        CREATE TABLE "rides_ridelocationpoint_default"
+                            PARTITION OF "rides_ridelocationpoint" DEFAULT
+                        """,
+                    ],
+                    reverse_sql='DROP TABLE "rides_ridelocationpoint"',
+                ),
+            ],
+        ),
+    ]
@@ -2,6 +2,7 @@ import uuid
 from django.contrib.auth.models import AbstractUser, BaseUserManager, Group, Permission
 from django.db import models
 from django.contrib.gis.db import models as gis_models
+from django.contrib.postgres.indexes import GistIndex
 
 
 class CustomUserManager(BaseUserManager):
@@ -56,6 +57,16 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Only the rows the matcher ever searches: available drivers.
+            GistIndex(
+                fields=["current_location"],
+                name="user_available_driver_gist",
+                condition=models.Q(is_driver=True, is_available=True),
+            ),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -70,17 +81,34 @@ class Ride(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     rider = models.ForeignKey(User, on_delete=models.CASCADE, related_name="rider_rides")
     driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name="driver_rides", null=True, blank=True)
+    # Driver the matcher offered a requested ride to; ``driver`` is only set on accept
+    offered_driver = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name="offered_rides", null=True, blank=True
+    )
+    offered_at = models.DateTimeField(null=True, blank=True)
     pickup_location = gis_models.PointField()  # Latitude/Longitude for pickup
     dropoff_location = gis_models.PointField()  # Latitude/Longitude for dropoff
     current_location = gis_models.PointField(
         null=True, blank=True
     )  # Real-time tracking
+    route = gis_models.LineStringField(
+        null=True, blank=True, spatial_index=False
+    )  # Compacted trajectory, set once the ride is completed
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default="requested"
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Back the (created_at, id) cursor pagination of ride lists
+            models.Index(fields=["rider", "-created_at", "-id"], name="ride_rider_created_idx"),
+            models.Index(fields=["driver", "-created_at", "-id"], name="ride_driver_created_idx"),
+            models.Index(fields=["driver", "status"], name="ride_driver_status_idx"),
+            models.Index(fields=["status"], name="ride_status_idx"),
+        ]
+
     def __str__(self):
         return f"Ride {self.id} - {self.status}"
 
@@ -88,3 +116,23 @@ class Ride(models.Model):
         if self.status not in dict(self.STATUS_CHOICES):
             raise ValueError(f"Invalid status: {self.status}")
         super().save(*args, **kwargs)
+
+
+class RideLocationPoint(models.Model):
+    """
+    One stored position of a ride's trajectory.
+    The table is range-partitioned by day on ``recorded_at`` (see migration
+    0006), so the primary key has to include it.
+    """
+
+    pk = models.CompositePrimaryKey("ride_id", "recorded_at")
+    # Deleting a ride cascades in the database (ON DELETE CASCADE) rather than
+    # loading every point into the ORM collector.
+    ride = models.ForeignKey(
+        Ride, on_delete=models.DO_NOTHING, related_name="location_points", db_index=False
+    )
+    recorded_at = models.DateTimeField()
+    location = gis_models.PointField(spatial_index=False)
+
+    def __str__(self):
+        return f"Ride {self.ride_id} @ {self.recorded_at.isoformat()}"
@@ -0,0 +1,106 @@
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.db.models.fields.tuple_lookups import Tuple, TupleGreaterThan, TupleLessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+from . import fastjson
+
+
+class RideCursorPagination(CursorPagination):
+    """
+    Newest rides first. DRF's cursor only holds the first ordering column and
+    skips rows sharing its value with an OFFSET; this one holds every column,
+    so each page is a single index range scan on (rider|driver, created_at, id)
+    with ``(created_at, id) < (%s, %s)``, however long the ride history is.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset with the position filter on the
+        # whole ordering key
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        descending = {order.startswith("-") for order in self.ordering}
+        assert len(descending) == 1, "Keyset pagination needs one direction for every column"
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*[self._flip(order) for order in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            names = [order.lstrip("-") for order in self.ordering]
+            key = Tuple(*[F(name) for name in names])
+            values = self._decode_position(queryset.model, names, current_position)
+            lookup = TupleLessThan if reverse != descending.pop() else TupleGreaterThan
+            queryset = queryset.filter(lookup(key, values))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    @staticmethod
+    def _flip(order):
+        return order[1:] if order.startswith("-") else f"-{order}"
+
+    def _decode_position(self, model, names, position):
+        try:
+            values = fastjson.loads(position)
+            if not isinstance(values, list) or len(values) != len(names):
+                raise ValueError(position)
+            return tuple(
+                model._meta.get_field(name).to_python(value) for name, value in zip(names, values)
+            )
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        names = [order.lstrip("-") for order in ordering]
+        if isinstance(instance, dict):
+            values = [instance[name] for name in names]
+        else:
+            values = [getattr(instance, name) for name in names]
+        return fastjson.dumps_text([str(value) for value in values])
@@ -0,0 +1,120 @@
+"""
+Latest-position cache for ride tracking reads.
+
+Two cache keys per ride are read together with ``get_many``:
+``ride:<id>:members`` (rider, driver and status, dropped on every status
+transition) and ``ride:<id>:position`` (last location and its timestamp,
+overwritten by the trackers). A warm lookup costs one cache round trip and
+no database query.
+"""
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+
+from .aio import cache_get_many
+
+MEMBERS_TTL = 300
+POSITION_TTL = 3600
+
+
+def _members_key(ride_id):
+    return f"ride:{ride_id}:members"
+
+
+def _position_key(ride_id):
+    return f"ride:{ride_id}:position"
+
+
+class RideSnapshot:
+    """Who may see a ride and where it last was."""
+
+    __slots__ = ("ride_id", "rider_id", "driver_id", "status", "location", "timestamp")
+
+    def __init__(self, ride_id, members, position):
+        self.ride_id = str(ride_id)
+        self.rider_id = members["rider_id"]
+        self.driver_id = members["driver_id"]
+        self.status = members["status"]
+        self.location = Point(*position["location"], srid=4326) if position["location"] else None
+        self.timestamp = position["ts"]
+
+    def can_view(self, user_id):
+        return str(user_id) in (self.rider_id, self.driver_id)
+
+    @property
+    def etag(self):
+        coords = "none" if self.location is None else f"{self.location.x!r},{self.location.y!r}"
+        return '"%s"' % hashlib.md5(coords.encode()).hexdigest()[:16]
+
+
+def set_positions(locations, timestamp=None):
+    """Record ``{ride_id: Point}`` as the latest positions."""
+    timestamp = timestamp or time.time()
+    cache.set_many(
+        {
+            _position_key(ride_id): {"location": (point.x, point.y), "ts": timestamp}
+            for ride_id, point in locations.items()
+        },
+        POSITION_TTL,
+    )
+
+
+def invalidate(*ride_ids):
+    """Drop cached membership after a status transition or driver change."""
+    cache.delete_many([_members_key(ride_id) for ride_id in ride_ids])
+
+
+def get_snapshot(ride_id):
+    """
+    Return a RideSnapshot, or None if the ride does not exist.
+    Only a cache miss touches the database.
+    """
+    members_key, position_key = _members_key(ride_id), _position_key(ride_id)
+    cached = cache.get_many([members_key, position_key])
+    members, position = cached.get(members_key), cached.get(position_key)
+    if members is not None and position is not None:
+        return RideSnapshot(ride_id, members, position)
+
+    from .location_buffer import get_ride_location
+    from .models import Ride
+
+    row = (
+        Ride.objects.filter(id=ride_id)
+        .values("rider_id", "driver_id", "status", "current_location", "updated_at")
+        .first()
+    )
+    if row is None:
+        return None
+    if members is None:
+        members = {
+            "rider_id": str(row["rider_id"]),
+            "driver_id": str(row["driver_id"]) if row["driver_id"] else None,
+            "status": row["status"],
+        }
+        cache.set(members_key, members, MEMBERS_TTL)
+    if position is None:
+        location = get_ride_location(ride_id, row["current_location"])
+        position = {
+            "location": (location.x, location.y) if location else None,
+            "ts": row["updated_at"].timestamp(),
+        }
+        # add() so a tracker write racing with this miss is not overwritten.
+        cache.add(position_key, position, POSITION_TTL)
+    return RideSnapshot(ride_id, members, position)
+
+
+async def aget_snapshot(ride_id):
+    """
+    Async ``get_snapshot`` for consumers and async views: a warm lookup is one
+    MGET on the event loop (redis.asyncio), and a miss runs the database
+    fallback through sync_to_async.
+    """
+    members_key, position_key = _members_key(ride_id), _position_key(ride_id)
+    cached = await cache_get_many([members_key, position_key])
+    members, position = cached.get(members_key), cached.get(position_key)
+    if members is not None and position is not None:
+        return RideSnapshot(ride_id, members, position)
+    return await sync_to_async(get_snapshot)(ride_id)
@@ -0,0 +1,162 @@
+"""
+Per-endpoint database budgets.
+
+QueryBudgetMiddleware counts the queries each request runs and the time
+spent in the database, through a connection execute wrapper. Savepoint
+statements are not counted; they are transaction bookkeeping, not work.
+Budgets are declared per URL name in settings.QUERY_BUDGETS, as
+``{"queries": n, "db_ms": m}``.
+
+An over-budget request is logged. With QUERY_BUDGET_STRICT it raises
+QueryBudgetExceeded instead, which the tests turn on. With
+QUERY_BUDGET_HEADERS the response also carries ``X-DB-Queries`` and a
+``Server-Timing: db;dur=..`` header.
+
+Queries are attributed to the request through a context variable, which
+asgiref carries into sync_to_async threads, so the ORM calls of async views
+count as well. The execute wrapper that reads it is installed on every
+connection when it opens, and on the current one by the sync middleware.
+"""
+import contextvars
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+SAVEPOINT_PREFIXES = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+_recorder = contextvars.ContextVar("query_budget_recorder", default=None)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _record(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.db_ms += (time.perf_counter() - started) * 1000
+        if not sql.lstrip().upper().startswith(SAVEPOINT_PREFIXES):
+            recorder.queries += 1
+
+
+def install(conn):
+    """Add the recording execute wrapper to ``conn`` if it is not there yet."""
+    if _record not in conn.execute_wrappers:
+        conn.execute_wrappers.append(_record)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_on_connection_created, dispatch_uid="rides.query_budget")
+
+
+class QueryRecorder:
+    """Context manager recording ``queries`` and ``db_ms`` of the current context."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self._token = None
+
+    def __enter__(self):
+        self._token = _recorder.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _recorder.reset(self._token)
+
+
+def get_budget(url_name):
+    return getattr(settings, "QUERY_BUDGETS", {}).get(url_name)
+
+
+def budget_violations(url_name, queries, db_ms):
+    """:return: messages for every limit of ``url_name``'s budget that was exceeded."""
+    budget = get_budget(url_name)
+    if budget is None:
+        return []
+    violations = []
+    if "queries" in budget and queries > budget["queries"]:
+        violations.append(f"{url_name} ran {queries} queries (budget {budget['queries']})")
+    if "db_ms" in budget and db_ms > budget["db_ms"]:
+        violations.append(f"{url_name} spent {db_ms:.1f} ms in the database (budget {budget['db_ms']})")
+    return violations
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        install(connection)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        with QueryRecorder() as recorder:
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    def finish(self, request, response, recorder):
+        response.query_stats = {"queries": recorder.queries, "db_ms": round(recorder.db_ms, 3)}
+        if getattr(settings, "QUERY_BUDGET_HEADERS", False):
+            response["X-DB-Queries"] = str(recorder.queries)
+            response["Server-Timing"] = f"db;dur={recorder.db_ms:.3f}"
+
+        match = getattr(request, "resolver_match", None)
+        if match is None or not match.url_name:
+            return response
+        violations = budget_violations(match.url_name, recorder.queries, recorder.db_ms)
+        if violations:
+            message = "; ".join(violations)
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning("Query budget exceeded: %s", message)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin: every request made by the test clients fails with
+    QueryBudgetExceeded when it goes over its endpoint's budget.
+    """
+
+    def setUp(self):
+        from django.test.utils import override_settings
+
+        super().setUp()
+        # The test database connection was opened before the signal could see it
+        install(connection)
+        strict = override_settings(QUERY_BUDGET_STRICT=True)
+        strict.enable()
+        self.addCleanup(strict.disable)
+
+    def assertWithinBudget(self, response):
+        """Also fail when the endpoint has no declared budget."""
+        url_name = response.resolver_match.url_name
+        self.assertIsNotNone(get_budget(url_name), f"No query budget declared for {url_name}")
+        stats = response.query_stats
+        self.assertEqual(budget_violations(url_name, stats["queries"], stats["db_ms"]), [])
+        return stats
@@ -0,0 +1,28 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from . import fastjson
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer backed by rides.fastjson; ``indent`` is always two spaces."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        return fastjson.dumps(data, indent=bool(indent))
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser backed by rides.fastjson. Request bodies must be UTF-8."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return fastjson.loads(stream.read())
+        except fastjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
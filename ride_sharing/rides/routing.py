@@ -1,8 +1,10 @@
 from django.urls import re_path
-from .consumer import RideTrackingConsumer
+from .consumer import DispatchConsumer, DriverLocationConsumer, RideTrackingConsumer
 
 websocket_urlpatterns = [
     re_path(
         r"ws/ride-tracking/(?P<ride_id>[0-9a-f-]+)/$", RideTrackingConsumer.as_asgi()
     ),
+    re_path(r"ws/dispatch/$", DispatchConsumer.as_asgi()),
+    re_path(r"ws/driver/location/$", DriverLocationConsumer.as_asgi()),
 ]
@@ -51,3 +51,41 @@ class RideSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['rider', 'driver', 'current_location', 'created_at', 'updated_at']
 
+
+
+class RideListSerializer(serializers.ModelSerializer):
+    """
+    Slim ride representation for list views. Geometry is left out unless
+    asked for with ``?fields=``, e.g. ``?fields=id,status,pickup_location``.
+    """
+
+    DEFAULT_FIELDS = ("id", "status", "rider", "driver", "created_at", "updated_at")
+    OPTIONAL_FIELDS = ("pickup_location", "dropoff_location", "current_location", "route")
+
+    class Meta:
+        model = Ride
+        fields = (
+            "id", "status", "rider", "driver", "created_at", "updated_at",
+            "pickup_location", "dropoff_location", "current_location", "route",
+        )
+        read_only_fields = fields
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = set(fields or self.DEFAULT_FIELDS)
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, param):
+        """Parse a ``?fields=`` value into field names; None means the defaults."""
+        if not param:
+            return None
+        fields = tuple(dict.fromkeys(name.strip() for name in param.split(",") if name.strip()))
+        unknown = set(fields) - set(cls.Meta.fields)
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": f"Unknown fields: {', '.join(sorted(unknown))}."}
+            )
+        return fields or None
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .driver_index import get_driver_index, sync_driver
+from .models import User
+
+INDEXED_FIELDS = {"current_location", "is_available", "is_driver"}
+
+
+@receiver(post_save, sender=User)
+def update_driver_index(sender, instance, update_fields=None, **kwargs):
+    """Keep the driver index in step with location and availability changes."""
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    sync_driver(instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_from_driver_index(sender, instance, **kwargs):
+    get_driver_index().remove(instance.id)
@@ -0,0 +1,285 @@
+"""
+Reproducible synthetic datasets for load testing (``manage.py seed_synthetic``).
+
+Drivers and riders are drawn from Gaussian hot spots around city centres.
+Rides get a configurable status mix, pickup and dropoff near the hot spots,
+and timestamps spread over the last few days. Rows are generated with numpy
+in batches and loaded with PostgreSQL ``COPY`` or, on any other backend,
+with ``bulk_create``. The same seed always gives the same rows (ids
+included), so reseeding with it needs ``flush_synthetic`` first.
+"""
+import datetime
+import io
+import uuid
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .geo import METERS_PER_DEGREE
+from .models import Ride, User
+
+# (longitude, latitude, sigma in km, weight)
+DEFAULT_CENTERS = [
+    (77.5946, 12.9716, 6.0, 4.0),  # Bengaluru
+    (72.8777, 19.0760, 8.0, 3.0),  # Mumbai
+    (77.2090, 28.6139, 10.0, 3.0),  # Delhi
+    (78.4867, 17.3850, 6.0, 2.0),  # Hyderabad
+    (80.2707, 13.0827, 5.0, 1.0),  # Chennai
+]
+
+DEFAULT_STATUS_MIX = {"completed": 0.80, "cancelled": 0.12, "in_progress": 0.05, "requested": 0.03}
+
+EMAIL_DOMAIN = "synthetic.local"
+
+# Mean trip length in km, for dropoffs drawn around the pickup
+TRIP_KM = 5.0
+
+
+def parse_center(value):
+    """Parse ``lng,lat[,sigma_km[,weight]]``."""
+    parts = [float(p) for p in value.split(",")]
+    if not 2 <= len(parts) <= 4:
+        raise ValueError(f"Expected lng,lat[,sigma_km[,weight]], got {value!r}")
+    lng, lat = parts[:2]
+    sigma_km = parts[2] if len(parts) > 2 else 5.0
+    weight = parts[3] if len(parts) > 3 else 1.0
+    return lng, lat, sigma_km, weight
+
+
+def parse_status_mix(value):
+    """Parse ``status=share,...``; shares are normalized to sum to one."""
+    mix = {}
+    for item in value.split(","):
+        status, sep, share = item.partition("=")
+        if not sep or status not in dict(Ride.STATUS_CHOICES):
+            raise ValueError(f"Expected status=share with a ride status, got {item!r}")
+        mix[status] = float(share)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("Status shares must add up to more than zero")
+    return {status: share / total for status, share in mix.items()}
+
+
+def _offsets(rng, origins, sigma_km):
+    """Gaussian offsets of ``sigma_km`` around ``origins`` (n x 2 lng/lat)."""
+    sigma_deg = np.asarray(sigma_km, dtype=np.float64) * 1000 / METERS_PER_DEGREE
+    cos_lat = np.maximum(np.cos(np.radians(origins[:, 1])), 0.01)
+    out = origins + rng.normal(size=origins.shape) * np.stack(
+        [sigma_deg / cos_lat, np.broadcast_to(sigma_deg, cos_lat.shape)], axis=1
+    )
+    out[:, 0] = (out[:, 0] + 180) % 360 - 180
+    out[:, 1] = np.clip(out[:, 1], -89.9, 89.9)
+    return out
+
+
+def hotspot_points(rng, count, centers=DEFAULT_CENTERS):
+    """``count`` (lng, lat) rows drawn from the weighted Gaussian hot spots."""
+    table = np.asarray(centers, dtype=np.float64)
+    weights = table[:, 3] / table[:, 3].sum()
+    picked = rng.choice(len(table), size=count, p=weights)
+    return _offsets(rng, table[picked, :2], table[picked, 2])
+
+
+def _uuids(rng, count):
+    raw = rng.bytes(16 * count)
+    return [uuid.UUID(bytes=raw[i : i + 16], version=4) for i in range(0, 16 * count, 16)]
+
+
+class SyntheticLoader:
+    """
+    Generate and load users and rides. ``loader`` is ``copy`` (PostgreSQL
+    only) or ``bulk`` (``bulk_create``).
+    """
+
+    def __init__(self, seed=0, centers=DEFAULT_CENTERS, batch_size=50000, loader="copy", now=None):
+        self.rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.centers = centers
+        self.batch_size = batch_size
+        self.loader = loader
+        self.now = now or timezone.now()
+        # Every synthetic user shares one unusable password hash
+        self.password = make_password(None)
+        if loader == "copy" and connection.vendor != "postgresql":
+            raise ValueError("The copy loader needs PostgreSQL; use loader='bulk'.")
+
+    def users(self, count, is_driver, available_share=0.7):
+        """Create ``count`` drivers or riders. :return: their ids."""
+        ids = []
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            batch_ids = _uuids(self.rng, size)
+            coords = hotspot_points(self.rng, size, self.centers).tolist()
+            available = (self.rng.random(size) < available_share).tolist()
+            role = "driver" if is_driver else "rider"
+            rows = [
+                {
+                    "id": user_id,
+                    "email": f"{role}-{user_id.hex}@{EMAIL_DOMAIN}",
+                    "password": self.password,
+                    "date_joined": self.now,
+                    "current_location": tuple(coords[i]),
+                    "is_driver": is_driver,
+                    "is_rider": not is_driver,
+                    "is_available": is_driver and available[i],
+                }
+                for i, user_id in enumerate(batch_ids)
+            ]
+            self.load(User, rows)
+            ids.extend(batch_ids)
+        return ids
+
+    def rides(self, count, rider_ids, driver_ids, status_mix=DEFAULT_STATUS_MIX, days=30):
+        """
+        Create ``count`` rides among the given riders and drivers.
+        :return: ids of the drivers given an in-progress ride (now unavailable).
+        """
+        if count and not rider_ids:
+            raise ValueError("Rides need at least one rider")
+        statuses = list(status_mix)
+        shares = np.array([status_mix[s] for s in statuses])
+        busy = []
+        # Each in-progress ride gets its own driver while drivers last
+        free_drivers = list(self.rng.permutation(len(driver_ids))) if driver_ids else []
+
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            ride_ids = _uuids(self.rng, size)
+            status = np.asarray(statuses)[self.rng.choice(len(statuses), size=size, p=shares)]
+            pickup = hotspot_points(self.rng, size, self.centers)
+            dropoff = _offsets(self.rng, pickup, TRIP_KM)
+            progress = self.rng.random(size)
+            riders = self.rng.integers(len(rider_ids), size=size)
+            drivers = self.rng.integers(len(driver_ids), size=size) if driver_ids else None
+
+            # Open rides are recent; finished ones spread over ``days``
+            age_s = np.where(
+                status == "requested",
+                self.rng.uniform(0, 600, size),
+                np.where(
+                    status == "in_progress",
+                    self.rng.uniform(0, 3600, size),
+                    self.rng.uniform(0, days * 86400, size),
+                ),
+            )
+            duration_s = self.rng.uniform(300, 3600, size)
+            # Half the cancellations happen before a driver accepted
+            matched = (status == "in_progress") | (status == "completed") | (
+                (status == "cancelled") & (self.rng.random(size) < 0.5)
+            )
+
+            rows = []
+            for i, ride_id in enumerate(ride_ids):
+                ride_status = str(status[i])
+                driver_id = None
+                if matched[i] and driver_ids:
+                    if ride_status == "in_progress" and free_drivers:
+                        driver_id = driver_ids[free_drivers.pop()]
+                        busy.append(driver_id)
+                    else:
+                        driver_id = driver_ids[drivers[i]]
+                if ride_status == "completed":
+                    current = dropoff[i]
+                elif ride_status == "in_progress":
+                    current = pickup[i] + (dropoff[i] - pickup[i]) * progress[i]
+                else:
+                    current = None
+                created_at = self.now - datetime.timedelta(seconds=float(age_s[i]))
+                finished = ride_status in ("completed", "cancelled")
+                rows.append(
+                    {
+                        "id": ride_id,
+                        "rider_id": rider_ids[riders[i]],
+                        "driver_id": driver_id,
+                        "pickup_location": tuple(pickup[i].tolist()),
+                        "dropoff_location": tuple(dropoff[i].tolist()),
+                        "current_location": None if current is None else tuple(current.tolist()),
+                        "status": ride_status,
+                        "created_at": created_at,
+                        "updated_at": min(
+                            self.now, created_at + datetime.timedelta(seconds=float(duration_s[i]))
+                        ) if finished else created_at,
+                    }
+                )
+            self.load(Ride, rows)
+
+        if busy:
+            for start in range(0, len(busy), self.batch_size):
+                User.objects.filter(id__in=busy[start : start + self.batch_size]).update(
+                    is_available=False
+                )
+        return busy
+
+    def load(self, model, rows):
+        """Load row dicts; points are given as ``(lng, lat)`` tuples."""
+        if self.loader == "bulk":
+            objs = [
+                model(
+                    **{
+                        name: Point(*value, srid=4326) if isinstance(value, tuple) else value
+                        for name, value in row.items()
+                    }
+                )
+                for row in rows
+            ]
+            model.objects.bulk_create(objs, batch_size=5000)
+        else:
+            copy_rows(model, rows)
+
+
+def flush_synthetic():
+    """Delete every synthetic user and their rides. :return: number of users deleted."""
+    suffix = f"@{EMAIL_DOMAIN}"
+    Ride.objects.filter(Q(rider__email__endswith=suffix) | Q(driver__email__endswith=suffix)).delete()
+    deleted, per_model = User.objects.filter(email__endswith=suffix).delete()
+    return per_model.get(User._meta.label, 0)
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, tuple):
+        # (lng, lat); EWKT skips building a GEOS object per point
+        return f"SRID=4326;POINT({value[0]!r} {value[1]!r})"
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(model, rows):
+    """
+    Load ``rows`` (dicts keyed by field attname, points as ``(lng, lat)``)
+    into ``model``'s table with COPY. Fields missing from a row get their
+    default, evaluated once.
+    """
+    fields = model._meta.concrete_fields
+    defaults = {f.attname: f.get_default() for f in fields}
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(
+            "\t".join(_copy_value(row.get(f.attname, defaults[f.attname])) for f in fields)
+        )
+        buffer.write("\n")
+    buffer.seek(0)
+
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+    sql = f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy_expert"):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
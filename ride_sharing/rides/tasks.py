@@ -1,55 +1,152 @@
+import logging
 import random
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
 from django.contrib.gis.geos import Point
+from django.utils import timezone
+from datetime import timedelta
+from .driver_index import WARMUP_LOCK_KEY, warm_driver_index
 from .models import Ride
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from .matching import match_pending_rides
+from .metrics import MATCHING_BATCH_RIDES, MATCHING_OFFERS
+from .location_buffer import flush_location_buffer, get_ride_location, put_ride_location
+from .broadcast import publish_ride_locations
+from .tracking import advance_in_progress_rides, get_tracker_registry
+from .trajectory import (
+    append_points,
+    compact_ride,
+    drop_partitions,
+    ensure_partitions,
+    purge_default_partition,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def start_ride_tracking(ride_id):
+    """Start a tracking chain for a ride; any earlier chain for it goes stale."""
+    generation = get_tracker_registry().start(ride_id)
+    simulate_ride_tracking.delay(ride_id, generation)
+    return generation
 
 
 @shared_task(bind=True)
-def simulate_ride_tracking(self, ride_id):
+def simulate_ride_tracking(self, ride_id, generation=None):
     """
     Simulate tracking a ride by periodically updating its location.
+    The chain exits as soon as a newer chain has been started for the ride.
     """
+    registry = get_tracker_registry()
+    if generation is None or not registry.heartbeat(ride_id, generation):
+        print(f"Stopping stale tracking chain for ride {ride_id}.")
+        return
+
     try:
         # Fetch the ride
-        ride = Ride.objects.get(id=ride_id)
+        ride = Ride.objects.only("status", "current_location").get(id=ride_id)
 
         # Exit if the ride status is no longer 'in_progress'
         if ride.status != "in_progress":
             print(
                 f"Stopping tracking for ride {ride_id} as the status is '{ride.status}'."
             )
+            registry.release(ride_id, generation)
             return
 
-        # Simulate new random coordinates within a range
-        ride.current_location = generate_new_coordinates(ride.current_location)
+        # Simulate new random coordinates within a range, starting from the
+        # freshest (possibly not yet flushed) position
+        ride.current_location = generate_new_coordinates(
+            get_ride_location(ride.id, ride.current_location)
+        )
 
-        # Update the current location
-        ride.save()
+        # Buffer the new location; flush_locations persists it
+        put_ride_location(ride.id, ride.current_location)
+        append_points({ride.id: ride.current_location})
 
         # Notify clients about the location update
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"ride_{ride_id}",
-            {
-                "type": "send_location_update",
-                "location": {
-                    "lat": ride.current_location.y,
-                    "lng": ride.current_location.x,
-                },
-            },
-        )
+        publish_ride_locations({ride_id: ride.current_location})
 
         # Re-trigger this task for periodic updates
-        self.apply_async(args=[ride_id], countdown=30)  # Schedule after 30 seconds
+        self.apply_async(args=[ride_id, generation], countdown=30)  # Schedule after 30 seconds
 
     except Ride.DoesNotExist:
         print(f"Ride with id {ride_id} does not exist. Stopping the task.")
+        registry.release(ride_id, generation)
     except Exception as e:
         print(f"An error occurred while tracking ride {ride_id}: {str(e)}")
 
 
+@shared_task
+def track_rides_tick():
+    """
+    Advance every in-progress ride in one batch.
+    Scheduled every 30 seconds by Celery beat; does nothing
+    when RIDE_TRACKING_BATCHED is off and per-ride chains are used instead.
+    """
+    if not settings.RIDE_TRACKING_BATCHED:
+        return None
+    stats = advance_in_progress_rides()
+    logger.debug("Tracking tick advanced %s rides in %s ms", stats["rides"], stats["duration_ms"])
+    return stats
+
+
+@shared_task
+def flush_locations():
+    """
+    Persist buffered driver and ride positions.
+    Scheduled every few seconds by Celery beat.
+    """
+    return flush_location_buffer()
+
+
+@shared_task
+def assign_pending_rides():
+    """
+    Run one matching window over the pending rides.
+    Scheduled every 2 seconds (the matching window) by Celery beat.
+    """
+    stats = match_pending_rides()
+    MATCHING_BATCH_RIDES.observe(stats["rides"])
+    MATCHING_OFFERS.observe(stats["offers"])
+    return stats
+
+
+@shared_task
+def rebuild_driver_index():
+    """
+    Reload the driver index from the database.
+    Scheduled by Celery beat and queued when a lookup finds the index cold.
+    """
+    try:
+        warm_driver_index()
+    finally:
+        cache.delete(WARMUP_LOCK_KEY)
+
+
+@shared_task
+def compact_ride_trajectory(ride_id):
+    """
+    Fold a completed ride's trajectory points into its simplified route.
+    Queued when the ride is completed.
+    """
+    return compact_ride(ride_id)
+
+
+@shared_task
+def maintain_trajectory_partitions():
+    """
+    Create the upcoming daily trajectory partitions and drop expired ones,
+    including expired rows of the default partition.
+    Scheduled hourly by Celery beat.
+    """
+    created = ensure_partitions()
+    cutoff = timezone.now().date() - timedelta(days=settings.TRAJECTORY_RETENTION_DAYS)
+    dropped = drop_partitions(cutoff)
+    purged = purge_default_partition(cutoff)
+    return {"created": created, "dropped": dropped, "purged": purged}
+
+
 def generate_new_coordinates(current_location):
     """
     Generate a new random Point within a small range.
@@ -58,4 +155,4 @@ def generate_new_coordinates(current_location):
     lng = current_location.x if current_location else 0
     lat += random.uniform(-0.001, 0.001)
     lng += random.uniform(-0.001, 0.001)
-    return Point(lng, lat)
+    return Point(lng, lat, srid=4326)
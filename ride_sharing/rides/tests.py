@@ -1,8 +1,27 @@
+import base64
+import datetime
+import io
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.gis.db.models.functions import Distance
 from django.contrib.gis.geos import Point
-from django.test import TestCase
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.core.management import CommandError, call_command
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
 from rides.models import Ride, User
 from rest_framework.authtoken.models import Token
 
@@ -105,6 +124,68 @@ class RideAPITestCase(APITestCase):
         self.assertEqual(response.data["status"], "requested")
 
 from rides.consumer import RideTrackingConsumer
+from rides.driver_index import GridDriverIndex, RedisGeoDriverIndex, get_driver_index, warm_driver_index
+from rides.utils import get_nearby_drivers
+from rides.geo import bearing, eta_seconds, haversine, haversine_matrix, pack_points
+from rides.matching import greedy_assignment, match_pending_rides, solve_assignment
+from rides.transitions import TransitionConflict, TransitionForbidden, accept_ride
+from rides.location_buffer import (
+    InMemoryLocationBuffer,
+    RedisLocationBuffer,
+    flush_location_buffer,
+    put_ride_location,
+)
+from rides.tracking import TrackerRegistry, advance_in_progress_rides
+from rides.tasks import simulate_ride_tracking
+from rides.frames import SUBPROTOCOL as FRAME_SUBPROTOCOL, FrameEncoder, decode_frame
+from rides.broadcast import apublish_ride_locations
+from rides.routing import websocket_urlpatterns
+from rides.position_cache import RideSnapshot
+from rides.ingest import InvalidPing, PingBatcher, parse_ping
+from rides.models import RideLocationPoint
+from rides.serializers import RideListSerializer, RideSerializer
+from rides.tokens import RideRefreshToken
+from rides import fastjson, position_cache
+from django.urls import URLResolver
+from rides import urls as ride_urls
+from rides.query_budget import QueryBudgetExceeded, QueryBudgetTestMixin, get_budget
+from celery.app.task import Context
+from rides.metrics import (
+    SENT_AT_HEADER,
+    Counter,
+    Histogram,
+    Registry,
+    _before_task_publish,
+    merge_snapshots,
+    render,
+    task_lag,
+)
+from rides.benchmarks import compare_results, run_suite
+from rides.synthetic import SyntheticLoader, flush_synthetic, hotspot_points, parse_status_mix
+from rides.fleet import FleetImporter, RejectedRow, clean_row, read_rows
+from rides.renderers import FastJSONParser, FastJSONRenderer
+from rides.authentication import (
+    RidePrincipal,
+    StatelessJWTAuthentication,
+    _cached_active,
+    _remember_active,
+    forget_user,
+)
+from rides.middleware import JWTQueryStringAuthMiddleware
+from rides.aio import cache_get_many
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rides.consumer import user_flag
+from rest_framework_simplejwt.models import TokenUser
+from rides.trajectory import (
+    append_points,
+    compact_ride,
+    decode_polyline,
+    encode_polyline,
+    purge_default_partition,
+)
+from channels.routing import URLRouter
+from asgiref.sync import async_to_sync
+import numpy as np
 from ride_sharing.asgi import application  # Import your Django Channels application
 from channels.layers import get_channel_layer
 
@@ -132,11 +213,13 @@ class RideRequestAndLocationTestCase(APITestCase):
         self.client = APIClient()
         self.client.force_authenticate(user=self.user)
         self.ride_id = self.ride.id  # Example UUID
+        get_driver_index().clear()
 
     async def test_realtime_location_update(self):
         # Create a WebSocket communicator
+        token = RefreshToken.for_user(self.user).access_token
         communicator = WebsocketCommunicator(
-            application, f"/ws/ride-tracking/{self.ride_id}/"
+            application, f"/ws/ride-tracking/{self.ride_id}/?token={token}"
         )
         connected, subprotocol = await communicator.connect()
         self.assertTrue(connected)
@@ -162,6 +245,35 @@ class RideRequestAndLocationTestCase(APITestCase):
         # Close the WebSocket
         await communicator.disconnect()
 
+    async def test_tracking_socket_rejects_non_members(self):
+        stranger = await User.objects.acreate(email="stranger@example.com")
+        token = RefreshToken.for_user(stranger).access_token
+        communicator = WebsocketCommunicator(
+            application, f"/ws/ride-tracking/{self.ride_id}/?token={token}"
+        )
+        connected, close_code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(close_code, 4403)
+
+        anonymous = WebsocketCommunicator(application, f"/ws/ride-tracking/{self.ride_id}/")
+        connected, close_code = await anonymous.connect()
+        self.assertFalse(connected)
+        self.assertEqual(close_code, 4401)
+
+    async def test_tracking_socket_pushes_latest_position_on_connect(self):
+        self.ride.current_location = Point(77.594566, 12.971598, srid=4326)
+        await self.ride.asave(update_fields=["current_location"])
+        token = RefreshToken.for_user(self.user).access_token
+        communicator = WebsocketCommunicator(
+            application, f"/ws/ride-tracking/{self.ride_id}/?token={token}"
+        )
+        with mock.patch("rides.location_buffer._buffer", InMemoryLocationBuffer()):
+            connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {"lat": 12.971598, "lng": 77.594566})
+        await communicator.disconnect()
+
     def test_fetch_available_drivers_on_ride_request(self):
         # API test for ride request and driver assignment
         url = reverse("ride-request")
@@ -173,3 +285,1246 @@ class RideRequestAndLocationTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertIn("ride_id", response.data)
         self.assertIn("nearest_drivers", response.data)
+
+
+class GridDriverIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        self.index = GridDriverIndex(cell_size=0.01)
+        self.index.rebuild(
+            [
+                ("near", Point(77.5950, 12.9720)),
+                ("mid", Point(77.6100, 12.9800)),
+                ("far", Point(77.9000, 13.2000)),
+            ]
+        )
+
+    def test_nearest_orders_by_distance(self):
+        drivers = self.index.nearest(Point(77.5946, 12.9716), k=2)
+        self.assertEqual([d.id for d in drivers], ["near", "mid"])
+        self.assertLess(drivers[0].distance.m, drivers[1].distance.m)
+
+    def test_max_distance_filters_results(self):
+        drivers = self.index.nearest(Point(77.5946, 12.9716), k=5, max_distance=5000)
+        self.assertEqual([d.id for d in drivers], ["near", "mid"])
+
+    def test_update_and_remove(self):
+        self.index.update("far", Point(77.5947, 12.9717))
+        self.index.remove("near")
+        drivers = self.index.nearest(Point(77.5946, 12.9716), k=1)
+        self.assertEqual(drivers[0].id, "far")
+        self.assertEqual(len(self.index), 2)
+
+    def test_cold_until_rebuilt(self):
+        self.assertFalse(GridDriverIndex().is_warm())
+        self.assertTrue(self.index.is_warm())
+
+    def test_goes_cold_after_max_age(self):
+        index = GridDriverIndex(max_age=60)
+        index.rebuild([("near", Point(77.5950, 12.9720))])
+        self.assertTrue(index.is_warm())
+        with mock.patch("rides.driver_index.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertFalse(index.is_warm())
+
+    def test_applies_changes_from_other_processes(self):
+        driver_id = uuid.uuid4()
+        self.index._apply({"origin": "other", "op": "update", "id": str(driver_id), "lng": 77.5946, "lat": 12.9716})
+        self.assertEqual(self.index.nearest(Point(77.5946, 12.9716), k=1)[0].id, driver_id)
+        self.index._apply({"origin": "other", "op": "remove", "id": str(driver_id)})
+        self.assertEqual(len(self.index), 3)
+        self.index._apply({"origin": "other", "op": "invalidate"})
+        self.assertFalse(self.index.is_warm())
+
+
+
+@skipUnless(getattr(settings, "TEST_REDIS_URL", None), "TEST_REDIS_URL is not set")
+class RedisBackendsTestCase(SimpleTestCase):
+    """The Redis backends, against TEST_REDIS_URL and under TEST_REDIS_PREFIX only."""
+
+    def setUp(self):
+        import redis
+
+        self.url = settings.TEST_REDIS_URL
+        self.prefix = settings.TEST_REDIS_PREFIX
+        self.client = redis.Redis.from_url(self.url)
+        self.addCleanup(self.client.close)
+        self.addCleanup(self.flush)
+        self.flush()
+
+    def flush(self):
+        keys = list(self.client.scan_iter(f"{self.prefix}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def test_geo_driver_index(self):
+        index = RedisGeoDriverIndex(url=self.url, key=f"{self.prefix}:drivers:available", ttl=60)
+        close, far = uuid.uuid4(), uuid.uuid4()
+        index.rebuild([(close, Point(77.5990, 12.9716)), (far, Point(77.6220, 12.9716))])
+        self.assertTrue(index.is_warm())
+        pickup = Point(77.5946, 12.9716, srid=4326)
+        self.assertEqual([d.id for d in index.nearest(pickup, k=2)], [close, far])
+        self.assertEqual([d.id for d in index.nearest(pickup, max_distance=1000)], [close])
+
+        index.move(uuid.uuid4(), pickup)
+        index.remove(close)
+        self.assertEqual(len(index), 1)
+        index.invalidate()
+        self.assertFalse(index.is_warm())
+
+    def test_location_buffer(self):
+        buffer = RedisLocationBuffer(url=self.url, prefix=f"{self.prefix}:loc", ttl=60)
+        ride_id = str(uuid.uuid4())
+        buffer.put_many("ride", {ride_id: (77.5946, 12.9716)})
+        self.assertEqual(buffer.get_many("ride", [ride_id])[ride_id].coords, (77.5946, 12.9716))
+        self.assertEqual(buffer.drain("ride"), {ride_id: (77.5946, 12.9716)})
+        self.assertEqual(buffer.drain("ride"), {})
+
+    def test_tracker_registry(self):
+        registry = TrackerRegistry(url=self.url, prefix=f"{self.prefix}:tracker", lease_seconds=60)
+        ride_id = uuid.uuid4()
+        generation = registry.start(ride_id)
+        self.assertTrue(registry.heartbeat(ride_id, generation))
+        self.assertEqual(registry.active_count(), 1)
+        registry.stop(ride_id)
+        self.assertFalse(registry.heartbeat(ride_id, generation))
+        self.assertEqual(registry.active_count(), 0)
+
+class NearbyDriversTestCase(TestCase):
+    def setUp(self):
+        get_driver_index().clear()
+        self.pickup = Point(77.5946, 12.9716, srid=4326)
+        for email, location in [
+            ("close@example.com", Point(77.5990, 12.9716, srid=4326)),  # ~0.5 km
+            ("town@example.com", Point(77.6220, 12.9716, srid=4326)),  # ~3 km
+            ("away@example.com", Point(78.0500, 12.9716, srid=4326)),  # ~50 km
+        ]:
+            User.objects.create_user(
+                email=email,
+                password="driverpassword",
+                is_driver=True,
+                is_available=True,
+                current_location=location,
+            )
+
+    def test_max_distance_is_honoured(self):
+        drivers = get_nearby_drivers(self.pickup, max_distance=5000)
+        self.assertEqual(len(drivers), 2)
+        self.assertTrue(all(driver.distance.m <= 5000 for driver in drivers))
+
+    def test_cold_lookup_requests_warmup_instead_of_loading_inline(self):
+        with mock.patch("rides.utils.request_warmup") as warmup:
+            get_nearby_drivers(self.pickup, max_distance=20000)
+        warmup.assert_called_once_with()
+        self.assertFalse(get_driver_index().is_warm())
+
+    def test_index_and_postgis_agree(self):
+        with mock.patch("rides.utils.request_warmup"):
+            cold = get_nearby_drivers(self.pickup, max_distance=20000)
+        warm_driver_index()
+        self.assertTrue(get_driver_index().is_warm())
+        warm = get_nearby_drivers(self.pickup, max_distance=20000)
+        self.assertEqual([d.id for d in cold], [d.id for d in warm])
+        for a, b in zip(cold, warm):
+            self.assertAlmostEqual(a.distance.m, b.distance.m, delta=5)
+
+
+class AssignmentTestCase(SimpleTestCase):
+    def setUp(self):
+        # Two riders, three drivers; driver 0 is closest to both riders.
+        self.riders = np.array([[77.5946, 12.9716], [77.6000, 12.9716]])
+        self.drivers = np.array([[77.5970, 12.9716], [77.5900, 12.9716], [77.6100, 12.9716]])
+        self.cost = haversine_matrix(self.riders, self.drivers)
+
+    def test_haversine_matrix_shape_and_scale(self):
+        self.assertEqual(self.cost.shape, (2, 3))
+        self.assertAlmostEqual(self.cost[0, 0], 260, delta=5)
+
+    def test_each_driver_is_offered_at_most_once(self):
+        rows, cols = solve_assignment(self.cost)
+        self.assertEqual(sorted(rows.tolist()), [0, 1])
+        self.assertEqual(len(set(cols.tolist())), 2)
+
+    def test_exact_solver_minimises_total_distance(self):
+        rows, cols = solve_assignment(self.cost)
+        g_rows, g_cols = greedy_assignment(self.cost)
+        self.assertLessEqual(self.cost[rows, cols].sum(), self.cost[g_rows, g_cols].sum() + 1e-6)
+
+    def test_pairs_beyond_max_cost_are_dropped(self):
+        rows, cols = solve_assignment(self.cost, max_cost=300)
+        self.assertEqual(len(rows), 1)
+        self.assertTrue((self.cost[rows, cols] <= 300).all())
+
+    def test_greedy_fallback_above_exact_limit(self):
+        rows, cols = solve_assignment(self.cost, exact_limit=1)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(len(set(cols.tolist())), 2)
+
+
+class MatchPendingRidesTestCase(TestCase):
+    def test_pending_rides_get_distinct_drivers(self):
+        rider = User.objects.create_user(email="rider@example.com", password="riderpassword")
+        for email, lng in [("d1@example.com", 77.5950), ("d2@example.com", 77.6010)]:
+            User.objects.create_user(
+                email=email,
+                password="driverpassword",
+                is_driver=True,
+                is_available=True,
+                current_location=Point(lng, 12.9716, srid=4326),
+            )
+        for lng in (77.5946, 77.6000):
+            Ride.objects.create(
+                rider=rider,
+                pickup_location=Point(lng, 12.9716, srid=4326),
+                dropoff_location=Point(77.6500, 13.0000, srid=4326),
+            )
+
+        result = match_pending_rides()
+
+        self.assertEqual(result["offers"], 2)
+        driver_ids = list(Ride.objects.values_list("offered_driver_id", flat=True))
+        self.assertEqual(len(set(driver_ids)), 2)
+        self.assertTrue(Ride.objects.filter(status="requested").count() == 2)
+        # An offer is not an assignment
+        self.assertFalse(Ride.objects.filter(driver__isnull=False).exists())
+
+
+class GeoKernelTestCase(SimpleTestCase):
+    def test_haversine_known_distance(self):
+        # London -> Paris is about 343.5 km on a spherical earth
+        distance = haversine((-0.1278, 51.5074), (2.3522, 48.8566))
+        self.assertAlmostEqual(float(distance) / 1000, 343.5, delta=0.5)
+
+    def test_matrix_matches_elementwise(self):
+        rng = np.random.default_rng(0)
+        origins = rng.normal((77.59, 12.97), 0.5, (20, 2))
+        destinations = rng.normal((77.59, 12.97), 0.5, (30, 2))
+        matrix = haversine_matrix(origins, destinations)
+        pairwise = haversine(origins[:, None, :], destinations[None, :, :])
+        np.testing.assert_allclose(matrix, pairwise, rtol=1e-9, atol=1e-6)
+
+    def test_bearing_cardinal_directions(self):
+        origin = (77.59, 12.97)
+        self.assertAlmostEqual(float(bearing(origin, (77.59, 13.97))), 0.0, places=6)
+        self.assertAlmostEqual(float(bearing(origin, (78.59, 12.97))), 90.0, delta=0.2)
+
+    def test_eta_and_packing(self):
+        packed = pack_points([Point(1.0, 2.0), (3.0, 4.0)])
+        self.assertEqual(packed.shape, (2, 2))
+        self.assertAlmostEqual(float(eta_seconds(1000, speed_kmh=36)), 100.0)
+
+
+class GeoAgainstPostGISTestCase(TestCase):
+    def test_haversine_within_half_percent_of_postgis(self):
+        origin = Point(77.5946, 12.9716, srid=4326)
+        rng = np.random.default_rng(1)
+        coords = rng.normal((77.59, 12.97), 0.3, (25, 2))
+        for i, (lng, lat) in enumerate(coords.tolist()):
+            User.objects.create_user(
+                email=f"geo{i}@example.com",
+                password="driverpassword",
+                is_driver=True,
+                current_location=Point(lng, lat, srid=4326),
+            )
+        rows = User.objects.filter(is_driver=True).annotate(
+            distance=Distance("current_location", origin)
+        )
+        postgis = np.array([row.distance.m for row in rows])
+        ours = haversine((origin.x, origin.y), pack_points(row.current_location for row in rows))
+        np.testing.assert_allclose(ours, postgis, rtol=0.005)
+
+
+class RideStatusTransitionTestCase(APITestCase):
+    def setUp(self):
+        self.rider = User.objects.create_user(email="rider@example.com", password="riderpassword")
+        self.ride = Ride.objects.create(
+            rider=self.rider,
+            pickup_location=Point(77.5946, 12.9716, srid=4326),
+            dropoff_location=Point(77.6500, 13.0000, srid=4326),
+        )
+        self.url = reverse("ride-status-update", args=[self.ride.id])
+
+    def make_driver(self, email):
+        return User.objects.create_user(
+            email=email, password="driverpassword", is_driver=True, is_available=True
+        )
+
+    def test_second_accept_is_a_conflict(self):
+        first, second = self.make_driver("d1@example.com"), self.make_driver("d2@example.com")
+        self.client.force_authenticate(user=first)
+        response = self.client.patch(self.url, {"status": "in_progress"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=second)
+        response = self.client.patch(self.url, {"status": "in_progress"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        second.refresh_from_db()
+        self.assertTrue(second.is_available)
+
+    def test_rider_can_cancel_an_offered_ride(self):
+        driver = self.make_driver("d1@example.com")
+        Ride.objects.filter(id=self.ride.id).update(offered_driver=driver, offered_at=timezone.now())
+        self.assertFalse(position_cache.get_snapshot(self.ride.id).can_view(driver.id))
+
+        self.client.force_authenticate(user=self.rider)
+        response = self.client.patch(self.url, {"status": "cancelled"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.ride.refresh_from_db()
+        self.assertIsNone(self.ride.offered_driver_id)
+
+    def test_offered_ride_can_only_be_accepted_by_its_driver(self):
+        offered, other = self.make_driver("d1@example.com"), self.make_driver("d2@example.com")
+        Ride.objects.filter(id=self.ride.id).update(offered_driver=offered, offered_at=timezone.now())
+        with self.assertRaises(TransitionForbidden):
+            accept_ride(self.ride.id, other)
+        accept_ride(self.ride.id, offered)
+        self.ride.refresh_from_db()
+        self.assertEqual(self.ride.driver_id, offered.id)
+        self.assertIsNone(self.ride.offered_driver_id)
+
+    def test_complete_releases_driver(self):
+        driver = self.make_driver("d1@example.com")
+        accept_ride(self.ride.id, driver)
+        self.client.force_authenticate(user=driver)
+        response = self.client.patch(self.url, {"status": "completed"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        driver.refresh_from_db()
+        self.ride.refresh_from_db()
+        self.assertEqual(self.ride.status, "completed")
+        self.assertTrue(driver.is_available)
+
+
+class ConcurrentAcceptTestCase(TransactionTestCase):
+    attempts = 200
+
+    def test_exactly_one_parallel_accept_wins(self):
+        rider = User.objects.create_user(email="rider@example.com", password="riderpassword")
+        ride = Ride.objects.create(
+            rider=rider,
+            pickup_location=Point(77.5946, 12.9716, srid=4326),
+            dropoff_location=Point(77.6500, 13.0000, srid=4326),
+        )
+        drivers = User.objects.bulk_create(
+            [
+                User(email=f"driver{i}@example.com", is_driver=True, is_available=True)
+                for i in range(self.attempts)
+            ]
+        )
+        barrier = threading.Barrier(16)
+
+        def attempt(driver):
+            try:
+                try:
+                    barrier.wait(timeout=1)
+                except threading.BrokenBarrierError:
+                    pass
+                accept_ride(ride.id, driver)
+                return driver.id
+            except TransitionConflict:
+                return None
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            winners = [w for w in pool.map(attempt, drivers) if w is not None]
+
+        self.assertEqual(len(winners), 1)
+        ride.refresh_from_db()
+        self.assertEqual(ride.status, "in_progress")
+        self.assertEqual(ride.driver_id, winners[0])
+        self.assertEqual(User.objects.filter(is_driver=True, is_available=False).count(), 1)
+
+
+class InMemoryLocationBufferTestCase(SimpleTestCase):
+    def test_updates_coalesce_until_drained(self):
+        buffer = InMemoryLocationBuffer()
+        buffer.put_many("ride", {"r1": (77.59, 12.97)})
+        buffer.put_many("ride", {"r1": (77.60, 12.98), "r2": (77.61, 12.99)})
+        self.assertEqual(buffer.get_many("ride", ["r1"])["r1"].coords, (77.60, 12.98))
+        self.assertEqual(buffer.drain("ride"), {"r1": (77.60, 12.98), "r2": (77.61, 12.99)})
+        self.assertEqual(buffer.drain("ride"), {})
+        # Readers still see the latest position after a flush
+        self.assertIn("r2", buffer.get_many("ride", ["r2"]))
+
+
+class FlushLocationBufferTestCase(TestCase):
+    def test_flush_persists_latest_position_only(self):
+        rider = User.objects.create_user(email="rider@example.com", password="riderpassword")
+        ride = Ride.objects.create(
+            rider=rider,
+            pickup_location=Point(77.5946, 12.9716, srid=4326),
+            dropoff_location=Point(77.6500, 13.0000, srid=4326),
+        )
+        updated_at = ride.updated_at
+        with mock.patch("rides.location_buffer._buffer", InMemoryLocationBuffer()):
+            put_ride_location(ride.id, Point(77.6000, 12.9800, srid=4326))
+            put_ride_location(ride.id, Point(77.6100, 12.9900, srid=4326))
+            self.assertEqual(flush_location_buffer(), {"ride": 1, "driver": 0})
+        ride.refresh_from_db()
+        self.assertEqual(ride.current_location.coords, (77.6100, 12.9900))
+        self.assertEqual(ride.updated_at, updated_at)
+
+
+class RideLocationCacheTestCase(APITestCase):
+    def setUp(self):
+        self.rider = User.objects.create_user(email="rider@example.com", password="riderpassword")
+        self.ride = Ride.objects.create(
+            rider=self.rider,
+            pickup_location=Point(77.5946, 12.9716, srid=4326),
+            dropoff_location=Point(77.6500, 13.0000, srid=4326),
+            current_location=Point(77.5946, 12.9716, srid=4326),
+        )
+        self.url = reverse("ride-location", args=[self.ride.id])
+        self.client.force_authenticate(user=self.rider)
+
+    def test_warm_cache_answers_without_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("ETag", response)
+
+    def test_not_modified_until_position_moves(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        put_ride_location(self.ride.id, Point(77.6000, 12.9800, srid=4326))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_strangers_are_refused(self):
+        stranger = User.objects.create_user(email="other@example.com", password="otherpassword")
+        self.client.force_authenticate(user=stranger)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class TrackingTickTestCase(TestCase):
+    def test_tick_advances_all_in_progress_rides_in_one_pass(self):
+        rider = User.objects.create_user(email="rider@example.com", password="riderpassword")
+        start = Point(77.5946, 12.9716, srid=4326)
+        rides = [
+            Ride.objects.create(
+                rider=rider,
+                pickup_location=start,
+                dropoff_location=start,
+                current_location=start,
+                status=ride_status,
+            )
+            for ride_status in ("in_progress", "in_progress", "in_progress", "requested")
+        ]
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"ride_{rides[0].id}", channel_name)
+
+        with mock.patch("rides.location_buffer._buffer", InMemoryLocationBuffer()):
+            # one SELECT, one bulk UPDATE and one trajectory INSERT
+            with self.assertNumQueries(3):
+                stats = advance_in_progress_rides()
+
+        self.assertEqual(stats["rides"], 3)
+        self.assertIn("duration_ms", stats)
+        moved = Ride.objects.filter(status="in_progress").exclude(current_location=start)
+        self.assertEqual(moved.count(), 3)
+        message = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(message["type"], "send_location_update")
+
+
+class TrackingChainRegistryTestCase(SimpleTestCase):
+    def test_stale_chain_exits_without_touching_the_ride(self):
+        registry = mock.Mock()
+        registry.heartbeat.return_value = False
+        with mock.patch("rides.tasks.get_tracker_registry", return_value=registry), \
+                mock.patch.object(simulate_ride_tracking, "apply_async") as reschedule:
+            simulate_ride_tracking("ride-id", 1)
+
+        registry.heartbeat.assert_called_once_with("ride-id", 1)
+        reschedule.assert_not_called()
+
+    def test_chain_without_generation_is_stale(self):
+        registry = mock.Mock()
+        with mock.patch("rides.tasks.get_tracker_registry", return_value=registry), \
+                mock.patch.object(simulate_ride_tracking, "apply_async") as reschedule:
+            simulate_ride_tracking("ride-id")
+
+        registry.heartbeat.assert_not_called()
+        reschedule.assert_not_called()
+
+    def test_generation_keys_expire_and_are_released(self):
+        with mock.patch("redis.Redis.from_url") as from_url:
+            registry = TrackerRegistry(lease_seconds=90)
+        client = from_url.return_value
+        pipe = client.pipeline.return_value
+        pipe.execute.return_value = [3, True, 1]
+
+        self.assertEqual(registry.start("ride-id"), 3)
+        pipe.expire.assert_called_with("tracker:ride-id:generation", 90)
+
+        client.get.return_value = b"3"
+        self.assertTrue(registry.heartbeat("ride-id", 3))
+        self.assertEqual(pipe.expire.call_count, 2)
+
+        registry.release("ride-id", 3)
+        client.register_script.return_value.assert_called_once_with(
+            keys=["tracker:ride-id:generation", "tracker:active"], args=[3, "ride-id"]
+        )
+
+
+class FrameEncodingTestCase(SimpleTestCase):
+    def test_keyframe_then_delta_round_trip(self):
+        encoder = FrameEncoder()
+        first = encoder.encode("ride", 12.971598, 77.594566)
+        second = encoder.encode("ride", 12.971698, 77.594466)
+
+        self.assertIsNone(first["delta"])
+        self.assertEqual(second["prev_seq"], first["seq"])
+        self.assertEqual(len(first["keyframe"]), 13)
+        self.assertEqual(len(second["delta"]), 9)
+        previous = decode_frame(first["keyframe"])
+        seq, lat, lng = decode_frame(second["delta"], previous)
+        self.assertEqual(seq, second["seq"])
+        self.assertAlmostEqual(lat, 12.971698, places=6)
+        self.assertAlmostEqual(lng, 77.594466, places=6)
+
+    def test_large_jump_has_no_delta(self):
+        encoder = FrameEncoder()
+        encoder.encode("ride", 12.0, 77.0)
+        frames = encoder.encode("ride", 13.0, 77.0)
+        self.assertIsNone(frames["delta"])
+        self.assertIsNone(frames["prev_seq"])
+
+
+def with_scope_user(app, user):
+    async def wrapped(scope, receive, send):
+        return await app(dict(scope, user=user), receive, send)
+
+    return wrapped
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class BinaryTrackingSocketTestCase(SimpleTestCase):
+    rider_id = "5b1f3c2e-0000-4000-8000-0000000000aa"
+
+    def setUp(self):
+        async def snapshot(ride_id):
+            members = {"rider_id": self.rider_id, "driver_id": None, "status": "in_progress"}
+            return RideSnapshot(ride_id, members, {"location": None, "ts": 0})
+
+        patcher = mock.patch("rides.position_cache.aget_snapshot", snapshot)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.app = with_scope_user(
+            URLRouter(websocket_urlpatterns),
+            mock.Mock(id=self.rider_id, is_authenticated=True),
+        )
+
+    async def test_binary_subscriber_gets_keyframe_then_deltas(self):
+        communicator = WebsocketCommunicator(
+            self.app,
+            "/ws/ride-tracking/5b1f3c2e-0000-4000-8000-000000000001/",
+            subprotocols=[FRAME_SUBPROTOCOL],
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, FRAME_SUBPROTOCOL)
+
+        ride_id = "5b1f3c2e-0000-4000-8000-000000000001"
+        await apublish_ride_locations({ride_id: Point(77.594566, 12.971598, srid=4326)})
+        keyframe = await communicator.receive_from()
+        await apublish_ride_locations({ride_id: Point(77.594576, 12.971608, srid=4326)})
+        delta = await communicator.receive_from()
+
+        self.assertEqual(len(keyframe), 13)
+        self.assertEqual(len(delta), 9)
+        _, lat, lng = decode_frame(delta, decode_frame(keyframe))
+        self.assertAlmostEqual(lat, 12.971608, places=6)
+        self.assertAlmostEqual(lng, 77.594576, places=6)
+        await communicator.disconnect()
+
+    async def test_json_subscriber_is_unchanged(self):
+        ride_id = "5b1f3c2e-0000-4000-8000-000000000002"
+        communicator = WebsocketCommunicator(self.app, f"/ws/ride-tracking/{ride_id}/")
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertIsNone(subprotocol)
+
+        await apublish_ride_locations({ride_id: Point(77.594566, 12.971598, srid=4326)})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {"lat": 12.971598, "lng": 77.594566})
+        await communicator.disconnect()
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    DISPATCH_FLUSH_INTERVAL=0.05,
+)
+class DispatchSocketTestCase(SimpleTestCase):
+    def connect(self, is_staff=True):
+        user = mock.Mock(id=1, is_authenticated=True, is_staff=is_staff)
+        app = with_scope_user(URLRouter(websocket_urlpatterns), user)
+        return WebsocketCommunicator(app, "/ws/dispatch/")
+
+    async def test_updates_are_filtered_and_batched(self):
+        communicator = self.connect()
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.send_json_to({"action": "subscribe", "rides": ["a"]})
+        await communicator.receive_json_from()
+        await communicator.send_json_to({"action": "bbox", "bbox": [77.0, 12.0, 78.0, 13.0]})
+        await communicator.receive_json_from()
+
+        await apublish_ride_locations(
+            {
+                "a": Point(10.0, 10.0, srid=4326),  # subscribed by id
+                "b": Point(77.5, 12.5, srid=4326),  # inside the bbox
+                "c": Point(10.0, 10.0, srid=4326),  # neither
+            }
+        )
+        await apublish_ride_locations({"b": Point(77.6, 12.6, srid=4326)})
+
+        # Both publishes usually share one frame; merge in case they did not
+        seen = {}
+        while seen.get("b") != [12.6, 77.6]:
+            frame = await communicator.receive_json_from(timeout=1)
+            self.assertEqual(frame["type"], "positions")
+            seen.update(frame["rides"])
+        self.assertEqual(seen, {"a": [10.0, 10.0], "b": [12.6, 77.6]})
+        await communicator.disconnect()
+
+    async def test_non_staff_is_rejected(self):
+        connected, close_code = await self.connect(is_staff=False).connect()
+        self.assertFalse(connected)
+        self.assertEqual(close_code, 4403)
+
+
+class PingBatcherTestCase(SimpleTestCase):
+    def test_rate_limit_and_coalescing(self):
+        flushed = []
+
+        async def record(positions):
+            flushed.append(positions)
+
+        batcher = PingBatcher(min_interval=1.0, flush_interval=1.0, flush=record)
+        self.assertTrue(batcher.offer("d1", 77.0, 12.0, now=10.0))
+        self.assertFalse(batcher.offer("d1", 77.1, 12.1, now=10.5))
+        self.assertTrue(batcher.offer("d1", 77.2, 12.2, now=11.0))
+        self.assertTrue(batcher.offer("d2", 78.0, 13.0, now=11.0))
+
+        self.assertEqual(async_to_sync(batcher.flush)(), 2)
+        self.assertEqual(flushed, [{"d1": (77.2, 12.2), "d2": (78.0, 13.0)}])
+        self.assertEqual((batcher.accepted, batcher.dropped), (3, 1))
+
+    def test_parse_ping_validation(self):
+        self.assertEqual(parse_ping({"lat": 12.5, "lng": 77}), (77.0, 12.5))
+        for bad in ({"lat": 91, "lng": 0}, {"lat": "1", "lng": 0}, {"lat": True, "lng": 0},
+                    {"lat": float("nan"), "lng": 0}, [12, 77]):
+            with self.assertRaises(InvalidPing):
+                parse_ping(bad)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class DriverLocationSocketTestCase(SimpleTestCase):
+    def connect(self, is_driver=True):
+        user = mock.Mock(id="driver-1", is_authenticated=True, is_driver=is_driver)
+        app = with_scope_user(URLRouter(websocket_urlpatterns), user)
+        return WebsocketCommunicator(app, "/ws/driver/location/")
+
+    async def test_pings_are_validated_and_batched(self):
+        batcher = PingBatcher(min_interval=0, flush_interval=60)
+        with mock.patch("rides.ingest._batcher", batcher):
+            communicator = self.connect()
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_to(text_data='{"lat": 200, "lng": 0}')
+            self.assertIn("error", await communicator.receive_json_from())
+            await communicator.send_json_to({"lat": 12.97, "lng": 77.59})
+            await communicator.send_json_to({"lat": 12.98, "lng": 77.60})
+            await communicator.disconnect()
+
+        self.assertEqual(batcher.accepted, 2)
+        self.assertEqual(batcher._pending, {"driver-1": (77.60, 12.98)})
+
+    async def test_frame_without_data_gets_an_error(self):
+        batcher = PingBatcher(min_interval=0, flush_interval=60)
+        with mock.patch("rides.ingest._batcher", batcher):
+            communicator = self.connect()
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_input({"type": "websocket.receive"})
+            self.assertIn("error", await communicator.receive_json_from())
+            # The socket stays usable
+            await communicator.send_json_to({"lat": 12.97, "lng": 77.59})
+            await communicator.disconnect()
+        self.assertEqual(batcher.accepted, 1)
+
+    async def test_riders_are_rejected(self):
+        connected, close_code = await self.connect(is_driver=False).connect()
+        self.assertFalse(connected)
+        self.assertEqual(close_code, 4403)
+
+
+class PolylineTestCase(SimpleTestCase):
+    def test_matches_reference_encoding(self):
+        coords = [(-120.2, 38.5), (-120.95, 40.7), (-126.453, 43.252)]
+        encoded = encode_polyline(coords)
+        self.assertEqual(encoded, "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+        self.assertEqual(decode_polyline(encoded), coords)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    TRAJECTORY_MAX_DEVIATION_M=10,
+    TRAJECTORY_MAX_GAP_SECONDS=60,
+)
+class RideTrajectoryTestCase(APITestCase):
+    def setUp(self):
+        self.rider = User.objects.create_user(email="rider@example.com", password="riderpassword")
+        start = Point(77.5946, 12.9716, srid=4326)
+        self.ride = Ride.objects.create(
+            rider=self.rider, pickup_location=start, dropoff_location=start, status="in_progress"
+        )
+        self.client.force_authenticate(user=self.rider)
+
+    def drive(self, steps, start=0):
+        # Straight east at ~11 m/s, one position per second
+        for t in range(start, start + steps):
+            append_points({self.ride.id: Point(77.5946 + 0.0001 * t, 12.9716, srid=4326)}, 1000.0 + t)
+
+    def test_predictable_points_are_dropped(self):
+        self.drive(10)
+        # The first point, then the one that establishes the velocity
+        self.assertEqual(RideLocationPoint.objects.filter(ride=self.ride).count(), 2)
+
+        # A sharp turn is stored
+        append_points({self.ride.id: Point(77.5956, 12.9736, srid=4326)}, 1010.0)
+        self.assertEqual(RideLocationPoint.objects.filter(ride=self.ride).count(), 3)
+
+    def test_retention_purges_the_default_partition(self):
+        # Points from 1970 have no daily partition of their own
+        self.drive(3)
+        stored = RideLocationPoint.objects.filter(ride=self.ride).count()
+        self.assertEqual(purge_default_partition(datetime.date(1970, 1, 1)), 0)
+        self.assertEqual(purge_default_partition(datetime.date(1971, 1, 1)), stored)
+        self.assertFalse(RideLocationPoint.objects.filter(ride=self.ride).exists())
+
+    def test_trajectory_is_paginated_then_compacted(self):
+        for t in range(5):
+            # Alternate north/south so every point deviates from the prediction
+            append_points(
+                {self.ride.id: Point(77.5946 + 0.001 * t, 12.9716 + 0.001 * (t % 2), srid=4326)},
+                1000.0 + t,
+            )
+        url = reverse("ride-trajectory", args=[self.ride.id])
+
+        first = self.client.get(url, {"limit": 3})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first.data["points"]), 3)
+        second = self.client.get(url, {"limit": 3, "cursor": first.data["next"]})
+        self.assertEqual(len(second.data["points"]), 2)
+        self.assertIsNone(second.data["next"])
+
+        Ride.objects.filter(id=self.ride.id).update(status="completed")
+        self.assertEqual(compact_ride(self.ride.id), 5)
+        self.assertFalse(RideLocationPoint.objects.filter(ride=self.ride).exists())
+        compacted = self.client.get(url)
+        self.assertEqual(len(decode_polyline(compacted.data["polyline"])), 5)
+
+
+class RideListTestCase(APITestCase):
+    def setUp(self):
+        forget_user()
+        self.rider = User.objects.create_user(email="rider@example.com", password="riderpassword")
+        point = Point(77.5946, 12.9716, srid=4326)
+        Ride.objects.bulk_create(
+            [Ride(rider=self.rider, pickup_location=point, dropoff_location=point) for _ in range(25)]
+        )
+        self.client.force_authenticate(user=self.rider)
+        self.url = "/api/rides/"
+
+    def test_list_is_cursor_paginated_without_geometry(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first.data["results"]), 20)
+        self.assertEqual(set(first.data["results"][0]), set(RideListSerializer.DEFAULT_FIELDS))
+
+        second = self.client.get(first.data["next"])
+        self.assertEqual(len(second.data["results"]), 5)
+        ids = {r["id"] for r in first.data["results"]} | {r["id"] for r in second.data["results"]}
+        self.assertEqual(len(ids), 25)
+
+    def test_cursor_pages_through_rides_created_at_the_same_time(self):
+        Ride.objects.filter(rider=self.rider).update(created_at=timezone.now())
+        first = self.client.get(self.url, {"page_size": 10})
+        second = self.client.get(first.data["next"])
+        self.assertNotIn("o=", base64.b64decode(second.wsgi_request.GET["cursor"]).decode())
+        third = self.client.get(second.data["next"])
+        self.assertIsNone(third.data["next"])
+        ids = [r["id"] for page in (first, second, third) for r in page.data["results"]]
+        self.assertEqual(len(set(ids)), 25)
+
+        previous = self.client.get(third.data["previous"])
+        self.assertEqual(previous.data["results"], second.data["results"])
+
+    def test_invalid_cursor_is_not_found(self):
+        cursor = base64.b64encode(b"p=%5B%22x%22%5D").decode()
+        response = self.client.get(self.url, {"cursor": cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_fields_param_selects_columns(self):
+        response = self.client.get(self.url, {"fields": "id,pickup_location"})
+        self.assertEqual(set(response.data["results"][0]), {"id", "pickup_location"})
+
+        response = self.client.get(self.url, {"fields": "id,password"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def authenticate_with_token(self, user):
+        self.client.force_authenticate(user=None)
+        token = RideRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_list_and_detail_query_counts_are_fixed(self):
+        self.authenticate_with_token(self.rider)
+        ride = Ride.objects.filter(rider=self.rider).first()
+        # the revocation check, then the page itself
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # the revocation check is cached now, so only the ride
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{self.url}{ride.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_drivers_list_their_assigned_rides(self):
+        driver = User.objects.create_user(
+            email="driver@example.com", password="driverpassword", is_driver=True
+        )
+        Ride.objects.filter(id__in=Ride.objects.values("id")[:3]).update(driver=driver)
+        self.authenticate_with_token(driver)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 3)
+
+
+class RoleClaimsTestCase(SimpleTestCase):
+    def test_tokens_carry_role_claims(self):
+        user = User(id=uuid.uuid4(), email="driver@example.com", is_driver=True)
+        access = RideRefreshToken.for_user(user).access_token
+        self.assertIs(access["is_driver"], True)
+        self.assertIs(access["is_staff"], False)
+        self.assertIs(async_to_sync(user_flag)(TokenUser(access), "is_driver"), True)
+
+
+class JWTQueryStringAuthMiddlewareTestCase(SimpleTestCase):
+    def setUp(self):
+        forget_user()
+        self.addCleanup(forget_user)
+
+    def authenticate(self, user):
+        token = RideRefreshToken.for_user(user).access_token
+        scopes = []
+
+        async def app(scope, receive, send):
+            scopes.append(scope)
+
+        middleware = JWTQueryStringAuthMiddleware(app)
+        scope = {"type": "websocket", "query_string": f"token={token}".encode()}
+        async_to_sync(middleware)(scope, None, None)
+        return scopes[0].get("user")
+
+    def test_cached_revocation_state_needs_no_database(self):
+        active = User(id=uuid.uuid4(), email="active@example.com", is_rider=True)
+        revoked = User(id=uuid.uuid4(), email="revoked@example.com", is_rider=True)
+        _remember_active(active.id, True)
+        _remember_active(revoked.id, False)
+        # SimpleTestCase refuses database queries, so these must be cache hits
+        self.assertEqual(self.authenticate(active).id, str(active.id))
+        self.assertIsNone(self.authenticate(revoked))
+
+    @override_settings(AUTH_REVOCATION_CACHE_SIZE=2)
+    def test_revocation_cache_is_bounded(self):
+        first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        _remember_active(first, True)
+        _remember_active(second, True)
+        self.assertTrue(_cached_active(first))
+        _remember_active(third, True)
+        # ``second`` was the least recently used
+        self.assertIsNone(_cached_active(second))
+        self.assertTrue(_cached_active(first))
+        self.assertTrue(_cached_active(third))
+
+
+class StatelessJWTAuthenticationTestCase(TestCase):
+    def setUp(self):
+        forget_user()
+        self.user = User.objects.create_user(
+            email="driver@example.com", password="driverpassword", is_driver=True
+        )
+        self.auth = StatelessJWTAuthentication()
+
+    def authenticate(self, token):
+        return self.auth.get_user(self.auth.get_validated_token(str(token)))
+
+    def test_principal_comes_from_claims(self):
+        token = RideRefreshToken.for_user(self.user).access_token
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            principal = self.authenticate(token)
+        self.assertIsInstance(principal, RidePrincipal)
+        self.assertEqual(principal.id, str(self.user.id))
+        self.assertTrue(principal.is_driver)
+        self.assertFalse(principal.is_rider)
+
+    def test_inactive_users_are_rejected(self):
+        token = RideRefreshToken.for_user(self.user).access_token
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_tokens_without_role_claims_load_the_user(self):
+        principal = self.authenticate(RefreshToken.for_user(self.user).access_token)
+        self.assertEqual(principal, self.user)
+
+
+class AsyncRideViewsTestCase(TestCase):
+    def setUp(self):
+        forget_user()
+        self.rider = User.objects.create_user(email="rider@example.com", password="riderpassword")
+        point = Point(77.5946, 12.9716, srid=4326)
+        self.ride = Ride.objects.create(
+            rider=self.rider, pickup_location=point, dropoff_location=point, current_location=point
+        )
+        token = RideRefreshToken.for_user(self.rider).access_token
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    async def test_location_matches_sync_view(self):
+        url = f"/api/async/rides/{self.ride.id}/location/"
+        with mock.patch("rides.location_buffer._buffer", InMemoryLocationBuffer()):
+            response = await self.async_client.get(url, **self.auth)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()["current_location"], str(self.ride.current_location))
+
+            cached = await self.async_client.get(
+                url, HTTP_IF_NONE_MATCH=response["ETag"], **self.auth
+            )
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(f"/api/async/rides/{self.ride.id}/location/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_status_change_uses_transitions(self):
+        response = await self.async_client.patch(
+            f"/api/async/rides/{self.ride.id}/status/",
+            data={"status": "flying"},
+            content_type="application/json",
+            **self.auth,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Invalid status", response.json()["error"])
+
+    async def test_status_change_by_deleted_user_is_unauthorized(self):
+        ghost = User(id=uuid.uuid4(), email="ghost@example.com", is_driver=True)
+        # Deleted after the revocation cache last saw it active
+        _remember_active(ghost.id, True)
+        token = RideRefreshToken.for_user(ghost).access_token
+        response = await self.async_client.patch(
+            f"/api/async/rides/{self.ride.id}/status/",
+            data={"status": "in_progress"},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncCacheReadTestCase(SimpleTestCase):
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://cache.invalid:6379/1",
+            }
+        }
+    )
+    def test_redis_reads_stay_on_the_event_loop(self):
+        client = mock.Mock()
+        client.mget = mock.AsyncMock(return_value=[pickle.dumps({"status": "requested"}), None])
+        with mock.patch("rides.aio.async_redis", return_value=client) as async_redis, \
+                mock.patch("django.core.cache.backends.base.BaseCache.aget_many") as aget_many:
+            cached = async_to_sync(cache_get_many)(["members", "position"])
+
+        self.assertEqual(cached, {"members": {"status": "requested"}})
+        async_redis.assert_called_once_with("redis://cache.invalid:6379/1")
+        client.mget.assert_awaited_once_with([":1:members", ":1:position"])
+        aget_many.assert_not_called()
+
+
+class FastJSONTestCase(SimpleTestCase):
+    def test_native_types(self):
+        ride_id = uuid.uuid4()
+        created_at = datetime.datetime(2024, 5, 1, 8, 30, tzinfo=datetime.timezone.utc)
+        data = fastjson.loads(
+            fastjson.dumps(
+                {"id": ride_id, "created_at": created_at, "location": Point(77.5, 12.9, srid=4326)}
+            )
+        )
+        self.assertEqual(
+            data,
+            {
+                "id": str(ride_id),
+                "created_at": "2024-05-01T08:30:00Z",
+                "location": {"lat": 12.9, "lng": 77.5},
+            },
+        )
+
+    def test_renderer_matches_drf(self):
+        point = Point(77.5946, 12.9716, srid=4326)
+        ride = Ride(
+            id=uuid.uuid4(), rider_id=uuid.uuid4(), status="requested",
+            pickup_location=point, dropoff_location=point,
+        )
+        data = RideSerializer([ride], many=True).data
+        rendered = FastJSONRenderer().render(data)
+        self.assertEqual(fastjson.loads(rendered), fastjson.loads(JSONRenderer().render(data)))
+
+    def test_parser_rejects_malformed_body(self):
+        parser = FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"status": "completed"}')), {"status": "completed"})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"status": '))
+
+
+class FleetRowTestCase(SimpleTestCase):
+    def test_clean_row_defaults_to_driver(self):
+        fields = clean_row(
+            {"email": "Driver@Example.COM", "phone_number": "9876543210", "latitude": "12.97", "longitude": "77.59"}
+        )
+        self.assertEqual(fields["email"], "Driver@example.com")
+        self.assertTrue(fields["is_driver"])
+        self.assertIsNone(fields["password"])
+        self.assertEqual(fields["current_location"].coords, (77.59, 12.97))
+
+    def test_clean_row_rejects_like_registration(self):
+        for row, reason in [
+            ({"email": "not-an-email"}, "Invalid email"),
+            ({"email": "a@example.com", "phone_number": "12345"}, "10 digits"),
+            ({"email": "a@example.com", "is_rider": "yes"}, "both driver and rider"),
+            ({"email": "a@example.com", "is_driver": "no"}, "either a driver or a rider"),
+        ]:
+            with self.assertRaisesMessage(RejectedRow, reason):
+                clean_row(row)
+
+    def test_read_ndjson_reports_bad_lines(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as f:
+            f.write('{"email": "a@example.com"}\n\n[1, 2]\n{"email": \n')
+        self.addCleanup(os.remove, f.name)
+        rows = list(read_rows(f.name))
+        self.assertEqual(rows[0], (1, {"email": "a@example.com"}))
+        self.assertEqual([line for line, _ in rows], [1, 3, 4])
+        self.assertIsInstance(rows[1][1], RejectedRow)
+        self.assertIsInstance(rows[2][1], RejectedRow)
+
+
+class FleetImportTestCase(TestCase):
+    def test_import_deduplicates_in_one_query_per_chunk(self):
+        User.objects.create_user(email="taken@example.com", phone_number="9000000000", is_driver=True)
+        rows = [
+            (2, {"email": "new1@example.com", "password": "pw-one", "phone_number": "9000000001"}),
+            (3, {"email": "taken@example.com"}),
+            (4, {"email": "other@example.com", "phone_number": "9000000000"}),
+            (5, {"email": "new1@example.com"}),
+            (6, {"email": "new2@example.com", "phone_number": "9000000001"}),
+            (7, {"email": "new3@example.com", "is_driver": "0", "is_rider": "1"}),
+        ]
+        importer = FleetImporter(chunk_size=10, workers=0)
+        # dedupe SELECT, then the bulk INSERT (inside its savepoint)
+        with self.assertNumQueries(4):
+            importer.run(rows)
+
+        self.assertEqual(importer.imported, 2)
+        self.assertEqual([line for line, _, _ in importer.rejects], [3, 4, 5, 6])
+        driver = User.objects.get(email="new1@example.com")
+        self.assertTrue(driver.is_driver)
+        self.assertTrue(driver.check_password("pw-one"))
+        self.assertFalse(User.objects.get(email="new3@example.com").has_usable_password())
+
+
+class SyntheticDataTestCase(SimpleTestCase):
+    def test_warm_index_needs_a_shared_index(self):
+        with mock.patch("rides.driver_index._index", GridDriverIndex()):
+            with self.assertRaisesMessage(CommandError, "shared DRIVER_INDEX"):
+                call_command("seed_synthetic", "--warm-index", "--drivers", "1")
+
+    def test_hotspots_are_clustered_and_reproducible(self):
+        centers = [(77.5946, 12.9716, 5.0, 1.0)]
+        points = hotspot_points(np.random.default_rng(7), 2000, centers)
+        np.testing.assert_array_equal(points, hotspot_points(np.random.default_rng(7), 2000, centers))
+        distances = haversine((77.5946, 12.9716), points)
+        # 2D Gaussian with sigma 5 km: the median radius is ~5.9 km
+        self.assertLess(abs(np.median(distances) - 5887), 500)
+
+    def test_parse_status_mix(self):
+        self.assertEqual(parse_status_mix("completed=3,cancelled=1"), {"completed": 0.75, "cancelled": 0.25})
+        with self.assertRaises(ValueError):
+            parse_status_mix("teleported=1")
+
+
+class SeedSyntheticTestCase(TestCase):
+    def test_bulk_loader_seeds_consistent_rides(self):
+        loader = SyntheticLoader(seed=3, batch_size=40, loader="bulk")
+        drivers = loader.users(30, True)
+        riders = loader.users(20, False)
+        busy = loader.rides(100, riders, drivers, {"in_progress": 0.2, "completed": 0.8})
+
+        self.assertEqual(User.objects.filter(is_driver=True).count(), 30)
+        rides = Ride.objects.all()
+        self.assertEqual(rides.count(), 100)
+        in_progress = rides.filter(status="in_progress")
+        self.assertEqual(len(set(in_progress.values_list("driver_id", flat=True))), in_progress.count())
+        self.assertFalse(User.objects.filter(id__in=busy, is_available=True).exists())
+        self.assertFalse(rides.filter(driver__isnull=True).exists())
+
+        self.assertEqual(flush_synthetic(), 50)
+        self.assertFalse(Ride.objects.exists())
+
+
+class BenchmarkReportTestCase(SimpleTestCase):
+    def test_compare_flags_slower_timings_and_lower_rates(self):
+        baseline = {"nearby": {"p50_ms": 10.0, "requests_per_second": 100.0, "queries": 200}}
+        current = {"nearby": {"p50_ms": 12.0, "requests_per_second": 95.0, "queries": 50}}
+        self.assertEqual(
+            [(key, round(change, 2)) for _, key, _, _, change in compare_results(baseline, current)],
+            [("p50_ms", 0.2)],
+        )
+        current["nearby"]["requests_per_second"] = 80.0
+        self.assertEqual(len(compare_results(baseline, current)), 2)
+        self.assertEqual(compare_results(baseline, {"fanout": {"p50_ms": 1.0}}), [])
+
+    def test_fanout_suite_delivers_every_update(self):
+        results = run_suite("fanout", subscribers=3, updates=2)
+        self.assertEqual(results["subscribers"], 3)
+        self.assertIn("p99_ms", results)
+
+
+class QueryBudgetMiddlewareTestCase(SimpleTestCase):
+    def test_headers_report_queries_and_db_time(self):
+        with self.settings(QUERY_BUDGET_HEADERS=True):
+            response = self.client.get("/api/")
+        self.assertEqual(response["X-DB-Queries"], "0")
+        self.assertTrue(response["Server-Timing"].startswith("db;dur="))
+        self.assertEqual(response.query_stats["queries"], 0)
+
+    def test_strict_mode_raises_over_budget(self):
+        budgets = {"api-root": {"queries": 0, "db_ms": -1}}
+        with self.settings(QUERY_BUDGETS=budgets, QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get("/api/")
+        with self.settings(QUERY_BUDGETS=budgets), self.assertLogs("rides.query_budget", "WARNING"):
+            self.assertEqual(self.client.get("/api/").status_code, status.HTTP_200_OK)
+
+    def test_every_endpoint_declares_a_budget(self):
+        def names(patterns):
+            for pattern in patterns:
+                if isinstance(pattern, URLResolver):
+                    yield from names(pattern.url_patterns)
+                elif pattern.name:
+                    yield pattern.name
+
+        undeclared = sorted({name for name in names(ride_urls.urlpatterns) if get_budget(name) is None})
+        self.assertEqual(undeclared, [])
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        forget_user()
+        self.rider = User.objects.create_user(email="rider@example.com", password="riderpassword", is_rider=True)
+        self.driver = User.objects.create_user(
+            email="driver@example.com", password="driverpassword", is_driver=True,
+            current_location=Point(77.5946, 12.9716, srid=4326),
+        )
+        point = Point(77.5946, 12.9716, srid=4326)
+        self.ride = Ride.objects.create(rider=self.rider, pickup_location=point, dropoff_location=point)
+        get_driver_index().clear()
+
+    def authenticate(self, user):
+        token = RideRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_rider_endpoints_stay_within_budget(self):
+        self.authenticate(self.rider)
+        location = {"latitude": 12.9716, "longitude": 77.5946}
+        with mock.patch("rides.location_buffer._buffer", InMemoryLocationBuffer()):
+            responses = [
+                self.client.get(f"/api/rides/{self.ride.id}/location/"),
+                self.client.get(f"/api/rides/{self.ride.id}/trajectory/"),
+                self.client.get("/api/rides/"),
+                self.client.get(f"/api/rides/{self.ride.id}/"),
+                self.client.post(
+                    "/api/rides/request/",
+                    {"pickup_location": location, "dropoff_location": location},
+                    format="json",
+                ),
+            ]
+        for response in responses:
+            self.assertLess(response.status_code, 400)
+            self.assertWithinBudget(response)
+
+    def test_accept_stays_within_budget(self):
+        self.authenticate(self.driver)
+        response = self.client.patch(
+            f"/api/rides/{self.ride.id}/status/", {"status": "in_progress"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.assertWithinBudget(response)["queries"], 3)
+
+
+class MetricsTestCase(SimpleTestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        registry = Registry()
+        histogram = Histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1), registry=registry)
+        for value in (0.05, 0.5, 5):
+            histogram.labels('a"b').observe(value)
+        text = render(registry.snapshot())
+        self.assertIn("# TYPE latency_seconds histogram", text)
+        self.assertIn('latency_seconds_bucket{route="a\\"b",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{route="a\\"b",le="1"} 2', text)
+        self.assertIn('latency_seconds_bucket{route="a\\"b",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_count{route="a\\"b"} 3', text)
+
+    def test_worker_snapshots_are_added_up(self):
+        registry = Registry()
+        counter = Counter("tasks_total", "Tasks.", registry=registry)
+        counter.inc(2)
+        merged = merge_snapshots([registry.snapshot(), registry.snapshot()])
+        self.assertIn("tasks_total 4", render(merged))
+
+    @override_settings(METRICS_REDIS_URL=None, METRICS_TOKEN=None)
+    def test_endpoint_exposes_request_latency_by_url_name(self):
+        self.client.get("/api/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn(
+            'http_request_duration_seconds_count{url_name="api-root",method="GET",status="2xx"}',
+            response.content.decode(),
+        )
+
+    @override_settings(METRICS_REDIS_URL=None, METRICS_TOKEN="secret")
+    def test_endpoint_requires_token_when_configured(self):
+        self.assertEqual(self.client.get("/metrics").status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_lag_is_measured_from_publish_time_without_eta(self):
+        headers = {}
+        _before_task_publish(headers=headers)
+        request = Context({SENT_AT_HEADER: headers[SENT_AT_HEADER]})
+        self.assertAlmostEqual(task_lag(request, now=headers[SENT_AT_HEADER] + 2), 2.0)
+        self.assertIsNone(task_lag(Context()))
+
+    def test_task_lag_prefers_eta(self):
+        now = time.time()
+        eta = datetime.datetime.fromtimestamp(now - 5, tz=datetime.timezone.utc).isoformat()
+        request = Context({"eta": eta, SENT_AT_HEADER: now - 60})
+        self.assertAlmostEqual(task_lag(request, now=now), 5.0, places=3)
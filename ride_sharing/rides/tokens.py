@@ -0,0 +1,16 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# User flags copied into every token, so a principal built from the token
+# knows its role without a database lookup.
+ROLE_CLAIMS = ("is_driver", "is_rider", "is_staff")
+
+
+class RideRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the user's role claims."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in ROLE_CLAIMS:
+            token[claim] = bool(getattr(user, claim))
+        return token
@@ -0,0 +1,162 @@
+"""
+Batched ride tracking.
+
+A single periodic tick advances every in-progress ride at once instead of
+running one self-rescheduling Celery chain per ride.
+"""
+import time
+
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.geos import Point
+
+from . import position_cache
+from .broadcast import publish_ride_locations
+from .geo import pack_points
+from .location_buffer import get_location_buffer
+from .models import Ride
+from .trajectory import append_points
+
+# Largest per-tick step of the simulated random walk, in degrees
+STEP_DEGREES = 0.001
+
+_rng = np.random.default_rng()
+
+
+def advance_in_progress_rides(step=STEP_DEGREES):
+    """
+    Move every in-progress ride one random-walk step.
+    Loads the rides in one query, updates all coordinates in one vectorized
+    operation, persists them with one ``bulk_update``, appends the trajectory
+    points in one insert and fans the updates out to the tracking groups in
+    one batch.
+    :return: dict with the number of rides processed and the tick duration.
+    """
+    started = time.perf_counter()
+    rides = list(
+        Ride.objects.filter(status="in_progress").values_list("id", "current_location")
+    )
+    if not rides:
+        return {"rides": 0, "duration_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+    ride_ids = [ride_id for ride_id, _ in rides]
+    buffer = get_location_buffer()
+    buffered = buffer.get_many("ride", ride_ids)
+    coords = pack_points(
+        buffered.get(ride_id) or location or (0.0, 0.0) for ride_id, location in rides
+    )
+    coords += _rng.uniform(-step, step, coords.shape)
+
+    locations = {
+        ride_id: Point(lng, lat, srid=4326)
+        for ride_id, (lng, lat) in zip(ride_ids, coords.tolist())
+    }
+    Ride.objects.bulk_update(
+        [Ride(id=ride_id, current_location=point) for ride_id, point in locations.items()],
+        ["current_location"],
+        batch_size=1000,
+    )
+    # Already persisted, so refresh readers without queueing another flush.
+    buffer.put_many(
+        "ride", {ride_id: (p.x, p.y) for ride_id, p in locations.items()}, mark_dirty=False
+    )
+    position_cache.set_positions(locations)
+    append_points(locations)
+    publish_ride_locations(locations)
+
+    return {
+        "rides": len(locations),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+class TrackerRegistry:
+    """
+    At-most-one ``simulate_ride_tracking`` chain per ride.
+
+    Starting a tracker bumps the ride's generation counter in Redis; a chain
+    carries the generation it was started with and exits on its next wake-up
+    once the counter has moved on. Live chains renew a lease in a sorted set,
+    which doubles as the count of active trackers. The counter expires with
+    the lease and is deleted when its chain exits, so finished rides leave no
+    keys behind.
+
+    Only used with RIDE_TRACKING_BATCHED off; the batched tick needs no chains.
+    """
+
+    # Delete the generation key only while it still holds this chain's generation
+    RELEASE_SCRIPT = """
+    if redis.call("GET", KEYS[1]) == ARGV[1] then
+        redis.call("DEL", KEYS[1])
+        redis.call("ZREM", KEYS[2], ARGV[2])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, url=None, prefix="tracker", lease_seconds=90):
+        import redis
+
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.active_key = f"{prefix}:active"
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    def _generation_key(self, ride_id):
+        return f"{self.prefix}:{ride_id}:generation"
+
+    def start(self, ride_id):
+        """Claim tracking for a ride, superseding any earlier chain; returns the new generation."""
+        key = self._generation_key(ride_id)
+        pipe = self.client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, self.lease_seconds)
+        pipe.zadd(self.active_key, {str(ride_id): time.time() + self.lease_seconds})
+        generation, _, _ = pipe.execute()
+        return generation
+
+    def heartbeat(self, ride_id, generation):
+        """Renew the lease if ``generation`` is still current; False means the chain is stale."""
+        key = self._generation_key(ride_id)
+        current = self.client.get(key)
+        if current is None or int(current) != int(generation):
+            return False
+        pipe = self.client.pipeline()
+        pipe.expire(key, self.lease_seconds)
+        pipe.zadd(self.active_key, {str(ride_id): time.time() + self.lease_seconds})
+        pipe.execute()
+        return True
+
+    def release(self, ride_id, generation):
+        """Drop the lease and generation key of a chain that is exiting on its own."""
+        self._release(
+            keys=[self._generation_key(ride_id), self.active_key], args=[int(generation), str(ride_id)]
+        )
+
+    def stop(self, ride_id):
+        """Make any running chain for the ride stale and drop its lease."""
+        key = self._generation_key(ride_id)
+        pipe = self.client.pipeline()
+        pipe.incr(key)
+        # Kept until a stale chain's next wake-up would have seen it
+        pipe.expire(key, self.lease_seconds)
+        pipe.zrem(self.active_key, str(ride_id))
+        pipe.execute()
+
+    def active_count(self):
+        """Number of rides whose tracker renewed its lease recently."""
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.active_key, "-inf", time.time())
+        pipe.zcard(self.active_key)
+        return pipe.execute()[1]
+
+
+_registry = None
+
+
+def get_tracker_registry():
+    global _registry
+    if _registry is None:
+        _registry = TrackerRegistry()
+    return _registry
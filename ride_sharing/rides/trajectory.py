@@ -0,0 +1,232 @@
+"""
+Append-only ride trajectories.
+
+Positions are appended to ``RideLocationPoint`` in bulk, after a streaming
+dead-reckoning filter: a point is only stored when it deviates more than
+TRAJECTORY_MAX_DEVIATION_M from where the ride was predicted to be (last
+stored point plus last stored velocity), or when TRAJECTORY_MAX_GAP_SECONDS
+have passed since the last stored point. The filter state of each ride lives
+in the cache and is read and written once per batch.
+
+When a ride completes its points are compacted into ``Ride.route`` (a
+Douglas-Peucker simplified LineString) and deleted. The points table is
+partitioned by day; ``ensure_partitions`` and ``drop_partitions`` keep the
+partitions ahead of and behind the retention window, and
+``purge_default_partition`` applies the same window to rows that landed in
+the default partition.
+"""
+import datetime
+import time
+
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.geos import LineString, Point
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .geo import METERS_PER_DEGREE, haversine, pack_points
+from .models import Ride, RideLocationPoint
+
+STATE_TTL = 3600
+TABLE = RideLocationPoint._meta.db_table
+
+
+def _state_key(ride_id):
+    return f"ride:{ride_id}:track"
+
+
+def append_points(locations, timestamp=None):
+    """
+    Append ``{ride_id: Point}`` positions observed at ``timestamp`` (epoch
+    seconds), dropping the ones the dead-reckoning filter can predict.
+    :return: number of points stored.
+    """
+    if not locations:
+        return 0
+    timestamp = timestamp or time.time()
+    ride_ids = list(locations)
+    keys = [_state_key(ride_id) for ride_id in ride_ids]
+    states = cache.get_many(keys)
+    coords = pack_points(locations[ride_id] for ride_id in ride_ids)
+
+    known = np.array([key in states for key in keys], dtype=bool)
+    store = ~known
+    velocity = np.zeros_like(coords)
+    if known.any():
+        # state: (lng, lat, t, v_lng, v_lat) of the last stored point
+        state = np.array([states[key] for key, k in zip(keys, known) if k], dtype=np.float64)
+        dt = timestamp - state[:, 2]
+        predicted = state[:, :2] + state[:, 3:] * dt[:, None]
+        deviation = haversine(predicted, coords[known])
+        store[known] = (deviation > settings.TRAJECTORY_MAX_DEVIATION_M) | (
+            dt >= settings.TRAJECTORY_MAX_GAP_SECONDS
+        )
+        velocity[known] = (coords[known] - state[:, :2]) / np.maximum(dt, 1e-3)[:, None]
+
+    stored = np.flatnonzero(store).tolist()
+    if not stored:
+        return 0
+    recorded_at = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+    RideLocationPoint.objects.bulk_create(
+        [
+            RideLocationPoint(
+                ride_id=ride_ids[i],
+                recorded_at=recorded_at,
+                location=Point(*coords[i].tolist(), srid=4326),
+            )
+            for i in stored
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    cache.set_many(
+        {
+            keys[i]: (*coords[i].tolist(), timestamp, *velocity[i].tolist())
+            for i in stored
+        },
+        STATE_TTL,
+    )
+    return len(stored)
+
+
+def compact_ride(ride_id):
+    """
+    Replace a completed ride's points with a simplified ``Ride.route``.
+    :return: number of points compacted, or None if the ride is not completed.
+    """
+    with transaction.atomic():
+        ride = Ride.objects.select_for_update().only("status", "route").filter(id=ride_id).first()
+        if ride is None or ride.status != "completed":
+            return None
+        points = RideLocationPoint.objects.filter(ride_id=ride_id)
+        coords = list(points.order_by("recorded_at").values_list("location", flat=True))
+        if len(coords) >= 2:
+            tolerance = settings.TRAJECTORY_SIMPLIFY_TOLERANCE_M / METERS_PER_DEGREE
+            route = LineString([(p.x, p.y) for p in coords], srid=4326)
+            ride.route = route.simplify(tolerance, preserve_topology=False)
+            ride.save(update_fields=["route"])
+        points.delete()
+    cache.delete(_state_key(ride_id))
+    return len(coords)
+
+
+def encode_polyline(coords, precision=5):
+    """Encode ``(lng, lat)`` pairs with Google's encoded polyline algorithm."""
+    factor = 10**precision
+    out = []
+    prev_lat = prev_lng = 0
+    for lng, lat in coords:
+        lat_q, lng_q = round(lat * factor), round(lng * factor)
+        for delta in (lat_q - prev_lat, lng_q - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lng = lat_q, lng_q
+    return "".join(out)
+
+
+def decode_polyline(encoded, precision=5):
+    """Inverse of ``encode_polyline``; returns ``(lng, lat)`` pairs."""
+    factor = 10**precision
+    coords, index, lat, lng = [], 0, 0, 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coords.append((lng / factor, lat / factor))
+    return coords
+
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_cursor(recorded_at):
+    """Opaque pagination cursor for the point recorded at ``recorded_at``."""
+    micros = (recorded_at - _EPOCH) // datetime.timedelta(microseconds=1)
+    return urlsafe_base64_encode(str(micros).encode())
+
+
+def decode_cursor(cursor):
+    """Inverse of ``encode_cursor``; raises ValueError for a malformed cursor."""
+    return _EPOCH + datetime.timedelta(microseconds=int(urlsafe_base64_decode(cursor)))
+
+
+def partition_name(day):
+    return f"{TABLE}_p{day:%Y%m%d}"
+
+
+def ensure_partitions(days_ahead=2, today=None):
+    """
+    Create the daily partitions from today through ``days_ahead`` days ahead.
+    A day whose rows already landed in the default partition is skipped.
+    :return: names of the partitions created.
+    """
+    today = today or timezone.now().date()
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(days_ahead + 1):
+            day = today + datetime.timedelta(days=offset)
+            name = partition_name(day)
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            try:
+                with transaction.atomic():
+                    cursor.execute(
+                        f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" '
+                        f"FOR VALUES FROM ('{day} 00:00:00+00') "
+                        f"TO ('{day + datetime.timedelta(days=1)} 00:00:00+00')"
+                    )
+            except DatabaseError as e:
+                print(f"Could not create partition {name}: {str(e)}")
+                continue
+            created.append(name)
+    return created
+
+
+def drop_partitions(before):
+    """
+    Drop daily partitions holding only days before ``before`` (a date).
+    :return: names of the partitions dropped.
+    """
+    dropped = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TABLE],
+        )
+        for (name,) in cursor.fetchall():
+            suffix = name[len(TABLE) + 2 :]
+            if not name.startswith(f"{TABLE}_p") or not suffix.isdigit():
+                continue
+            if datetime.datetime.strptime(suffix, "%Y%m%d").date() < before:
+                cursor.execute(f'DROP TABLE "{name}"')
+                dropped.append(name)
+    return dropped
+
+
+def purge_default_partition(before):
+    """
+    Delete points recorded before ``before`` (a date) from the default
+    partition, which catches days that had no partition of their own.
+    :return: number of rows deleted.
+    """
+    cutoff = datetime.datetime.combine(before, datetime.time(), tzinfo=datetime.timezone.utc)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{TABLE}_default" WHERE recorded_at < %s', [cutoff])
+        return cursor.rowcount
@@ -0,0 +1,153 @@
+"""
+Ride state transitions applied as conditional UPDATEs.
+
+Each transition writes ``... WHERE status = <expected>`` so that when two
+requests race for the same ride only one of them changes it; the loser gets a
+TransitionConflict instead of silently overwriting the winner. The driver's
+availability flip happens in the same transaction.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import position_cache
+from .driver_index import sync_driver
+from .models import Ride, User
+
+
+class TransitionError(Exception):
+    """A ride state change was refused; ``status_code`` is the HTTP status to report."""
+
+    status_code = 400
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        if status_code is not None:
+            self.status_code = status_code
+
+
+class RideNotFound(TransitionError):
+    status_code = 404
+
+    def __init__(self, message="Ride not found."):
+        super().__init__(message)
+
+
+class TransitionForbidden(TransitionError):
+    status_code = 403
+
+
+class TransitionConflict(TransitionError):
+    """Another writer changed the ride between our read and our write."""
+
+    status_code = 409
+
+
+def _current_state(ride_id):
+    state = Ride.objects.filter(id=ride_id).values("status", "driver_id", "offered_driver_id").first()
+    if state is None:
+        raise RideNotFound()
+    return state
+
+
+def _invalidate_on_commit(ride_id, stop_tracking=False):
+    transaction.on_commit(lambda: position_cache.invalidate(ride_id))
+    if stop_tracking and not settings.RIDE_TRACKING_BATCHED:
+        from .tracking import get_tracker_registry
+
+        transaction.on_commit(lambda: get_tracker_registry().stop(ride_id))
+
+
+def _compact_trajectory(ride_id):
+    from .tasks import compact_ride_trajectory
+
+    compact_ride_trajectory.delay(ride_id)
+
+
+def _driver_available_on_commit(driver, available):
+    driver.is_available = available
+    transaction.on_commit(lambda: sync_driver(driver))
+
+
+def accept_ride(ride_id, driver):
+    """
+    Assign ``driver`` to a requested ride and mark the driver unavailable.
+    A ride that was offered to someone else by the matcher cannot be taken.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = User.objects.filter(
+            id=driver.id, is_driver=True, is_available=True
+        ).update(is_available=False)
+        if not claimed:
+            raise TransitionForbidden("Only available drivers can accept rides.")
+
+        accepted = (
+            Ride.objects.filter(id=ride_id, status="requested", driver__isnull=True)
+            .filter(Q(offered_driver__isnull=True) | Q(offered_driver_id=driver.id))
+            .update(
+                status="in_progress",
+                driver_id=driver.id,
+                offered_driver=None,
+                offered_at=None,
+                updated_at=now,
+            )
+        )
+        if not accepted:
+            # Raising rolls back the availability flip above.
+            state = _current_state(ride_id)
+            if state["status"] == "in_progress" and state["driver_id"] != driver.id:
+                raise TransitionConflict("Ride was already accepted by another driver.")
+            if state["status"] != "requested":
+                raise TransitionError("Ride must be in 'requested' state to be accepted.")
+            if state["offered_driver_id"] not in (None, driver.id):
+                raise TransitionForbidden("Ride has been offered to another driver.")
+            raise TransitionConflict("Ride was modified concurrently, please retry.")
+        _driver_available_on_commit(driver, False)
+        _invalidate_on_commit(ride_id)
+
+
+def cancel_ride(ride_id, user):
+    """
+    Put a ride back to 'requested' and release its driver, if any.
+    Only the assigned driver may cancel once a driver is set; a pending offer
+    does not count and is withdrawn.
+    """
+    state = _current_state(ride_id)
+    if state["driver_id"] and state["driver_id"] != user.id:
+        raise TransitionForbidden("Only the assigned driver can cancel this ride.")
+    if state["status"] == "completed":
+        raise TransitionError("Completed rides cannot be cancelled.")
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Ride.objects.filter(
+            id=ride_id, status=state["status"], driver_id=state["driver_id"]
+        ).update(
+            status="requested", driver=None, offered_driver=None, offered_at=None, updated_at=now
+        )
+        if not updated:
+            raise TransitionConflict("Ride was modified concurrently, please retry.")
+        if state["driver_id"]:
+            User.objects.filter(id=state["driver_id"]).update(is_available=True)
+            _driver_available_on_commit(user, True)
+        _invalidate_on_commit(ride_id, stop_tracking=True)
+
+
+def complete_ride(ride_id, driver):
+    """Complete an in-progress ride and make its driver available again."""
+    now = timezone.now()
+    with transaction.atomic():
+        completed = Ride.objects.filter(
+            id=ride_id, status="in_progress", driver_id=driver.id
+        ).update(status="completed", updated_at=now)
+        if not completed:
+            state = _current_state(ride_id)
+            if state["driver_id"] != driver.id:
+                raise TransitionForbidden("Only the assigned driver can complete the ride.")
+            raise TransitionError("Only rides 'in_progress' can be completed.")
+        User.objects.filter(id=driver.id).update(is_available=True)
+        _driver_available_on_commit(driver, True)
+        _invalidate_on_commit(ride_id, stop_tracking=True)
+        transaction.on_commit(lambda: _compact_trajectory(ride_id))
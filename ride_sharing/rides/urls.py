@@ -1,8 +1,10 @@
 from django.urls import include, path
+from . import async_views
 from rest_framework.routers import DefaultRouter
 from .views import (
     RideLocationView,
     RideRequestView,
+    RideTrajectoryView,
     RideStatusUpdateView,
     UserRegistrationView,
     signin_user,
@@ -26,6 +28,22 @@ urlpatterns = [
         RideLocationView.as_view(),
         name="ride-location",
     ),
+    path(
+        "rides/<str:ride_id>/trajectory/",
+        RideTrajectoryView.as_view(),
+        name="ride-trajectory",
+    ),
     path("rides/request/", RideRequestView.as_view(), name="ride-request"),
+    path("async/rides/request/", async_views.ride_request, name="async-ride-request"),
+    path(
+        "async/rides/<str:ride_id>/location/",
+        async_views.ride_location,
+        name="async-ride-location",
+    ),
+    path(
+        "async/rides/<str:ride_id>/status/",
+        async_views.ride_status,
+        name="async-ride-status",
+    ),
     path("", include(router.urls)),
 ]
@@ -1,26 +1,101 @@
+import math
 import random
 from django.contrib.gis.geos import Point
-from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.db.models.functions import Distance, GeoFunc
+from django.contrib.gis.measure import D
+from django.db.models import FloatField
 from .models import User, Ride
+from .driver_index import get_driver_index, request_warmup
+from .geo import METERS_PER_DEGREE, haversine
+from .location_buffer import get_driver_locations
+from .metrics import NEARBY_DRIVERS_FOUND
 
 # Default bounds for random latitude and longitude
 DEFAULT_LATITUDE_BOUNDS = (-90, 90)
 DEFAULT_LONGITUDE_BOUNDS = (-180, 180)
 
-def get_nearby_drivers(rider_location, max_distance=5000):
+# Search radii in meters, tried in order until enough drivers are found
+DRIVER_SEARCH_RADII = (1000, 5000, 20000)
+
+
+class KNNDistance(GeoFunc):
+    """PostGIS ``<->`` operator; lets ORDER BY ... LIMIT walk the GiST index."""
+    function = ""
+    geom_param_pos = (0, 1)
+    arg_joiner = " <-> "
+    template = "(%(expressions)s)"
+    output_field = FloatField()
+
+
+def degrees_for_radius(location, radius):
+    """Conservative radius in degrees covering ``radius`` meters around ``location``."""
+    cos_lat = max(math.cos(math.radians(min(abs(location.y), 89.0))), 0.01)
+    return radius / (METERS_PER_DEGREE * cos_lat)
+
+
+def nearby_drivers_queryset(rider_location, radius, limit=5):
+    """
+    Nearest available drivers within ``radius`` meters of ``rider_location``.
+    ST_DWithin on the geometry column prefilters through the spatial index, the
+    ``<->`` operator orders candidates and the geodesic distance is exact.
+    """
+    return (
+        User.objects.filter(
+            is_driver=True,
+            is_available=True,
+            current_location__dwithin=(
+                rider_location,
+                degrees_for_radius(rider_location, radius),
+            ),
+        )
+        .annotate(distance=Distance("current_location", rider_location))
+        .filter(distance__lte=D(m=radius))
+        .order_by(KNNDistance("current_location", rider_location))[:limit]
+    )
+
+
+def query_drivers_within(rider_location, radius, limit=5):
+    """
+    Evaluate ``nearby_drivers_queryset`` and order the hits by exact distance.
+    Drivers with a buffered position newer than the stored one are re-scored.
+    """
+    drivers = list(nearby_drivers_queryset(rider_location, radius, limit))
+    buffered = get_driver_locations([driver.id for driver in drivers])
+    for driver in drivers:
+        location = buffered.get(driver.id)
+        if location is not None:
+            driver.current_location = location
+            driver.distance = D(
+                m=float(haversine((rider_location.x, rider_location.y), (location.x, location.y)))
+            )
+    return sorted(drivers, key=lambda driver: driver.distance.m)
+
+
+def get_nearby_drivers(rider_location, max_distance=DRIVER_SEARCH_RADII[-1], limit=5):
     """
     Get a list of nearby drivers within a specified distance from the rider's location.
+    Answers from the driver index when it is warm. Otherwise PostGIS is queried
+    in expanding rings (DRIVER_SEARCH_RADII, capped at ``max_distance``) until
+    ``limit`` drivers are found, and a rebuild of the index is requested.
     :param rider_location: The location of the rider as a Point object.
     :param max_distance: The maximum distance in meters to search for drivers.
-    :return: A queryset of nearby drivers.
+    :param limit: The number of drivers to return.
+    :return: A list of drivers with ``id``, ``current_location`` and ``distance``.
     """
-    print(f"Rider location: {rider_location}")
-    drivers = User.objects.filter(is_driver=True, is_available=True)
-    nearest_drivers = drivers.annotate(
-        distance=Distance("current_location", rider_location)
-    ).order_by("distance")[
-        :5
-    ]  # Top 5 closest drivers
+    index = get_driver_index()
+    if index.is_warm():
+        nearest_drivers = index.nearest(rider_location, k=limit, max_distance=max_distance)
+        NEARBY_DRIVERS_FOUND.labels("index").observe(len(nearest_drivers))
+        return nearest_drivers
+
+    radii = [radius for radius in DRIVER_SEARCH_RADII if radius < max_distance]
+    radii.append(max_distance)
+    for radius in radii:
+        nearest_drivers = query_drivers_within(rider_location, radius, limit)
+        if len(nearest_drivers) >= limit:
+            break
+    request_warmup()
+    NEARBY_DRIVERS_FOUND.labels("postgis").observe(len(nearest_drivers))
     return nearest_drivers
 
 
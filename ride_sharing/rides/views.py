@@ -1,19 +1,29 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from .models import Ride, User
+from .pagination import RideCursorPagination
 from .serializers import (
+    RideListSerializer,
     RideSerializer,
     UserRegistrationSerializer,
     UserDetailSerializer,
 )
 from rest_framework.decorators import api_view, action
-from .tasks import simulate_ride_tracking
+from .tasks import start_ride_tracking
+from .tokens import RideRefreshToken
+from .transitions import TransitionError, accept_ride, cancel_ride, complete_ride
 from .utils import get_nearby_drivers, get_random_point
+from .geo import eta_seconds, haversine, pack_points
+from . import position_cache
+from django.conf import settings
 from django.contrib.gis.geos import Point
+from django.utils.http import parse_etags
+from .models import RideLocationPoint
+from .trajectory import decode_cursor, encode_cursor, encode_polyline
 
 # 
 class UserRegistrationView(APIView):
@@ -57,7 +67,7 @@ def signin_user(request):
         try:
             user = User.objects.get(email=email)
             if user.check_password(password):
-                refresh = RefreshToken.for_user(user)
+                refresh = RideRefreshToken.for_user(user)
                 return Response(
                     {
                         "user": UserDetailSerializer(user).data,
@@ -85,17 +95,41 @@ class RideViewSet(viewsets.ModelViewSet):
     queryset = Ride.objects.all()
     serializer_class = RideSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = RideCursorPagination
 
     def perform_create(self, serializer):
-        serializer.save(rider=self.request.user)
+        serializer.save(rider_id=self.request.user.id)
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return RideListSerializer
+        return RideSerializer
+
+    def list_fields(self):
+        """Fields of the list representation, from ``?fields=`` or the slim defaults."""
+        if not hasattr(self, "_list_fields"):
+            requested = RideListSerializer.requested_fields(self.request.query_params.get("fields"))
+            self._list_fields = requested or RideListSerializer.DEFAULT_FIELDS
+        return self._list_fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == "list":
+            kwargs["fields"] = self.list_fields()
+        return super().get_serializer(*args, **kwargs)
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
-            # Riders see their own rides; drivers see assigned rides
-            if user.groups.filter(name="Driver").exists():
-                return Ride.objects.filter(driver=user)
-            return Ride.objects.filter(rider=user)
+            # Riders see their own rides; drivers see assigned rides.
+            # is_driver comes with the authenticated user, no extra query.
+            if user.is_driver:
+                queryset = Ride.objects.filter(driver_id=user.id)
+            else:
+                queryset = Ride.objects.filter(rider_id=user.id)
+            if self.action == "list":
+                # Load only what is rendered plus the cursor's ordering columns
+                queryset = queryset.only("id", "created_at", *self.list_fields())
+            return queryset
         return Ride.objects.none()
 
 
@@ -103,23 +137,94 @@ class RideLocationView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, ride_id):
-        """Get the current location of a ride. Only accessible to the rider or driver."""
-        try:
-            ride = Ride.objects.get(id=ride_id)
-            if request.user != ride.rider and request.user != ride.driver:
-                return Response(
-                    {"detail": "Not authorized to view this ride."},
-                    status=status.HTTP_403_FORBIDDEN,
-                )
-
+        """Get the current location of a ride. Only accessible to the rider or driver.
+        Served from the position cache; answers 304 if the position has not moved
+        since the ETag the client sent in If-None-Match."""
+        snapshot = position_cache.get_snapshot(ride_id)
+        if snapshot is None:
             return Response(
-                {"current_location": str(ride.current_location)},
-                status=status.HTTP_200_OK,
+                {"detail": "Ride not found."}, status=status.HTTP_404_NOT_FOUND
             )
-        except Ride.DoesNotExist:
+        if not snapshot.can_view(request.user.id):
+            return Response(
+                {"detail": "Not authorized to view this ride."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        etag = snapshot.etag
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response(
+            {"current_location": str(snapshot.location)},
+            status=status.HTTP_200_OK,
+            headers={"ETag": etag},
+        )
+
+
+class RideTrajectoryView(APIView):
+    permission_classes = [IsAuthenticated]
+    page_size = 500
+    max_page_size = 5000
+
+    def get(self, request, ride_id):
+        """Get a ride's stored trajectory, oldest first, one cursor page at a time.
+        Completed rides return their compacted route as an encoded polyline instead.
+        Pass the returned ``next`` value back as ``?cursor=`` to get the following page."""
+        snapshot = position_cache.get_snapshot(ride_id)
+        if snapshot is None:
             return Response(
                 {"detail": "Ride not found."}, status=status.HTTP_404_NOT_FOUND
             )
+        if not snapshot.can_view(request.user.id):
+            return Response(
+                {"detail": "Not authorized to view this ride."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        try:
+            limit = min(int(request.query_params.get("limit", self.page_size)), self.max_page_size)
+            cursor = request.query_params.get("cursor")
+            after = decode_cursor(cursor) if cursor else None
+        except (ValueError, OverflowError):
+            return Response(
+                {"error": "Invalid limit or cursor."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if limit < 1:
+            return Response(
+                {"error": "Invalid limit or cursor."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        route = Ride.objects.filter(id=ride_id).values_list("route", flat=True).first()
+        if route is not None:
+            return Response(
+                {
+                    "ride_id": snapshot.ride_id,
+                    "polyline": encode_polyline(route.coords),
+                    "points": [],
+                    "next": None,
+                }
+            )
+
+        # Keyset pagination on the (ride_id, recorded_at) primary key
+        points = RideLocationPoint.objects.filter(ride_id=ride_id).order_by("recorded_at")
+        if after is not None:
+            points = points.filter(recorded_at__gt=after)
+        rows = list(points.values_list("recorded_at", "location")[: limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][0])
+        return Response(
+            {
+                "ride_id": snapshot.ride_id,
+                "polyline": None,
+                "points": [
+                    {"lat": location.y, "lng": location.x, "recorded_at": recorded_at.isoformat()}
+                    for recorded_at, location in rows
+                ],
+                "next": next_cursor,
+            }
+        )
 
 
 class RideRequestView(APIView):
@@ -144,140 +249,90 @@ class RideRequestView(APIView):
         )
 
         ride = Ride.objects.create(
-            rider=request.user,
+            rider_id=request.user.id,
             pickup_location=pickup_location,
             dropoff_location=dropoff_location,
             status="requested",
         )
 
         nearest_drivers = get_nearby_drivers(pickup_location)
-        # Format response
-        formatted_drivers = []
-        for driver in nearest_drivers:
-            # Convert distance from meters to kilometers (rounded to 2 decimals)
-            distance_km = (
-                round(driver.distance.m / 1000, 2) if driver.distance else None
-            )
-
-            # Extract lat/lng from Point (driver.current_location)
-            driver_lat = driver.current_location.y
-            driver_lng = driver.current_location.x
-
-            formatted_drivers.append(
-                {
-                    "id": driver.id,
-                    "distance_km": distance_km,
-                    "current_location": {
-                        "latitude": driver_lat,
-                        "longitude": driver_lng,
-                    },
-                }
-            )
         return Response(
             {
                 "ride_id": ride.id,
-                "nearest_drivers": formatted_drivers,
+                "nearest_drivers": format_nearby_drivers(pickup_location, nearest_drivers),
             },
             status=status.HTTP_201_CREATED,
         )
 
 
+def format_nearby_drivers(pickup_location, nearest_drivers):
+    """Distance and ETA of each candidate driver, scored in one vectorized call."""
+    driver_coords = pack_points(
+        driver.current_location for driver in nearest_drivers
+    )
+    distances = haversine((pickup_location.x, pickup_location.y), driver_coords)
+    etas = eta_seconds(distances)
+    formatted_drivers = []
+    for driver, (lng, lat), distance, eta in zip(
+        nearest_drivers, driver_coords.tolist(), distances.tolist(), etas.tolist()
+    ):
+        formatted_drivers.append(
+            {
+                "id": driver.id,
+                "distance_km": round(distance / 1000, 2),
+                "eta_minutes": round(eta / 60, 1),
+                "current_location": {
+                    "latitude": lat,
+                    "longitude": lng,
+                },
+            }
+        )
+    return formatted_drivers
+
+
 class RideStatusUpdateView(APIView):
-    """"Ride status update view for drivers to update the status of a ride."""
+    """"Ride status update view for drivers to update the status of a ride.
+    Each transition is a conditional update; a lost race returns 409 Conflict."""
+    # Transitions flip the driver's availability, so load the real user
+    authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, ride_id):
-        try:
-            ride = Ride.objects.get(id=ride_id)
-            new_status = request.data.get(
-                "status"
-            )  # Expected: "in_progress", "completed", "cancelled"
-
-            # Validate status input
-            if new_status not in [
-                choice[0] for choice in Ride.STATUS_CHOICES if choice[0] != "requested"
-            ]:
-                return Response(
-                    {
-                        "error": f"Invalid status. Allowed: {[choice[0] for choice in Ride.STATUS_CHOICES if choice[0] != 'requested']}"
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        new_status = request.data.get(
+            "status"
+        )  # Expected: "in_progress", "completed", "cancelled"
 
-            # --- Status: in_progress (Driver accepts) ---
-            if new_status == "in_progress":
-                if not (request.user.is_driver and request.user.is_available):
-                    return Response(
-                        {"error": "Only available drivers can accept rides."},
-                        status=status.HTTP_403_FORBIDDEN,
-                    )
-                if ride.status != "requested":
-                    return Response(
-                        {"error": "Ride must be in 'requested' state to be accepted."},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                ride.driver = request.user
-                ride.status = "in_progress"
-                ride.save()
-                request.user.is_available = False
-                request.user.save()
-                simulate_ride_tracking.delay(ride.id)  # Start tracking
-                return Response(
-                    {"message": "Ride accepted. Status updated to 'in_progress'."},
-                    status=status.HTTP_200_OK,
-                )
-
-            # --- Status: cancelled ---
-            elif new_status == "cancelled":
-                # Allow cancellation by driver (if assigned) or rider (if ride is still requested)
-                if ride.driver and ride.driver != request.user:
-                    return Response(
-                        {"error": "Only the assigned driver can cancel this ride."},
-                        status=status.HTTP_403_FORBIDDEN,
-                    )
-                if ride.status == "completed":
-                    return Response(
-                        {"error": "Completed rides cannot be cancelled."},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                # Revert to 'requested' if driver cancels mid-ride
-                if ride.driver:
-                    ride.driver.is_available = True
-                    ride.driver.save()
-                    ride.driver = None
-                ride.status = "requested"
-                ride.save()
-                return Response(
-                    {"message": "Ride cancelled successfully."},
-                    status=status.HTTP_200_OK,
-                )
-
-            # --- Status: completed ---
-            elif new_status == "completed":
-                if not ride.driver or ride.driver != request.user:
-                    return Response(
-                        {"error": "Only the assigned driver can complete the ride."},
-                        status=status.HTTP_403_FORBIDDEN,
-                    )
-                if ride.status != "in_progress":
-                    return Response(
-                        {"error": "Only rides 'in_progress' can be completed."},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                ride.status = "completed"
-                ride.save()
-                request.user.is_available = True  # Mark driver as available
-                request.user.save()
-                return Response(
-                    {"message": "Ride completed successfully."},
-                    status=status.HTTP_200_OK,
-                )
-
-        except Ride.DoesNotExist:
-            return Response(
-                {"error": "Ride not found."},
-                status=status.HTTP_404_NOT_FOUND,
-            )
+        try:
+            message = apply_status_change(ride_id, new_status, request.user)
+        except TransitionError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        return Response({"message": message}, status=status.HTTP_200_OK)
+
+
+def apply_status_change(ride_id, new_status, user):
+    """
+    Run the transition for ``new_status`` on behalf of ``user`` (a User row).
+    :return: the success message; raises TransitionError otherwise.
+    """
+    allowed = [choice[0] for choice in Ride.STATUS_CHOICES if choice[0] != "requested"]
+    # Validate status input
+    if new_status not in allowed:
+        raise TransitionError(f"Invalid status. Allowed: {allowed}")
+
+    # --- Status: in_progress (Driver accepts) ---
+    if new_status == "in_progress":
+        accept_ride(ride_id, user)
+        if not settings.RIDE_TRACKING_BATCHED:
+            start_ride_tracking(ride_id)  # Start tracking
+        return "Ride accepted. Status updated to 'in_progress'."
+
+    # --- Status: cancelled ---
+    # Allow cancellation by driver (if assigned) or rider (if ride is still requested);
+    # the ride reverts to 'requested' if the driver cancels mid-ride
+    if new_status == "cancelled":
+        cancel_ride(ride_id, user)
+        return "Ride cancelled successfully."
+
+    # --- Status: completed ---
+    complete_ride(ride_id, user)
+    return "Ride completed successfully."